@@ -0,0 +1,216 @@
+"""
+benchmarks/generate.py
+Deterministic synthetic catalogue for benchmarking.
+
+Builds a database with N recipes (and proportional users, tags and
+comments) using the app's own models and the batched bulk importer, so
+the search index, ingredient index and facet counts are all populated.
+The same --seed always produces the same data.
+
+Distributions aim to look like a real recipe site rather than uniform noise:
+- a few prolific authors write most recipes (Zipf over users)
+- tag and ingredient popularity is long-tailed (Zipf)
+- comments per recipe are heavy-tailed, and the first recipe is a "viral"
+  one with thousands of comments to stress recipe_detail
+- posting dates are spread over the last three years
+
+    python -m benchmarks.generate --recipes 100000 --database benchmarks/data/catalogue-100000.db
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+CUISINES = [
+    ("Italian", 18), ("Asian", 16), ("Mexican", 10), ("Western", 14), ("Indian", 9), ("Lebanese", 6),
+    ("Greek", 5), ("French", 5), ("Japanese", 6), ("Thai", 5), ("Korean", 3), ("Vietnamese", 3),
+]
+DIFFICULTIES = [("Easy", 60), ("Medium", 30), ("Hard", 10)]
+COOK_TIMES = [10, 15, 20, 25, 30, 35, 40, 45, 60, 75, 90, 120, 180]
+
+BASE_TAGS = [
+    "quick", "easy", "vegetarian", "vegan", "healthy", "dinner", "lunch", "breakfast", "dessert",
+    "halal", "under30", "budget", "spicy", "gluten-free", "kids", "one-pot", "bbq", "baking",
+    "snack", "soup", "salad", "pasta", "rice", "noodles", "seafood", "chicken", "beef", "featured",
+]
+INGREDIENTS = [
+    "chicken breast", "chicken thigh", "beef mince", "pork", "salmon", "prawns", "tofu", "eggs", "milk",
+    "butter", "flour", "sugar", "rice", "pasta", "noodles", "bread", "tomato", "onion", "garlic",
+    "ginger", "carrot", "capsicum", "broccoli", "spinach", "mushroom", "potato", "zucchini", "lemon",
+    "lime", "avocado", "cheese", "parmesan", "yogurt", "cream", "coconut milk", "soy sauce", "honey",
+    "chilli", "cumin", "paprika", "basil", "coriander", "spring onion", "peas", "corn", "beans",
+    "chickpeas", "lentils", "olive oil", "salt", "pepper", "banana", "chocolate", "oats", "cinnamon",
+]
+UNITS = ["g", "cups", "tbsp", "tsp", "ml", "cloves", ""]
+TITLE_WORDS = [
+    "Creamy", "Spicy", "Crispy", "Easy", "Weeknight", "Family", "Smoky", "Zesty", "Classic", "Herby",
+    "Garlic", "Honey", "Lemon", "Sticky", "Loaded", "Roasted", "Grilled", "Baked", "One-Pan", "Quick",
+]
+DISHES = [
+    "Curry", "Stir-Fry", "Tacos", "Pasta", "Salad", "Soup", "Bowl", "Wraps", "Pie", "Bake", "Burger",
+    "Fried Rice", "Noodles", "Pancakes", "Risotto", "Skewers", "Toastie", "Omelette", "Muffins", "Stew",
+]
+COMMENTS = [
+    "Made this tonight and the whole family loved it.",
+    "Easy to follow, I added extra garlic.",
+    "Took a bit longer than the cook time but worth it.",
+    "Great for a school lunch box.",
+    "Swapped the chicken for tofu and it still worked.",
+    "Will make again!",
+]
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+class Catalogue:
+    """Deterministic record generator (no database access)."""
+
+    def __init__(self, recipes, seed=42):
+        self.rng = random.Random(seed)
+        self.recipes = recipes
+        self.users = max(5, recipes // 20)
+        extra_tags = max(0, min(2000, recipes // 100))
+        self.tags = BASE_TAGS + [f"{w.lower()}-{d.lower()}-{i}" for i, (w, d) in enumerate(
+            (self.rng.choice(TITLE_WORDS), self.rng.choice(DISHES)) for _ in range(extra_tags))]
+        self.tag_weights = zipf_weights(len(self.tags))
+        self.ingredient_weights = zipf_weights(len(INGREDIENTS), 0.8)
+        self.user_weights = zipf_weights(self.users, 1.2)
+        self.now = datetime(2026, 1, 1)
+
+    def usernames(self):
+        return [f"user{i:07d}" for i in range(1, self.users + 1)]
+
+    def recipe(self, index):
+        rng = self.rng
+        ingredient_count = rng.randint(4, 12)
+        lines = []
+        for name in dict.fromkeys(rng.choices(INGREDIENTS, weights=self.ingredient_weights, k=ingredient_count)):
+            unit = rng.choice(UNITS)
+            lines.append(f"{rng.randint(1, 500)}{unit} {name}" if unit else f"{rng.randint(1, 4)} {name}")
+        steps = [f"Step {i}: {rng.choice(['Chop', 'Mix', 'Fry', 'Bake', 'Simmer', 'Serve'])} everything." for i in range(1, rng.randint(3, 9))]
+        tags = list(dict.fromkeys(rng.choices(self.tags, weights=self.tag_weights, k=rng.randint(1, 5))))
+        return {
+            "title": f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {rng.choice(DISHES)} {index}",
+            "summary": rng.choice(["", "A reader favourite.", "Ready in no time.", "Great for meal prep."]),
+            "cuisine": weighted(rng, CUISINES),
+            "difficulty": weighted(rng, DIFFICULTIES),
+            "cook_time_mins": rng.choice(COOK_TIMES),
+            "ingredients": "\n".join(lines),
+            "instructions": "\n".join(steps),
+            "date_posted": (self.now - timedelta(seconds=rng.randint(0, 3 * 365 * 86400))).isoformat(),
+            "author": f"user{rng.choices(range(1, self.users + 1), weights=self.user_weights)[0]:07d}",
+            "tags": tags,
+        }
+
+    def comment_count(self, recipe_index):
+        if recipe_index == 0:
+            return 2000
+        # Heavy tail: most recipes have a handful of comments, a few have hundreds.
+        return min(500, int(self.rng.paretovariate(1.6)) - 1)
+
+
+def generate(database, recipes, seed=42, echo=print):
+    """Create (or replace) a benchmark database. Returns a summary dict."""
+    database = os.path.abspath(database)
+    os.makedirs(os.path.dirname(database), exist_ok=True)
+    if os.path.exists(database):
+        os.remove(database)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.setdefault("CACHE_BACKEND", "none")
+
+    from flaskblog import create_app, db, migrations, passwords
+    from flaskblog.bulk import import_records
+    from flaskblog.comments import recount as recount_comments
+    from flaskblog.counters import rebuild as rebuild_counters
+    from flaskblog.related import rebuild as rebuild_related
+    from flaskblog.models import Comment, Recipe, User
+
+    catalogue = Catalogue(recipes, seed)
+    app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        migrations.upgrade()
+        # One bcrypt hash shared by every synthetic account.
+        password = passwords.hash_password("Bench123!")
+        users = [{"username": "benchadmin", "email": "admin@bench.invalid", "password": password,
+                  "is_admin": True, "image_file": "default.jpg"}]
+        users += [{"username": name, "email": f"{name}@bench.invalid", "password": password,
+                   "is_admin": False, "image_file": "default.jpg"} for name in catalogue.usernames()]
+        for start in range(0, len(users), 5000):
+            db.session.execute(User.__table__.insert(), users[start:start + 5000])
+        db.session.commit()
+        admin_id = db.session.execute(db.select(User.id).where(User.username == "benchadmin")).scalar()
+
+        records = ((i + 1, catalogue.recipe(i)) for i in range(recipes))
+        import_records(records, admin_id, batch_size=2000, commit_every=50000, echo=echo)
+
+        user_ids = db.session.execute(db.select(User.id)).scalars().all()
+        comments = 0
+        batch = []
+        index, last_id = 0, 0
+        while True:
+            # Walk recipes in id order, a chunk at a time, so memory stays flat.
+            chunk = db.session.execute(
+                db.select(Recipe.id, Recipe.date_posted).where(Recipe.id > last_id).order_by(Recipe.id).limit(5000)
+            ).all()
+            if not chunk:
+                break
+            for recipe_id, posted in chunk:
+                for _ in range(catalogue.comment_count(index)):
+                    batch.append({
+                        "body": catalogue.rng.choice(COMMENTS),
+                        "created_at": posted + timedelta(minutes=catalogue.rng.randint(1, 60 * 24 * 90)),
+                        "recipe_id": recipe_id,
+                        "user_id": catalogue.rng.choice(user_ids),
+                    })
+                index += 1
+            last_id = chunk[-1][0]
+            if len(batch) >= 5000:
+                db.session.execute(Comment.__table__.insert(), batch)
+                comments += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(Comment.__table__.insert(), batch)
+            comments += len(batch)
+        db.session.commit()
+        recount_comments()
+        rebuild_counters()
+        rebuild_related(echo=echo)
+
+    summary = {
+        "database": database,
+        "recipes": recipes,
+        "users": len(users),
+        "comments": comments,
+        "seed": seed,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    echo(f"Generated {recipes} recipes, {len(users)} users, {comments} comments in {summary['seconds']}s.")
+    return summary
+
+
+def default_database(recipes):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", f"catalogue-{recipes}.db")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic recipe catalogue.")
+    parser.add_argument("--recipes", type=int, default=1000)
+    parser.add_argument("--database", help="SQLite file to create (default: benchmarks/data/catalogue-N.db)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    database = args.database or default_database(args.recipes)
+    generate(database, args.recipes, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+benchmarks/queries.py
+Query budgets for the main anonymous routes.
+
+Requests each route once through the test client (uncached, after one
+warm-up request) inside count_queries() and compares the number of SQL
+statements with its budget. Any route over budget is reported and the
+exit status is 1, so this can gate CI next to `benchmarks.run --baseline`.
+
+    python -m benchmarks.queries
+    python -m benchmarks.queries --recipes 100000
+
+Budgets are upper bounds. Lower one when a change saves a query, so the
+saving cannot quietly regress.
+"""
+
+import argparse
+import os
+import sys
+
+# path -> most SQL statements the route may run. "{busiest}" is the most commented recipe.
+BUDGETS = {
+    "/": 7,
+    "/recipes": 5,
+    "/recipe/{busiest}": 4,
+    "/api/v1/recipes": 2,
+}
+
+
+def check(app, budgets=BUDGETS):
+    """[(path, status, queries, budget)] for every route in budgets."""
+    from sqlalchemy import func
+
+    from flaskblog import db
+    from flaskblog.instrumentation import count_queries
+    from flaskblog.models import Comment, Recipe
+
+    with app.app_context():
+        busiest = db.session.execute(
+            db.select(Comment.recipe_id).group_by(Comment.recipe_id).order_by(func.count().desc()).limit(1)
+        ).scalar() or db.session.execute(db.select(func.min(Recipe.id))).scalar()
+
+    results = []
+    for template, budget in budgets.items():
+        path = template.format(busiest=busiest)
+        client = app.test_client()
+        client.get(path)
+        with count_queries() as counter:
+            status = client.get(path).status_code
+        results.append((path, status, counter.count, budget))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the SQL statements per request against budgets.")
+    parser.add_argument("--recipes", type=int, default=1000, help="Catalogue size to check against.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from benchmarks.generate import default_database, generate
+
+    database = default_database(args.recipes)
+    if not os.path.exists(database):
+        generate(database, args.recipes, args.seed)
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ["CACHE_BACKEND"] = "none"
+    os.environ["PERF_INSTRUMENTATION"] = "0"
+
+    from flaskblog import create_app, migrations
+
+    app = create_app()
+    with app.app_context():
+        migrations.upgrade()
+
+    failed = 0
+    for path, status, queries, budget in check(app):
+        ok = status == 200 and queries <= budget
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {path:<24} {queries:>3} queries (budget {budget}), status {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+benchmarks/run.py
+Route benchmarks against synthetic catalogues.
+
+For each catalogue size, this generates the database on first use (see
+generate.py), then drives the app through the Flask test client. Routes
+covered: home, categories, recipe_list with each filter and a few
+combinations, recipe_detail on the most commented recipe, and the admin
+dashboard and moderation queues. Per route it reports throughput and p50/p95/p99 latency plus the SQL
+statements per request. With --concurrency N, requests are spread over N
+threads, each with its own client.
+
+Results are written as JSON. Pass --baseline to compare against an
+earlier run: any route whose p95 got worse by more than --threshold is
+reported and the exit status is 1, so this can gate CI.
+
+    python -m benchmarks.run --recipes 1000 --recipes 100000 --output results.json
+    python -m benchmarks.run --recipes 1000 --baseline benchmarks/baseline.json
+    python -m benchmarks.run --recipes 1000 --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.generate import default_database, generate
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def scenarios(app):
+    """(name, path, as_admin) for every benchmarked request, using real values from the catalogue."""
+    from sqlalchemy import func
+
+    from flaskblog import db
+    from flaskblog.models import Comment, FacetCount, Recipe
+
+    with app.app_context():
+        busiest = db.session.execute(
+            db.select(Comment.recipe_id).group_by(Comment.recipe_id).order_by(func.count().desc()).limit(1)
+        ).scalar() or db.session.execute(db.select(func.min(Recipe.id))).scalar()
+
+        def top(facet):
+            return db.session.execute(
+                db.select(FacetCount.value).where(FacetCount.facet == facet)
+                .order_by(FacetCount.count.desc()).limit(1)
+            ).scalar() or ""
+
+        cuisine, tag = top("cuisine"), top("tag")
+
+    return [
+        ("home", "/", False),
+        ("categories", "/categories", False),
+        ("recipe_list", "/recipes", False),
+        ("recipe_list:search", "/recipes?search=garlic", False),
+        ("recipe_list:cuisine", f"/recipes?cuisine={cuisine}", False),
+        ("recipe_list:difficulty", "/recipes?difficulty=Medium", False),
+        ("recipe_list:max_time", "/recipes?max_time=30", False),
+        ("recipe_list:tag", f"/recipes?tag={tag}", False),
+        ("recipe_list:ingredient", "/recipes?ingredient=chicken,garlic", False),
+        ("recipe_list:cuisine+difficulty+time", f"/recipes?cuisine={cuisine}&difficulty=Easy&max_time=30", False),
+        ("recipe_list:search+tag", f"/recipes?search=chicken&tag={tag}", False),
+        ("recipe_detail:busiest", f"/recipe/{busiest}", False),
+        ("recipe_suggest:prefix", "/recipes/suggest?q=ga", False),
+        ("recipe_suggest:words", "/recipes/suggest?q=garlic%20pi", False),
+        ("admin:dashboard", "/admin/", True),
+        ("admin:recipes", "/admin/recipes", True),
+        ("admin:comments", "/admin/comments", True),
+        ("admin:tags", "/admin/tags", True),
+    ]
+
+
+def _client(app, admin_id):
+    client = app.test_client()
+    if admin_id is not None:
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(admin_id)
+            sess["_fresh"] = True
+    return client
+
+
+def bench_route(app, path, admin_id, requests, warmup, concurrency):
+    """Time one route. Returns a result dict (latencies in milliseconds)."""
+    from flaskblog.instrumentation import count_queries
+
+    client = _client(app, admin_id)
+    for _ in range(warmup):
+        client.get(path)
+
+    with count_queries() as counter:
+        status = client.get(path).status_code
+    queries = counter.count
+
+    durations = []
+    lock = threading.Lock()
+
+    def worker(n):
+        own = _client(app, admin_id)
+        local = []
+        for _ in range(n):
+            start = time.perf_counter()
+            own.get(path)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            durations.extend(local)
+
+    share = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(requests)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, share))
+    wall = time.perf_counter() - started
+
+    durations.sort()
+    return {
+        "status": status,
+        "requests": len(durations),
+        "rps": round(len(durations) / wall, 1) if wall else 0.0,
+        "mean": round(statistics.fmean(durations), 2),
+        "p50": round(percentile(durations, 50), 2),
+        "p95": round(percentile(durations, 95), 2),
+        "p99": round(percentile(durations, 99), 2),
+        "queries": queries,
+    }
+
+
+def run_size(recipes, args, echo=print):
+    database = default_database(recipes)
+    if args.regenerate or not os.path.exists(database):
+        generate(database, recipes, args.seed, echo=echo)
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ["CACHE_BACKEND"] = args.cache
+    os.environ["PERF_INSTRUMENTATION"] = "0"
+
+    from flaskblog import create_app, db, migrations
+    from flaskblog.models import User
+
+    app = create_app()
+    with app.app_context():
+        # Catalogues generated by an older version get the current schema.
+        migrations.upgrade(echo=echo)
+        admin_id = db.session.execute(db.select(User.id).where(User.is_admin.is_(True)).limit(1)).scalar()
+
+    results = {}
+    for name, path, as_admin in scenarios(app):
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        result = bench_route(app, path, admin_id if as_admin else None, args.requests, args.warmup, args.concurrency)
+        result["path"] = path
+        results[name] = result
+        echo(f"{recipes:>8} {name:<40} {result['rps']:>8} req/s  p50 {result['p50']:>8} ms  "
+             f"p95 {result['p95']:>8} ms  p99 {result['p99']:>8} ms  {result['queries']:>3} queries")
+    with app.app_context():
+        db.engine.dispose()
+    return results
+
+
+def compare(current, baseline, threshold):
+    """List of (size, route, old p95, new p95) that regressed by more than threshold (a fraction)."""
+    regressions = []
+    for size, routes in current["sizes"].items():
+        for route, result in routes.items():
+            old = baseline.get("sizes", {}).get(size, {}).get(route)
+            if old and old["p95"] > 0 and result["p95"] > old["p95"] * (1 + threshold):
+                regressions.append((size, route, old["p95"], result["p95"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the main routes against synthetic catalogues.")
+    parser.add_argument("--recipes", type=int, action="append",
+                        help="Catalogue size (repeatable), e.g. 1000, 100000, 1000000. Default: 1000.")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per route.")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=1, help="Threads issuing requests at once.")
+    parser.add_argument("--cache", default="none", choices=["none", "memory", "sqlite"],
+                        help="CACHE_BACKEND while benchmarking (default: none, i.e. uncached).")
+    parser.add_argument("--only", action="append", help="Only routes whose name starts with this (repeatable).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild catalogues even if they exist.")
+    parser.add_argument("--output", help="Write results JSON here.")
+    parser.add_argument("--baseline", help="Compare with this results JSON.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write results to {DEFAULT_BASELINE}.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 slowdown vs baseline (0.2 = 20%%).")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": args.cache,
+        },
+        "sizes": {},
+    }
+    for recipes in args.recipes or [1000]:
+        report["sizes"][str(recipes)] = run_size(recipes, args)
+
+    for path in filter(None, [args.output, DEFAULT_BASELINE if args.save_baseline else None]):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        for key in ("concurrency", "cache"):
+            if baseline.get("meta", {}).get(key) != report["meta"][key]:
+                print(f"warning: baseline was run with {key}={baseline.get('meta', {}).get(key)!r}, "
+                      f"this run used {report['meta'][key]!r}")
+        regressions = compare(report, baseline, args.threshold)
+        for size, route, old, new in regressions:
+            print(f"REGRESSION {size} {route}: p95 {old} ms -> {new} ms")
+        if regressions:
+            return 1
+        print(f"No p95 regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
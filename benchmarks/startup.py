@@ -0,0 +1,188 @@
+"""
+benchmarks/startup.py
+Cold-start benchmark: how long a new process takes to serve its first requests.
+
+Every run is a fresh Python process that times, in order:
+- import: `import flaskblog` (Flask, SQLAlchemy, the models)
+- create_app: configuration, blueprints, extensions, the schema version check
+- the first GET of each --path through the test client, then a second GET
+  of the first path (an already-warm request, for comparison)
+
+Modes:
+- cold: empty Jinja bytecode cache, so every template is parsed and compiled
+- bytecode: the bytecode cache left by an earlier process (a restarted
+  server, CLI commands, seed scripts)
+- preloaded: as under gunicorn with preload_app. The process runs
+  create_app() and preload.warm(), then forks; only the forked worker's
+  requests are timed (POSIX only)
+
+Reports the median and range over --runs processes per mode; "process" is
+the wall time of the whole process as seen from outside, interpreter
+start-up included.
+
+    python -m benchmarks.startup --recipes 1000
+    python -m benchmarks.startup --runs 10 --path / --path /recipes --output startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+MODES = ("cold", "bytecode", "preloaded")
+
+
+def _requests(app, paths):
+    timings = {}
+    client = app.test_client()
+    for path in paths:
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        timings[f"first {path}"] = (time.perf_counter() - started) * 1000
+        if status != 200:
+            raise SystemExit(f"GET {path} returned {status}")
+    started = time.perf_counter()
+    client.get(paths[0])
+    timings[f"warm {paths[0]}"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def child(mode, paths):
+    """Body of one measured process: prints its timings (ms) as JSON."""
+    started = time.perf_counter()
+    import flaskblog
+    imported = time.perf_counter()
+    app = flaskblog.create_app()
+    created = time.perf_counter()
+    timings = {"import": (imported - started) * 1000, "create_app": (created - imported) * 1000}
+
+    if mode != "preloaded":
+        timings.update(_requests(app, paths))
+        print(json.dumps(timings))
+        return
+
+    from flaskblog import preload
+
+    preload.warm(app)
+    timings["warm"] = (time.perf_counter() - created) * 1000
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        preload.after_fork(app)
+        with os.fdopen(write_fd, "w") as fh:
+            json.dump(_requests(app, paths), fh)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as fh:
+        timings.update(json.load(fh))
+    os.waitpid(pid, 0)
+    print(json.dumps(timings))
+
+
+def run_mode(mode, args, env):
+    """Timings of --runs fresh processes in one mode: {metric: [ms, ...]}."""
+    samples = {}
+    # The first bytecode run fills the cache and is not counted.
+    skip = 1 if mode == "bytecode" else 0
+    for run in range(args.runs + skip):
+        if mode == "cold":
+            shutil.rmtree(env["JINJA_CACHE_DIR"], ignore_errors=True)
+        command = [sys.executable, "-m", "benchmarks.startup", "--child", mode]
+        command += [arg for path in args.path for arg in ("--path", path)]
+        started = time.perf_counter()
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        elapsed = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise SystemExit(f"{mode} run failed:\n{result.stderr}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings["process"] = elapsed
+        if run < skip:
+            continue
+        for name, value in timings.items():
+            samples.setdefault(name, []).append(value)
+    return samples
+
+
+def summarise(samples):
+    return {
+        name: {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+        for name, values in samples.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import, create_app and first-request time of new processes.")
+    parser.add_argument("--recipes", type=int, default=1000, help="Catalogue size to start against.")
+    parser.add_argument("--path", action="append", help="Path to request (repeatable). Default: / and /recipes.")
+    parser.add_argument("--runs", type=int, default=5, help="Processes per mode.")
+    parser.add_argument("--mode", action="append", choices=MODES, help="Only these modes (repeatable).")
+    parser.add_argument("--cache", default="none", choices=["none", "memory", "sqlite"],
+                        help="CACHE_BACKEND of the measured processes (default: none, i.e. uncached).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results JSON here.")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.path = args.path or ["/", "/recipes"]
+
+    if args.child:
+        child(args.child, args.path)
+        return 0
+
+    from benchmarks.generate import default_database, generate
+
+    database = default_database(args.recipes)
+    if not os.path.exists(database):
+        generate(database, args.recipes, args.seed)
+
+    modes = [mode for mode in args.mode or MODES if mode != "preloaded" or hasattr(os, "fork")]
+    template_cache = tempfile.mkdtemp(prefix="jinja-cache-")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{database}",
+        CACHE_BACKEND=args.cache,
+        PERF_INSTRUMENTATION="0",
+        PASSWORD_HASH_WORKERS="0",
+        JINJA_BYTECODE_CACHE="1",
+        JINJA_CACHE_DIR=template_cache,
+    )
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "recipes": args.recipes,
+            "runs": args.runs,
+            "cache": args.cache,
+        },
+        "modes": {},
+    }
+    # Catalogues generated by an older version get the current schema (not timed).
+    subprocess.run([sys.executable, "-m", "flask", "--app", "run", "db-upgrade"], env=env, check=True,
+                   capture_output=True)
+    try:
+        for mode in modes:
+            result = summarise(run_mode(mode, args, env))
+            report["modes"][mode] = result
+            print(f"{mode}:")
+            for name, stats in result.items():
+                print(f"  {name:<24} {stats['median']:>8} ms  (min {stats['min']}, max {stats['max']})")
+    finally:
+        shutil.rmtree(template_cache, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import os
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import LoginManager
+
+from flaskblog.database import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+login_manager = LoginManager()
+login_manager.login_view = "users.login"
+login_manager.login_message_category = "info"
+# Flask-Mail is only imported and set up when MAIL_SERVER is configured (see create_app).
+mail = None
+
+def create_app():
+    global mail
+    app = Flask(__name__)
+
+    # Config
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-change-me")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///site.db")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # "production" turns on WAL/tuned pragmas and a read/write engine split for SQLite (see database.py)
+    app.config["DATABASE_PROFILE"] = os.getenv("DATABASE_PROFILE", "default")
+    app.config["DATABASE_READ_POOL_SIZE"] = int(os.getenv("DATABASE_READ_POOL_SIZE", "8"))
+
+    # Cookie hardening (sensible defaults; Secure should be True behind HTTPS)
+    app.config["SESSION_COOKIE_HTTPONLY"] = True
+    app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+    app.config["SESSION_COOKIE_SECURE"] = bool(int(os.getenv("SESSION_COOKIE_SECURE", "0")))
+
+    # Mail (optional)
+    app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER")
+    app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT", "587"))
+    app.config["MAIL_USE_TLS"] = bool(int(os.getenv("MAIL_USE_TLS", "1")))
+    app.config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME")
+    app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
+    app.config["MAIL_DEFAULT_SENDER"] = os.getenv("MAIL_DEFAULT_SENDER")
+
+    # Page/fragment cache: "memory" (per process), "sqlite" (shared by all workers) or "none"
+    app.config["CACHE_BACKEND"] = os.getenv("CACHE_BACKEND", "memory")
+    app.config["CACHE_PATH"] = os.getenv("CACHE_PATH")
+    app.config["CACHE_DEFAULT_TTL"] = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+    app.config["CACHE_MAX_ENTRIES"] = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+    # Password hashing: bcrypt cost, and a process pool so hashing never ties up request threads
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    app.config["PASSWORD_HASH_QUEUE_MAX"] = int(os.getenv("PASSWORD_HASH_QUEUE_MAX", "16"))
+    app.config["PASSWORD_HASH_TIMEOUT"] = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+    # Failed-login throttling: attempts allowed per client IP / per account in each window (seconds)
+    app.config["LOGIN_IP_ATTEMPTS"] = int(os.getenv("LOGIN_IP_ATTEMPTS", "50"))
+    app.config["LOGIN_IP_WINDOW"] = int(os.getenv("LOGIN_IP_WINDOW", "300"))
+    app.config["LOGIN_ACCOUNT_ATTEMPTS"] = int(os.getenv("LOGIN_ACCOUNT_ATTEMPTS", "5"))
+    app.config["LOGIN_ACCOUNT_WINDOW"] = int(os.getenv("LOGIN_ACCOUNT_WINDOW", "900"))
+    # Counters shared by all workers: the sqlite page cache's file, else this one (instance/throttle.sqlite3)
+    app.config["THROTTLE_PATH"] = os.getenv("THROTTLE_PATH")
+
+    # Logged-in user snapshots kept per process instead of a users-table query per request
+    app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", "60"))
+    app.config["USER_CACHE_MAX"] = int(os.getenv("USER_CACHE_MAX", "2048"))
+
+    # Recipe views: batched writes to recipe_stats and the decay of the popularity ranking
+    app.config["VIEW_FLUSH_INTERVAL"] = float(os.getenv("VIEW_FLUSH_INTERVAL", "30"))
+    app.config["VIEW_FLUSH_SIZE"] = int(os.getenv("VIEW_FLUSH_SIZE", "500"))
+    app.config["VIEW_DEDUP_SIZE"] = int(os.getenv("VIEW_DEDUP_SIZE", "50"))
+    app.config["POPULARITY_HALF_LIFE_HOURS"] = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "72"))
+    app.config["POPULAR_CAROUSEL_FALLBACK"] = bool(int(os.getenv("POPULAR_CAROUSEL_FALLBACK", "1")))
+
+    # Background image processing: worker threads and how many uploads may wait
+    app.config["IMAGE_WORKERS"] = int(os.getenv("IMAGE_WORKERS", "2"))
+    app.config["IMAGE_QUEUE_MAX"] = int(os.getenv("IMAGE_QUEUE_MAX", "32"))
+
+    # Static assets: content-fingerprinted URLs served with immutable caching
+    app.config["STATIC_FINGERPRINT"] = bool(int(os.getenv("STATIC_FINGERPRINT", "1")))
+
+    # Performance instrumentation (SQL/template timings + Server-Timing header)
+    app.config["PERF_INSTRUMENTATION"] = bool(int(os.getenv("PERF_INSTRUMENTATION", "0")))
+
+    # Compiled templates cached on disk, so cold processes skip parsing them
+    app.config["JINJA_BYTECODE_CACHE"] = bool(int(os.getenv("JINJA_BYTECODE_CACHE", "1")))
+    app.config["JINJA_CACHE_DIR"] = os.getenv("JINJA_CACHE_DIR")
+
+    from flaskblog import database
+    database.configure(app)
+    db.init_app(app)
+    database.init_app(app)
+    login_manager.init_app(app)
+    if app.config["MAIL_SERVER"]:
+        from flask_mail import Mail
+        mail = Mail(app)
+
+    from flaskblog.cache import cache
+    cache.init_app(app)
+
+    # Off-thread bcrypt with back-pressure, and login throttling.
+    from flaskblog import passwords, throttle
+    passwords.init_app(app)
+    throttle.init_app(app)
+
+    from flaskblog.main.routes import main
+    from flaskblog.users.routes import users
+    from flaskblog.recipes.routes import recipes
+    from flaskblog.admin.routes import admin
+    from flaskblog.api.routes import api
+    from flaskblog.feeds.routes import feeds
+
+    app.register_blueprint(main)
+    app.register_blueprint(users)
+    app.register_blueprint(recipes)
+    app.register_blueprint(admin)
+    # Read-only JSON API: /api/v1/..., with /api/... serving the current version.
+    app.register_blueprint(api)
+    app.register_blueprint(api, name="api_current", url_prefix="/api")
+    app.register_blueprint(feeds)
+
+    from flaskblog.errors.handlers import errors
+    app.register_blueprint(errors)
+
+    from flaskblog import instrumentation
+    instrumentation.init_app(app)
+
+    # Fingerprinted, precompressed static files (replaces the default static view).
+    from flaskblog import assets
+    assets.init_app(app)
+
+    # Compiled-template cache, and the warm-up/after-fork hooks used by gunicorn.conf.py.
+    from flaskblog import preload
+    preload.init_app(app)
+
+    # Versioned schema migrations: `flask db-upgrade` applies them (only the version is checked here).
+    from flaskblog import migrations
+    migrations.init_app(app)
+
+    # Cached user loader.
+    from flaskblog import identity
+    identity.init_app(app)
+
+    # Recipe update versions for API ETags (session hooks).
+    from flaskblog import revisions
+    revisions.init_app(app)
+
+    # Denormalised comment counts and comment pages.
+    from flaskblog import comments
+    comments.init_app(app)
+
+    # Maintained dashboard totals.
+    from flaskblog import counters
+    counters.init_app(app)
+
+    # Full-text search index (SQLite FTS5; other databases fall back to ILIKE).
+    from flaskblog import search
+    search.init_app(app)
+
+    # Normalised ingredient index (backfill command for existing databases).
+    from flaskblog import ingredients
+    ingredients.init_app(app)
+
+    # Materialised facet counts for filters and popular tags.
+    from flaskblog import facets
+    facets.init_app(app)
+
+    # Precomputed related-recipe suggestions.
+    from flaskblog import related
+    related.init_app(app)
+
+    # Buffered view counting and the "popular right now" ranking.
+    from flaskblog import popularity
+    popularity.init_app(app)
+
+    # Responsive image variants (srcset helper + regenerate command).
+    from flaskblog import images
+    images.init_app(app)
+
+    # Content-addressed image manifest (reconcile command for existing files).
+    from flaskblog import image_store
+    image_store.init_app(app)
+
+    # Streaming JSONL/CSV import and export of recipes.
+    from flaskblog import bulk
+    bulk.init_app(app)
+
+    return app
@@ -0,0 +1,172 @@
+from flask import Blueprint, render_template, url_for, flash, redirect, request, abort, current_app
+from flask_login import login_required, current_user
+from flaskblog import db
+from flaskblog import search as recipe_search
+from flaskblog import instrumentation
+from flaskblog import facets
+from flaskblog import comments
+from flaskblog import counters
+from flaskblog import moderation
+from flaskblog import image_store
+from flaskblog.cache import cache
+from flaskblog.models import Recipe, Comment, Tag
+from flaskblog.pagination import keyset_paginate, NEWEST_FIRST
+
+admin = Blueprint("admin", __name__, url_prefix="/admin")
+
+def admin_required():
+    if not current_user.is_authenticated or not current_user.is_admin:
+        abort(403)
+
+@admin.route("/")
+@login_required
+def dashboard():
+    admin_required()
+    # Maintained totals (flaskblog.counters) rather than COUNT(*) over each table.
+    totals = counters.all_counts()
+    return render_template(
+        "admin/dashboard.html", title="Admin",
+        recipe_count=totals[counters.RECIPES], comment_count=totals[counters.COMMENTS],
+        pending_count=totals[counters.PENDING_COMMENTS], tag_count=totals[counters.TAGS],
+    )
+
+@admin.route("/performance", methods=["GET", "POST"])
+@login_required
+def performance():
+    admin_required()
+    if request.method == "POST":
+        instrumentation.stats.reset()
+        flash("Performance stats reset.", "info")
+        return redirect(url_for("admin.performance"))
+    enabled = current_app.extensions.get("perf_instrumentation", False)
+    return render_template("admin/performance.html", title="Performance", enabled=enabled, rows=instrumentation.stats.snapshot())
+
+def _ticked_ids():
+    """Ids ticked in a bulk form, or None when the action applies to everything matching the filters."""
+    if request.form.get("scope") == "matching":
+        return None
+    return [int(i) for i in request.form.getlist("ids") if i.isdigit()]
+
+@admin.route("/recipes")
+@login_required
+def manage_recipes():
+    admin_required()
+    # Filtered, keyset-paginated queue (only the columns the list shows, author joined in).
+    filters = moderation.read_filters(request.args, moderation.RECIPE_FILTERS)
+    recipes = keyset_paginate(
+        moderation.recipe_queue(filters), NEWEST_FIRST,
+        cursor=request.args.get("cursor", "", type=str), per_page=moderation.PER_PAGE, with_count=True,
+    )
+    return render_template("admin/recipes.html", title="Manage Recipes", recipes=recipes, filters=filters)
+
+@admin.route("/recipes/bulk", methods=["POST"])
+@login_required
+def bulk_recipes():
+    admin_required()
+    filters = moderation.read_filters(request.form, moderation.RECIPE_FILTERS)
+    ids = _ticked_ids()
+    if ids == [] or request.form.get("action") != "delete":
+        flash("Nothing selected.", "warning")
+        return redirect(url_for("admin.manage_recipes", **filters))
+    criteria = moderation.recipe_criteria(filters)
+    if ids is None and not criteria:
+        flash("Set a filter before deleting all matching recipes (with none, that is every recipe).", "danger")
+        return redirect(url_for("admin.manage_recipes", **filters))
+    selection = moderation.selected_ids(Recipe, criteria, ids)
+    removed = moderation.delete_recipes(selection)
+    db.session.commit()
+    image_store.purge_orphans()
+    cache.invalidate("recipes", "tags", "comments")
+    flash(f"Deleted {removed} recipes.", "info")
+    return redirect(url_for("admin.manage_recipes", **filters))
+
+@admin.route("/comments")
+@login_required
+def manage_comments():
+    admin_required()
+    # Filtered, keyset-paginated queue; unapproved comments by default.
+    filters = moderation.read_filters(request.args, moderation.COMMENT_FILTERS)
+    filters["status"] = filters["status"] if filters["status"] in moderation.STATUSES else "pending"
+    page = keyset_paginate(
+        moderation.comment_queue(filters), comments.NEWEST_FIRST,
+        cursor=request.args.get("cursor", "", type=str), per_page=moderation.PER_PAGE, with_count=True,
+    )
+    return render_template(
+        "admin/comments.html", title="Manage Comments",
+        comments=page, filters=filters, statuses=moderation.STATUSES,
+    )
+
+@admin.route("/comments/bulk", methods=["POST"])
+@login_required
+def bulk_comments():
+    admin_required()
+    filters = moderation.read_filters(request.form, moderation.COMMENT_FILTERS)
+    action = request.form.get("action")
+    ids = _ticked_ids()
+    if ids == [] or action not in ("approve", "delete"):
+        flash("Nothing selected.", "warning")
+        return redirect(url_for("admin.manage_comments", **filters))
+    criteria = moderation.comment_criteria(filters)
+    if ids is None and action == "delete" and not criteria:
+        flash("Set a filter before deleting all matching comments (with none, that is every comment).", "danger")
+        return redirect(url_for("admin.manage_comments", **filters))
+    selection = moderation.selected_ids(Comment, criteria, ids)
+    if action == "approve":
+        changed = moderation.approve_comments(selection)
+        message = f"Approved {changed} comments."
+    else:
+        changed = moderation.delete_comments(selection)
+        message = f"Deleted {changed} comments."
+    db.session.commit()
+    cache.invalidate("comments")
+    flash(message, "info")
+    return redirect(url_for("admin.manage_comments", **filters))
+
+@admin.route("/comment/<int:comment_id>/delete", methods=["POST"])
+@login_required
+def delete_comment(comment_id):
+    admin_required()
+    c = Comment.query.get_or_404(comment_id)
+    comments.delete_comment(c)
+    db.session.commit()
+    cache.invalidate("comments")
+    flash("Comment removed.", "info")
+    return redirect(url_for("admin.manage_comments"))
+
+@admin.route("/tags", methods=["GET", "POST"])
+@login_required
+def manage_tags():
+    admin_required()
+    if request.method == "POST":
+        name = (request.form.get("name") or "").strip().lower()
+        if name and len(name) <= 40:
+            if not Tag.query.filter_by(name=name).first():
+                db.session.add(Tag(name=name))
+                db.session.commit()
+                cache.invalidate("tags")
+                flash("Tag added.", "success")
+            else:
+                flash("Tag already exists.", "warning")
+        else:
+            flash("Invalid tag name.", "danger")
+        return redirect(url_for("admin.manage_tags"))
+    tags = Tag.query.order_by(Tag.name.asc()).all()
+    return render_template("admin/tags.html", title="Manage Tags", tags=tags)
+
+@admin.route("/tag/<int:tag_id>/delete", methods=["POST"])
+@login_required
+def delete_tag(tag_id):
+    admin_required()
+    t = Tag.query.get_or_404(tag_id)
+    # Detach from recipes first so their search index rows lose the tag name too.
+    affected = list(t.recipes)
+    for r in affected:
+        r.tags.remove(t)
+    db.session.delete(t)
+    facets.remove_value(facets.TAG, t.name)
+    for r in affected:
+        recipe_search.index_recipe(r)
+    db.session.commit()
+    cache.invalidate("tags", "recipes")
+    flash("Tag deleted.", "info")
+    return redirect(url_for("admin.manage_tags"))
@@ -0,0 +1,184 @@
+"""
+Read-only JSON API, version 1 (mobile app, canteen display screens).
+
+    GET /api/v1/recipes            filters as on /recipes (search, cuisine, difficulty,
+                                   max_time, ingredient, tag), cursor + limit paging
+    GET /api/v1/recipes/<id>
+    GET /api/v1/tags               tag names with recipe counts
+
+/api/... serves the current version. `fields=title,tags,...` picks the
+fields returned; list calls leave out ingredients, instructions and
+video_url unless asked for. Every response carries a weak ETag and
+Last-Modified built from the recipes' update versions (flaskblog.revisions),
+so a poll with If-None-Match / If-Modified-Since gets a bodiless 304 when
+nothing changed, without serialising anything.
+"""
+
+import hashlib
+from datetime import timezone
+from urllib.parse import urljoin
+
+import orjson
+from flask import Blueprint, Response, abort, request, url_for
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from werkzeug.exceptions import HTTPException
+
+from flaskblog import db, facets, images
+from flaskblog.cache import cache
+from flaskblog.models import Recipe, User
+from flaskblog.pagination import NEWEST_FIRST, keyset_paginate
+from flaskblog.recipes.routes import apply_filters, read_filters
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+# field name -> (recipe columns it needs, value for one recipe)
+FIELDS = {
+    "id": ((), lambda r: r.id),
+    "title": ((Recipe.title,), lambda r: r.title),
+    "summary": ((Recipe.summary,), lambda r: r.summary),
+    "cuisine": ((Recipe.cuisine,), lambda r: r.cuisine),
+    "difficulty": ((Recipe.difficulty,), lambda r: r.difficulty),
+    "cook_time_mins": ((Recipe.cook_time_mins,), lambda r: r.cook_time_mins),
+    "image_url": ((Recipe.image_file,), lambda r: urljoin(request.host_url, images.image_set("recipe_pics", r.image_file).src)),
+    "author": ((Recipe.user_id,), lambda r: {"id": r.user_id, "username": r.author.username}),
+    "tags": ((), lambda r: [t.name for t in r.tags]),
+    "comment_count": ((), lambda r: r.comment_count),
+    "date_posted": ((), lambda r: r.date_posted),
+    "updated_at": ((), lambda r: r.updated_at),
+    "ingredients": ((Recipe.ingredients,), lambda r: r.ingredients.splitlines()),
+    "instructions": ((Recipe.instructions,), lambda r: r.instructions.splitlines()),
+    "video_url": ((Recipe.video_url,), lambda r: r.video_url),
+    "url": ((), lambda r: url_for("recipes.recipe_detail", recipe_id=r.id, _external=True)),
+}
+DETAIL_FIELDS = tuple(FIELDS)
+LIST_FIELDS = tuple(name for name in FIELDS if name not in ("ingredients", "instructions", "video_url"))
+
+# Always loaded: the page order and the cache validators.
+_BASE_COLUMNS = (Recipe.id, Recipe.date_posted, Recipe.version, Recipe.updated_at, Recipe.comment_count)
+
+
+# Status codes are listed too: the site-wide HTML handlers for them would otherwise win.
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(429)
+@api.errorhandler(HTTPException)
+def _json_error(error):
+    response = _json({"error": error.name, "message": error.description}, status=error.code)
+    if getattr(error, "retry_after", None):
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def _json(payload, status=200):
+    return Response(orjson.dumps(payload), status=status, mimetype="application/json")
+
+
+def _requested_fields(default):
+    """Fields named by ?fields=a,b,c (in the order given), or the default set."""
+    raw = request.args.get("fields", "", type=str)
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        abort(400, description=f"Unknown field(s): {', '.join(unknown)}.")
+    return fields or default
+
+
+def _load_options(fields):
+    columns = set(_BASE_COLUMNS)
+    for name in fields:
+        columns.update(FIELDS[name][0])
+    options = [load_only(*columns)]
+    if "author" in fields:
+        options.append(joinedload(Recipe.author).load_only(User.username))
+    if "tags" in fields:
+        options.append(selectinload(Recipe.tags))
+    return options
+
+
+def _serialise(recipe, fields):
+    return {name: FIELDS[name][1](recipe) for name in fields}
+
+
+def _validators(*parts):
+    """Weak ETag from the parts that decide a response body."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def _not_modified(etag, last_modified):
+    """True when the client's copy (If-None-Match / If-Modified-Since) is still current."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+
+def _conditional(build, etag, last_modified=None):
+    """304 if the client is current; otherwise the JSON body from build()."""
+    response = Response(status=304) if _not_modified(etag, last_modified) else _json(build())
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Clients may keep the response but must revalidate before reusing it.
+    response.cache_control.no_cache = True
+    return response
+
+
+@api.route("/recipes")
+def recipe_list():
+    fields = _requested_fields(LIST_FIELDS)
+    per_page = min(max(request.args.get("limit", PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    filters = read_filters(request.args)
+
+    query, ranked = apply_filters(Recipe.query.options(*_load_options(fields)), filters)
+    keys = NEWEST_FIRST if ranked is None else [(ranked.c.rank, False)] + NEWEST_FIRST
+    page = keyset_paginate(query, keys, cursor=request.args.get("cursor", "", type=str), per_page=per_page)
+
+    etag = _validators(
+        fields, page.next_cursor, page.prev_cursor,
+        [(r.id, r.version, r.comment_count) for r in page.items],
+    )
+    last_modified = max((r.updated_at or r.date_posted for r in page.items), default=None)
+    return _conditional(
+        lambda: {
+            "recipes": [_serialise(r, fields) for r in page.items],
+            "next_cursor": page.next_cursor,
+            "prev_cursor": page.prev_cursor,
+        },
+        etag,
+        last_modified,
+    )
+
+
+@api.route("/recipes/<int:recipe_id>")
+def recipe_detail(recipe_id):
+    fields = _requested_fields(DETAIL_FIELDS)
+    # Validators first (one indexed row); the recipe itself only loads when the client is stale.
+    stamp = db.session.execute(
+        db.select(Recipe.version, Recipe.comment_count, Recipe.updated_at, Recipe.date_posted)
+        .where(Recipe.id == recipe_id)
+    ).first()
+    if stamp is None:
+        abort(404, description="No such recipe.")
+    version, comment_count, updated_at, date_posted = stamp
+
+    def build():
+        recipe = db.session.get(Recipe, recipe_id, options=_load_options(fields))
+        return _serialise(recipe, fields)
+
+    return _conditional(build, _validators(fields, recipe_id, version, comment_count), updated_at or date_posted)
+
+
+@api.route("/tags")
+def tag_list():
+    counts = cache.get_or_set("facets:all", facets.all_counts, depends=("recipes", "tags"))[facets.TAG]
+    tags = sorted(counts.items())
+    return _conditional(
+        lambda: {"tags": [{"name": name, "recipes": count} for name, count in tags]},
+        _validators(tags),
+    )
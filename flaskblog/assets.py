@@ -0,0 +1,258 @@
+"""
+assets.py
+Fingerprinted static assets with long-lived caching and precompression.
+
+url_for("static", filename="main.css") is rewritten to "main.<hash>.css",
+where <hash> is taken from the file's content. Because the URL changes
+whenever the file does, fingerprinted responses are sent with
+"Cache-Control: public, max-age=31536000, immutable" and browsers never
+ask for them again until a deploy changes the content.
+
+Uploaded pictures are already named by their content digest (see
+image_store.py), so they are served as immutable without an extra hash.
+
+Text assets (CSS, JS, SVG, ...) are served precompressed as .br (when the
+brotli package is installed) or .gz, matching the request's Accept-Encoding.
+Every static response carries an ETag, so anything requested without a
+fingerprint still revalidates with a cheap 304.
+
+`flask assets-build` hashes and precompresses everything ahead of time and
+writes static/assets-manifest.json, which is loaded at startup so the app
+does not hash files on first use.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+MANIFEST_NAME = "assets-manifest.json"
+HASH_LENGTH = 10
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".xml", ".map"}
+# Files smaller than this are not worth compressing.
+MIN_COMPRESS_SIZE = 512
+
+# "main.3f2a1b9c0d.css" -> ("main", "3f2a1b9c0d", ".css")
+_FINGERPRINTED_RE = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[A-Za-z0-9]+)$" % HASH_LENGTH)
+# Content-addressed uploads and their variants: "<digest>.jpg", "<digest>-480.webp"
+_CONTENT_NAMED_RE = re.compile(r"^[0-9a-f]{32}(-\d+)?\.[A-Za-z0-9]+$")
+
+_SKIP_DIRS = {"_incoming"}
+
+
+class AssetRegistry:
+    """Content hashes of static files, filled from the build manifest or on first use."""
+
+    def __init__(self):
+        self.static_dir = None
+        self.check_mtime = True
+        self._hashes = {}           # filename -> (mtime, hash)
+        self._lock = threading.Lock()
+
+    def init(self, static_dir):
+        """
+        Load the build manifest if there is one. With a manifest (a deploy) the
+        hashes are trusted as-is; without one (development) files are re-hashed
+        whenever their mtime changes, so edits show up on the next page load.
+        """
+        self.static_dir = static_dir
+        manifest = os.path.join(static_dir, MANIFEST_NAME)
+        if os.path.exists(manifest):
+            with open(manifest, encoding="utf-8") as fh:
+                data = json.load(fh)
+            self._hashes = {name: (None, digest) for name, digest in data.items()}
+            self.check_mtime = False
+
+    def digest(self, filename):
+        """Short content hash of a static file, or None if it does not exist."""
+        entry = self._hashes.get(filename)
+        if entry is not None and not self.check_mtime:
+            return entry[1]
+
+        try:
+            mtime = os.stat(os.path.join(self.static_dir, filename)).st_mtime
+        except OSError:
+            return None
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        digest = _hash_file(os.path.join(self.static_dir, filename))
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
+
+
+registry = AssetRegistry()
+
+
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:HASH_LENGTH]
+
+
+def is_content_named(filename):
+    return bool(_CONTENT_NAMED_RE.match(os.path.basename(filename)))
+
+
+def fingerprint(filename):
+    """"css/main.css" -> "css/main.<hash>.css" (unchanged if missing or already content-named)."""
+    if is_content_named(filename):
+        return filename
+    digest = registry.digest(filename)
+    if digest is None:
+        return filename
+    head, tail = os.path.split(filename)
+    stem, ext = os.path.splitext(tail)
+    return os.path.join(head, f"{stem}.{digest}{ext}") if head else f"{stem}.{digest}{ext}"
+
+
+def _split_fingerprint(filename):
+    """Return (real filename, fingerprint hash or None)."""
+    head, tail = os.path.split(filename)
+    match = _FINGERPRINTED_RE.match(tail)
+    if not match:
+        return filename, None
+    real = match.group("stem") + match.group("ext")
+    return (f"{head}/{real}" if head else real), match.group("hash")
+
+
+def _url_defaults(endpoint, values):
+    if endpoint == "static" and "filename" in values:
+        values["filename"] = fingerprint(values["filename"])
+
+
+def _precompressed(filename, encoding):
+    """Path (relative to static/) of a compressed copy, creating it on first use."""
+    suffix = ".br" if encoding == "br" else ".gz"
+    source = os.path.join(registry.static_dir, filename)
+    target = source + suffix
+    try:
+        source_mtime = os.stat(source).st_mtime
+        if os.path.exists(target) and os.stat(target).st_mtime >= source_mtime:
+            return filename + suffix
+        if os.path.getsize(source) < MIN_COMPRESS_SIZE:
+            return None
+        _compress_file(source, target, encoding)
+    except OSError:
+        return None
+    return filename + suffix
+
+
+def _compress_file(source, target, encoding):
+    with open(source, "rb") as fh:
+        data = fh.read()
+    if encoding == "br":
+        data = brotli.compress(data, quality=11)
+    else:
+        data = gzip.compress(data, compresslevel=9, mtime=0)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, target)
+
+
+def _pick_encoding(filename):
+    if os.path.splitext(filename)[1].lower() not in COMPRESSIBLE:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def serve_static(filename):
+    """Replacement for Flask's static view: fingerprint-aware caching, precompression and ETags."""
+    if safe_join(registry.static_dir, filename) is None:
+        raise NotFound()
+    real, fp = _split_fingerprint(filename)
+    if fp is not None and registry.digest(real) is None:
+        # Not a fingerprint after all (a file whose own name looks like one).
+        real, fp = filename, None
+    immutable = (fp is not None and fp == registry.digest(real)) or is_content_named(real)
+
+    encoding = _pick_encoding(real)
+    compressed = _precompressed(real, encoding) if encoding else None
+    mimetype = mimetypes.guess_type(real)[0] or "application/octet-stream"
+
+    try:
+        response = send_from_directory(
+            registry.static_dir, compressed or real, mimetype=mimetype, conditional=True, etag=True,
+        )
+    except NotFound:
+        if compressed is None:
+            raise
+        compressed = None
+        response = send_from_directory(registry.static_dir, real, mimetype=mimetype, conditional=True, etag=True)
+
+    if compressed:
+        response.headers["Content-Encoding"] = encoding
+    if os.path.splitext(real)[1].lower() in COMPRESSIBLE:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+    return response
+
+
+def build(static_dir, echo=None):
+    """Hash and precompress every static asset and write the manifest. Returns the number of files."""
+    hashes = {}
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if d not in _SKIP_DIRS]
+        for name in files:
+            if name == MANIFEST_NAME or name.endswith((".gz", ".br", ".tmp")):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            if is_content_named(rel):
+                continue
+            hashes[rel] = _hash_file(path)
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE and os.path.getsize(path) >= MIN_COMPRESS_SIZE:
+                for encoding in encodings:
+                    _compress_file(path, path + (".br" if encoding == "br" else ".gz"), encoding)
+                if echo:
+                    echo(f"compressed {rel}")
+
+    with open(os.path.join(static_dir, MANIFEST_NAME), "w", encoding="utf-8") as fh:
+        json.dump(hashes, fh, indent=0, sort_keys=True)
+    return len(hashes)
+
+
+@click.command("assets-build")
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress static assets (run on deploy)."""
+    count = build(current_app.static_folder, echo=click.echo)
+    if brotli is None:
+        click.echo("brotli not installed: wrote gzip copies only.")
+    click.echo(f"Fingerprinted {count} assets into {MANIFEST_NAME}.")
+
+
+def init_app(app):
+    app.cli.add_command(build_assets_command)
+    if not app.config.get("STATIC_FINGERPRINT", True):
+        return
+    registry.init(app.static_folder)
+    app.url_defaults(_url_defaults)
+    app.view_functions["static"] = serve_static
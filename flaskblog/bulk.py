@@ -0,0 +1,343 @@
+"""
+bulk.py
+Streaming bulk import/export of recipes (JSONL or CSV).
+
+Both directions run in constant memory, so catalogues with hundreds of
+thousands of recipes can be loaded or dumped:
+
+- import reads one record at a time, resolves authors, tags and ingredients
+  through in-memory name -> id maps, and writes recipes, tag links,
+  ingredient links and search-index rows with executemany batches,
+  committing every --commit-every rows. Facet counts and the dashboard
+  counters are accumulated and applied once per transaction.
+- export walks the recipe table with yield_per and writes each row as it goes.
+
+Record fields: title, summary, cuisine, difficulty, cook_time_mins,
+ingredients, instructions, video_url, image_file, date_posted (ISO 8601),
+author (username or email) and tags (a list in JSONL, comma separated in CSV).
+Pictures are referenced by filename only; run `flask images-reconcile`
+after importing so the image manifest counts the new references.
+
+    flask recipes-import catalogue.jsonl --author admin@bonnyrigg.local
+    flask recipes-export backup.csv
+"""
+
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.orm import joinedload, selectinload
+
+from flaskblog import counters, db, facets, related
+from flaskblog import ingredients as ingredient_index
+from flaskblog import search as recipe_search
+from flaskblog.cache import cache
+from flaskblog.models import Ingredient, Recipe, Tag, User, recipe_ingredients, recipe_tags, utcnow
+
+FIELDS = [
+    "title", "summary", "cuisine", "difficulty", "cook_time_mins", "ingredients",
+    "instructions", "video_url", "image_file", "date_posted", "author", "tags",
+]
+REQUIRED = ("title", "ingredients", "instructions")
+
+# Progress is reported at least this often (seconds).
+PROGRESS_INTERVAL = 5
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported (reported and skipped)."""
+
+
+def read_records(fh, fmt):
+    """Yield (line_number, dict) from a JSONL or CSV stream."""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(fh), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def _clean_tags(value):
+    if not value:
+        return []
+    names = value.split(",") if isinstance(value, str) else value
+    out = []
+    for name in names:
+        name = str(name).strip().lower()
+        if name and len(name) <= 40 and name not in out:
+            out.append(name)
+    return out
+
+
+def _recipe_row(record, author_id):
+    """Validate one record and return the recipe column values."""
+    if not isinstance(record, dict):
+        raise RecordError("not a JSON object")
+    missing = [f for f in REQUIRED if not str(record.get(f) or "").strip()]
+    if missing:
+        raise RecordError(f"missing {', '.join(missing)}")
+
+    cook_time = record.get("cook_time_mins")
+    try:
+        cook_time = int(cook_time) if cook_time not in (None, "") else None
+    except (TypeError, ValueError) as exc:
+        raise RecordError(f"bad cook_time_mins {cook_time!r}") from exc
+
+    posted = record.get("date_posted")
+    try:
+        posted = datetime.fromisoformat(posted) if posted else utcnow()
+    except (TypeError, ValueError) as exc:
+        raise RecordError(f"bad date_posted {posted!r}") from exc
+
+    def text(field, limit=None):
+        value = str(record.get(field) or "").strip()
+        return (value[:limit] if limit else value) or None
+
+    return {
+        "title": text("title", 120),
+        "summary": text("summary", 240),
+        "cuisine": text("cuisine", 50),
+        "difficulty": text("difficulty", 20),
+        "cook_time_mins": cook_time,
+        "ingredients": text("ingredients"),
+        "instructions": text("instructions"),
+        "video_url": text("video_url", 255),
+        "image_file": text("image_file", 80) or "default_recipe.jpg",
+        "date_posted": posted,
+        "user_id": author_id,
+    }
+
+
+class _Importer:
+    """Holds the name -> id maps and the pending batch of one import run."""
+
+    def __init__(self, default_author_id, batch_size):
+        self.default_author_id = default_author_id
+        self.batch_size = batch_size
+        self.authors = {}
+        for user_id, username, email in db.session.execute(db.select(User.id, User.username, User.email)):
+            self.authors[username.lower()] = user_id
+            self.authors[email.lower()] = user_id
+        self.tags = dict(db.session.execute(db.select(Tag.name, Tag.id)).all())
+        self.ingredients = dict(db.session.execute(db.select(Ingredient.name, Ingredient.id)).all())
+        self.batch = []             # (recipe row, tag names)
+        self.facet_deltas = Counter()
+        self.counter_deltas = Counter()
+
+    def add(self, record):
+        row = _recipe_row(record, self.default_author_id)
+        author = str(record.get("author") or "").strip().lower()
+        row["user_id"] = self.authors.get(author, self.default_author_id)
+        self.batch.append((row, _clean_tags(record.get("tags"))))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def _tag_id(self, name):
+        tag_id = self.tags.get(name)
+        if tag_id is None:
+            tag_id = db.session.execute(Tag.__table__.insert().values(name=name)).inserted_primary_key[0]
+            self.tags[name] = tag_id
+            self.counter_deltas[counters.TAGS] += 1
+        return tag_id
+
+    def _ingredient_id(self, name):
+        ingredient_id = self.ingredients.get(name)
+        if ingredient_id is None:
+            ingredient_id = db.session.execute(
+                Ingredient.__table__.insert().values(name=name)
+            ).inserted_primary_key[0]
+            self.ingredients[name] = ingredient_id
+        return ingredient_id
+
+    def flush(self):
+        """Write the pending batch: recipes, tag/ingredient links and search rows."""
+        if not self.batch:
+            return
+        table = Recipe.__table__
+        ids = db.session.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True),
+            [row for row, _ in self.batch],
+        ).scalars().all()
+
+        tag_links, ingredient_links, documents = [], [], []
+        for recipe_id, (row, tag_names) in zip(ids, self.batch):
+            for name in tag_names:
+                tag_links.append({"recipe_id": recipe_id, "tag_id": self._tag_id(name)})
+            ingredient_names = ingredient_index.parse_ingredients(row["ingredients"])
+            for name in ingredient_names:
+                ingredient_links.append({"recipe_id": recipe_id, "ingredient_id": self._ingredient_id(name)})
+            documents.append({
+                "rowid": recipe_id,
+                "title": row["title"],
+                "summary": row["summary"] or "",
+                "ingredients": row["ingredients"],
+                "tags": " ".join(tag_names),
+            })
+            for value in facets.facet_values(
+                tag_names, row["cuisine"], row["difficulty"], row["cook_time_mins"], ingredient_names,
+            ):
+                self.facet_deltas[value] += 1
+
+        if tag_links:
+            db.session.execute(recipe_tags.insert(), tag_links)
+        if ingredient_links:
+            db.session.execute(recipe_ingredients.insert(), ingredient_links)
+        recipe_search.index_documents(documents)
+        self.counter_deltas[counters.RECIPES] += len(ids)
+        self.batch = []
+
+    def commit(self):
+        self.flush()
+        facets.apply_counts(self.facet_deltas)
+        counters.apply(self.counter_deltas)
+        self.facet_deltas = Counter()
+        self.counter_deltas = Counter()
+        db.session.commit()
+
+
+def import_records(records, default_author_id, batch_size=1000, commit_every=10000, echo=None):
+    """
+    Import (line_number, record) pairs. Returns (imported, skipped).
+
+    Bad records are skipped and reported through echo; everything else is
+    committed in transactions of commit_every rows.
+    """
+    importer = _Importer(default_author_id, batch_size)
+    imported = skipped = 0
+    started = last_report = time.perf_counter()
+
+    for number, record in records:
+        try:
+            importer.add(record)
+        except RecordError as exc:
+            skipped += 1
+            if echo and skipped <= 20:
+                echo(f"line {number}: skipped ({exc})")
+            continue
+        imported += 1
+
+        if imported % commit_every == 0:
+            importer.commit()
+        now = time.perf_counter()
+        if echo and now - last_report >= PROGRESS_INTERVAL:
+            echo(f"{imported} rows, {imported / (now - started):.0f} rows/s")
+            last_report = now
+
+    importer.commit()
+    if imported:
+        cache.invalidate("recipes", "tags")
+    if echo:
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        echo(f"Imported {imported} recipes ({skipped} skipped) in {elapsed:.1f}s, {imported / elapsed:.0f} rows/s.")
+    return imported, skipped
+
+
+def export_records(batch_size=1000):
+    """Yield every recipe as a record dict, streaming the table with yield_per."""
+    query = (
+        Recipe.query
+        .options(
+            selectinload(Recipe.tags),
+            joinedload(Recipe.author).load_only(User.username),
+        )
+        .order_by(Recipe.id)
+        .yield_per(batch_size)
+    )
+    for recipe in query:
+        yield {
+            "title": recipe.title,
+            "summary": recipe.summary,
+            "cuisine": recipe.cuisine,
+            "difficulty": recipe.difficulty,
+            "cook_time_mins": recipe.cook_time_mins,
+            "ingredients": recipe.ingredients,
+            "instructions": recipe.instructions,
+            "video_url": recipe.video_url,
+            "image_file": recipe.image_file,
+            "date_posted": recipe.date_posted.isoformat(),
+            "author": recipe.author.username,
+            "tags": [t.name for t in recipe.tags],
+        }
+
+
+def write_records(records, fh, fmt):
+    """Write records to fh as JSONL or CSV. Returns the number written."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(fh, fieldnames=FIELDS)
+        writer.writeheader()
+        for record in records:
+            record["tags"] = ", ".join(record["tags"])
+            writer.writerow(record)
+            count += 1
+        return count
+    for record in records:
+        fh.write(json.dumps(record, ensure_ascii=False))
+        fh.write("\n")
+        count += 1
+    return count
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+@click.command("recipes-import")
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), help="Defaults to the file extension.")
+@click.option("--author", help="Username or email used when a record's author is missing or unknown.")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows per executemany batch.")
+@click.option("--commit-every", default=10000, show_default=True, help="Rows per transaction.")
+@with_appcontext
+def import_command(path, fmt, author, batch_size, commit_every):
+    """Import recipes from a JSONL or CSV file ('-' reads stdin)."""
+    query = db.select(User.id)
+    if author:
+        query = query.where((User.username == author) | (User.email == author))
+    else:
+        query = query.order_by(User.is_admin.desc(), User.id)
+    default_author_id = db.session.execute(query.limit(1)).scalar()
+    if default_author_id is None:
+        raise click.ClickException("No such author." if author else "Create a user first (e.g. run seed.py).")
+
+    fmt = _format_for(path, fmt)
+    with nullcontext(sys.stdin) if path == "-" else open(path, encoding="utf-8", newline="") as fh:
+        imported, _ = import_records(read_records(fh, fmt), default_author_id, batch_size, commit_every, echo=click.echo)
+    if imported:
+        click.echo("Recomputing related recipes...")
+        related.rebuild(echo=click.echo)
+
+
+@click.command("recipes-export")
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), help="Defaults to the file extension.")
+@with_appcontext
+def export_command(path, fmt):
+    """Export every recipe to a JSONL or CSV file ('-' writes stdout)."""
+    fmt = _format_for(path, fmt)
+    started = time.perf_counter()
+    with nullcontext(sys.stdout) if path == "-" else open(path, "w", encoding="utf-8", newline="") as fh:
+        count = write_records(export_records(), fh, fmt)
+    if path != "-":
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        click.echo(f"Exported {count} recipes in {elapsed:.1f}s, {count / elapsed:.0f} rows/s.")
+
+
+def init_app(app):
+    app.cli.add_command(import_command)
+    app.cli.add_command(export_command)
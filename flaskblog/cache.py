@@ -0,0 +1,272 @@
+"""
+cache.py
+Page and fragment caching with write-driven invalidation.
+
+Two kinds of caching share one pluggable backend:
+
+- cached_page(): whole responses for anonymous GET requests (home, categories,
+  recipe list). A hit is served without running the view or touching the database.
+- cache.get_or_set(): small pieces of data reused by many pages (filter
+  dropdown values, top tags, ...), so logged-in users benefit too.
+
+Entries belong to one or more namespaces ("recipes", "tags", "comments").
+Every namespace has a generation token that is part of each cache key, and
+write paths call cache.invalidate("recipes", ...) after committing, which
+swaps the token so every dependent entry is skipped from then on (and later
+evicted/expired). With the SQLite backend the tokens live in a shared file,
+so all gunicorn workers see an invalidation immediately; the memory backend
+only suits a single process (the development server), since an invalidation
+reaches no other worker. gunicorn.conf.py therefore defaults to sqlite.
+
+Config:
+    CACHE_BACKEND      "memory" (per process LRU), "sqlite" (shared file) or "none"
+    CACHE_PATH         file used by the sqlite backend (default: instance/cache.sqlite3)
+    CACHE_DEFAULT_TTL  seconds an entry lives without being invalidated
+    CACHE_MAX_ENTRIES  size bound of the memory backend
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+
+_MISSING = object()
+
+
+class NullCache:
+    """Backend that stores nothing (CACHE_BACKEND=none)."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache:
+    """Thread-safe, size-bounded LRU cache with per-entry expiry. Local to one process."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    """
+    Cache stored in a small SQLite file shared by every worker on the host.
+
+    Values are pickled. Each thread keeps its own connection; WAL mode lets
+    readers carry on while another worker writes.
+    """
+
+    # Expired rows are swept every this many writes.
+    SWEEP_EVERY = 200
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires),
+        )
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def after_fork(self):
+        # SQLite connections must not be shared across processes: the child opens its own.
+        self._local = threading.local()
+
+
+class Cache:
+    """Flask extension wrapping a backend with namespace-based invalidation."""
+
+    def __init__(self):
+        self.backend = NullCache()
+        self.default_ttl = 300
+
+    def init_app(self, app):
+        kind = app.config.get("CACHE_BACKEND", "memory")
+        self.default_ttl = app.config.get("CACHE_DEFAULT_TTL", 300)
+        if kind == "sqlite":
+            path = app.config.get("CACHE_PATH") or os.path.join(app.instance_path, "cache.sqlite3")
+            self.backend = SQLiteCache(path)
+        elif kind == "memory":
+            self.backend = MemoryCache(app.config.get("CACHE_MAX_ENTRIES", 1024))
+        else:
+            self.backend = NullCache()
+        app.extensions["cache"] = self
+
+    def after_fork(self):
+        """Call in a forked worker (see flaskblog.preload) before using the cache."""
+        if isinstance(self.backend, SQLiteCache):
+            self.backend.after_fork()
+
+    # --- namespaces ---
+
+    def _generation(self, namespace):
+        key = f"gen:{namespace}"
+        gen = self.backend.get(key)
+        if gen is None:
+            # Unknown (first use, or evicted): start a fresh generation so nothing stale can match.
+            gen = uuid.uuid4().hex[:12]
+            self.backend.set(key, gen)
+        return gen
+
+    def _key(self, key, depends):
+        gens = ".".join(self._generation(ns) for ns in depends)
+        return f"{key}@{gens}"
+
+    def invalidate(self, *namespaces):
+        """Drop every entry depending on any of the namespaces (call after the write commits)."""
+        for ns in namespaces:
+            self.backend.set(f"gen:{ns}", uuid.uuid4().hex[:12])
+
+    # --- data/fragment cache ---
+
+    def get_or_set(self, key, producer, depends=(), ttl=None):
+        """Return the cached value for key, calling producer() to fill it on a miss."""
+        full_key = self._key(key, depends)
+        value = self.backend.get(full_key)
+        if value is not None:
+            return value
+        value = producer()
+        self.backend.set(full_key, value, ttl or self.default_ttl)
+        return value
+
+    def get(self, key, depends=()):
+        return self.backend.get(self._key(key, depends))
+
+    def set(self, key, value, depends=(), ttl=None):
+        self.backend.set(self._key(key, depends), value, ttl or self.default_ttl)
+
+
+cache = Cache()
+
+
+# --- whole-page caching ---
+
+# Headers that must never be replayed from a shared page cache. Vary is kept: it tells
+# browsers and proxies what the cached response depends on.
+_UNCACHEABLE_HEADERS = {"set-cookie"}
+
+
+def _page_cacheable():
+    """
+    Only anonymous GETs with nothing user-specific to show are page-cached.
+
+    This inspects the session directly rather than current_user, so deciding
+    never needs a user lookup in the database.
+    """
+    if request.method != "GET" or isinstance(cache.backend, NullCache):
+        return False
+    if "_user_id" in session or "_flashes" in session:
+        return False
+    remember_cookie = current_app.config.get("REMEMBER_COOKIE_NAME", "remember_token")
+    return remember_cookie not in request.cookies
+
+
+def cached_page(depends=("recipes", "tags"), ttl=None):
+    """Cache a view's full response for anonymous visitors, keyed by path + query string."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _page_cacheable():
+                return view(*args, **kwargs)
+
+            key = f"page:{request.full_path}"
+            hit = cache.get(key, depends)
+            if hit is not None:
+                status, headers, body = hit
+                response = Response(body, status=status, headers=headers)
+                # Whether the cached copy is served depends on the session cookie.
+                response.vary.add("Cookie")
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                headers = [(k, v) for k, v in response.headers.items() if k.lower() not in _UNCACHEABLE_HEADERS]
+                cache.set(key, (response.status_code, headers, response.get_data()), depends, ttl)
+            response.vary.add("Cookie")
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
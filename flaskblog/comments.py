@@ -0,0 +1,96 @@
+"""
+comments.py
+Recipe comments: denormalised counts and newest-first keyset pages.
+
+recipe.comment_count is kept in step with the comment table by the write
+helpers below (a single UPDATE ... SET comment_count = comment_count +/- n
+in the same transaction), so pages and list cards show "N comments"
+without a COUNT or loading any comment rows. Bulk moderation keeps it in
+step too (see flaskblog.moderation).
+
+Comments themselves are read a page at a time, newest first, by keyset on
+(created_at, id) using the (recipe_id, created_at) index. The first page is
+rendered with the recipe; later pages come from the comments fragment
+endpoint (infinite scroll), so a recipe with 30,000 comments costs the same
+to open as one with 3.
+
+Existing databases get the comment_count column (and a one-off recount)
+from `flask db-upgrade` (see flaskblog.migrations); `flask comments-recount`
+repairs the counts at any time.
+"""
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from flaskblog import db
+from flaskblog.models import Comment, Recipe, User
+from flaskblog.pagination import keyset_paginate
+
+PER_PAGE = 20
+
+# Newest first; id breaks ties between comments posted in the same instant.
+NEWEST_FIRST = [(Comment.created_at, True), (Comment.id, True)]
+
+
+def _bump(recipe_id, delta):
+    table = Recipe.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == recipe_id)
+        .values(comment_count=table.c.comment_count + delta)
+    )
+
+
+def add_comment(recipe_id, user_id, body):
+    """Add a comment and count it (caller commits)."""
+    comment = Comment(body=body, recipe_id=recipe_id, user_id=user_id)
+    db.session.add(comment)
+    _bump(recipe_id, 1)
+    return comment
+
+
+def delete_comment(comment):
+    """Delete a comment and uncount it (caller commits)."""
+    _bump(comment.recipe_id, -1)
+    db.session.delete(comment)
+
+
+def comments_page(recipe_id, cursor=None, per_page=PER_PAGE):
+    """One newest-first page of a recipe's comments, authors included (a KeysetPage)."""
+    query = (
+        Comment.query
+        .filter(Comment.recipe_id == recipe_id)
+        .options(joinedload(Comment.author).load_only(User.username))
+    )
+    return keyset_paginate(query, NEWEST_FIRST, cursor=cursor, per_page=per_page)
+
+
+def recount():
+    """Recompute every recipe's comment_count from the comment table. Returns recipes updated."""
+    counted = (
+        db.select(func.count(Comment.id))
+        .where(Comment.recipe_id == Recipe.id)
+        .scalar_subquery()
+    )
+    updated = db.session.execute(
+        db.update(Recipe)
+        .where(Recipe.comment_count != counted)
+        .values(comment_count=counted)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return updated
+
+
+@click.command("comments-recount")
+@with_appcontext
+def recount_command():
+    """Recompute the denormalised comment count of every recipe."""
+    updated = recount()
+    click.echo(f"Updated {updated} recipe comment counts.")
+
+
+def init_app(app):
+    app.cli.add_command(recount_command)
@@ -0,0 +1,124 @@
+"""
+counters.py
+Maintained site-wide totals (recipes, comments, comments awaiting review, tags).
+
+The admin dashboard reads these from the site_counter table (a handful of
+primary-key lookups) instead of running COUNT(*) over each table.
+
+Counts stay correct without every write path having to remember them:
+
+- objects added or deleted through the ORM session (new recipes, comments,
+  tags created while tagging a recipe, ...) are counted by a before_flush
+  hook, in the same transaction as the write
+- set-based statements that bypass the session (bulk import, bulk
+  moderation, the database's ON DELETE CASCADE) report their own deltas
+  with apply()
+
+`flask counters-rebuild` recounts everything from the tables; `flask db-upgrade`
+runs it once on a database without counters.
+"""
+
+from collections import Counter
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+
+from flaskblog import db
+from flaskblog.database import RoutingSession
+from flaskblog.models import Comment, Recipe, SiteCounter, Tag
+
+RECIPES = "recipes"
+COMMENTS = "comments"
+PENDING_COMMENTS = "pending_comments"
+TAGS = "tags"
+
+NAMES = (RECIPES, COMMENTS, PENDING_COMMENTS, TAGS)
+
+
+def apply(deltas):
+    """Add a {name: delta} mapping to the counters (inside the caller's transaction)."""
+    table = SiteCounter.__table__
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        updated = db.session.execute(
+            table.update().where(table.c.name == name).values(value=table.c.value + delta)
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert().values(name=name, value=delta))
+
+
+def all_counts():
+    """{name: value} for every counter (missing ones read as 0)."""
+    values = dict(db.session.execute(db.select(SiteCounter.name, SiteCounter.value)).all())
+    return {name: values.get(name, 0) for name in NAMES}
+
+
+def recipe_comment_deltas(recipe_ids):
+    """Counter deltas for deleting these recipes (their comments go with them)."""
+    comments, pending = db.session.execute(
+        db.select(
+            func.count(Comment.id),
+            func.count(Comment.id).filter(Comment.approved.is_(False)),
+        ).where(Comment.recipe_id.in_(recipe_ids))
+    ).one()
+    return {COMMENTS: -comments, PENDING_COMMENTS: -pending}
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _count_session_changes(session, flush_context, instances):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Recipe):
+            deltas[RECIPES] += 1
+        elif isinstance(obj, Comment):
+            deltas[COMMENTS] += 1
+            deltas[PENDING_COMMENTS] += 0 if obj.approved else 1
+        elif isinstance(obj, Tag):
+            deltas[TAGS] += 1
+
+    deleted_recipes = []
+    for obj in session.deleted:
+        if isinstance(obj, Recipe):
+            deltas[RECIPES] -= 1
+            deleted_recipes.append(obj.id)
+        elif isinstance(obj, Comment):
+            deltas[COMMENTS] -= 1
+            deltas[PENDING_COMMENTS] -= 0 if obj.approved else 1
+        elif isinstance(obj, Tag):
+            deltas[TAGS] -= 1
+    if deleted_recipes:
+        deltas.update(recipe_comment_deltas(deleted_recipes))
+
+    if any(deltas.values()):
+        apply(deltas)
+
+
+def rebuild():
+    """Recount every counter from the tables. Returns the new values."""
+    counts = {
+        RECIPES: db.session.execute(db.select(func.count(Recipe.id))).scalar(),
+        COMMENTS: db.session.execute(db.select(func.count(Comment.id))).scalar(),
+        PENDING_COMMENTS: db.session.execute(
+            db.select(func.count(Comment.id)).where(Comment.approved.is_(False))
+        ).scalar(),
+        TAGS: db.session.execute(db.select(func.count(Tag.id))).scalar(),
+    }
+    table = SiteCounter.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert(), [{"name": name, "value": value} for name, value in counts.items()])
+    db.session.commit()
+    return counts
+
+
+@click.command("counters-rebuild")
+@with_appcontext
+def rebuild_counters_command():
+    """Recount the dashboard totals (recipes, comments, pending comments, tags)."""
+    counts = rebuild()
+    click.echo(", ".join(f"{name}={value}" for name, value in counts.items()))
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_counters_command)
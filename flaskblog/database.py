@@ -0,0 +1,289 @@
+"""
+database.py
+Production SQLite profile and schema upgrade helpers.
+
+With DATABASE_PROFILE=production and an SQLite database:
+
+- every connection uses WAL (readers never wait for the writer), a
+  busy_timeout instead of failing with "database is locked",
+  synchronous=NORMAL, memory-mapped I/O and a larger page cache
+- reads go to a pooled, query-only "read" engine
+- writes go to the default engine, which has a single connection, so the
+  workers' threads queue for it in Python. Its transactions start with
+  BEGIN IMMEDIATE so they take the write lock up front (a deferred
+  transaction that later upgrades to a write can fail without waiting)
+
+A session that has written anything keeps using the write connection until
+its transaction ends, so it always reads its own uncommitted changes.
+
+Any other profile/database keeps SQLAlchemy's defaults (one engine).
+
+Every SQLite connection (any profile) turns on foreign_keys, so the
+ON DELETE CASCADE rules declared on the models are enforced by the
+database: deleting a recipe removes its comments and tag/ingredient links
+in the same statement, without loading them.
+
+Schema upgrades for databases created by older versions run as
+flaskblog.migrations (`flask db-upgrade`), built on these helpers:
+- add_missing_indexes() creates indexes declared on the models that an
+  existing database is missing (db.create_all() only adds them to new
+  tables); migration 8 runs it. `flask db-add-indexes` is kept for
+  maintenance only, e.g. after an index was dropped by hand
+- add_column() adds a new model column
+- upgrade_foreign_keys() rebuilds SQLite tables whose ON DELETE rules
+  differ from the models (SQLite cannot ALTER a constraint); it runs as a
+  migration and is a no-op once the schema matches
+"""
+
+import click
+from flask.cli import with_appcontext
+from flask_sqlalchemy.session import Session
+from sqlalchemy import and_, event, inspect, or_, select
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import column as sql_column
+from sqlalchemy.sql import table as sql_table
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+READ_BIND = "sqlite_read"
+
+PRAGMAS = {
+    "busy_timeout": 5000,          # ms to wait for a lock before giving up
+    "synchronous": "NORMAL",       # safe with WAL; fsync only at checkpoints
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,      # negative = KiB, i.e. 64 MiB per connection
+    "temp_store": "MEMORY",
+}
+
+_WRITE_KEYWORDS = ("insert", "update", "delete", "replace", "create", "drop", "alter", "pragma", "vacuum")
+_WROTE = "database_wrote"
+
+
+def _is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().lower().startswith(_WRITE_KEYWORDS)
+    return False
+
+
+class RoutingSession(Session):
+    """Session sending reads to the read engine (when configured) and writes to the default engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engines = self._db.engines
+            reader = engines.get(READ_BIND)
+            if reader is not None:
+                if self._flushing or self.info.get(_WROTE) or _is_write(clause):
+                    self.info[_WROTE] = True
+                    return engines[None]
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _forget_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_WROTE, None)
+
+
+def is_production_sqlite(app):
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+    return (
+        app.config.get("DATABASE_PROFILE") == "production"
+        and uri.startswith("sqlite")
+        and uri not in ("sqlite://", "sqlite:///:memory:")
+    )
+
+
+def configure(app):
+    """Set engine options for the production profile (call before db.init_app)."""
+    if not is_production_sqlite(app):
+        return
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 1,
+        "max_overflow": 0,
+        "pool_timeout": 30,
+    }
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    binds[READ_BIND] = {
+        "url": uri,
+        "pool_size": app.config.get("DATABASE_READ_POOL_SIZE", 8),
+        "max_overflow": 0,
+        "pool_timeout": 30,
+    }
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+def _on_connect(read_only):
+    def connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy's "begin" event issue BEGIN itself (see _begin_immediate).
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        for name, value in PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return connect
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+def _begin_immediate(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def init_app(app):
+    """Install the pragmas/transaction hooks on the engines (call after db.init_app)."""
+    from flaskblog import db
+
+    app.cli.add_command(add_indexes_command)
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _enable_foreign_keys)
+
+    if not is_production_sqlite(app):
+        return
+    with app.app_context():
+        writer = db.engines[None]
+        reader = db.engines[READ_BIND]
+    event.listen(writer, "connect", _on_connect(read_only=False))
+    event.listen(writer, "begin", _begin_immediate)
+    event.listen(reader, "connect", _on_connect(read_only=True))
+    event.listen(reader, "begin", _begin)
+    app.extensions["database_profile"] = "production"
+
+
+def add_missing_indexes(echo=None):
+    """Create every index declared on the models that the database does not have yet."""
+    from flaskblog import db
+
+    created = []
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in existing:
+                    continue
+                index.create(conn)
+                created.append(index.name)
+                if echo:
+                    echo(f"created {index.name} on {table.name}")
+        if created and conn.dialect.name == "sqlite":
+            # Refresh the planner's statistics so the new indexes get used.
+            conn.exec_driver_sql("ANALYZE")
+    return created
+
+
+def add_column(column):
+    """
+    Add a model column to an existing table if it is missing. Returns True if added.
+
+    The column needs a server_default (or must be nullable) so existing rows
+    get a value.
+    """
+    from flaskblog import db
+
+    table = column.table
+    if column.name in {c["name"] for c in inspect(db.engine).get_columns(table.name)}:
+        return False
+    with db.engine.begin() as conn:
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+    return True
+
+
+def _ondelete_rules(foreign_keys):
+    return {
+        (tuple(fk["constrained_columns"]), fk["referred_table"]): (fk.get("options", {}).get("ondelete") or "").upper()
+        for fk in foreign_keys
+    }
+
+
+def _stale_foreign_key_tables(inspector, metadata):
+    stale = []
+    for table in metadata.sorted_tables:
+        if not table.foreign_key_constraints or not inspector.has_table(table.name):
+            continue
+        declared = {
+            (tuple(c.name for c in fk.columns), fk.referred_table.name): (fk.ondelete or "").upper()
+            for fk in table.foreign_key_constraints
+        }
+        if declared != _ondelete_rules(inspector.get_foreign_keys(table.name)):
+            stale.append(table)
+    return stale
+
+
+def _rebuild_table(conn, inspector, table):
+    """Recreate a table from its model definition, keeping its rows (SQLite)."""
+    old = f"_old_{table.name}"
+    existing = {c["name"] for c in inspector.get_columns(table.name)}
+    columns = [c for c in table.columns if c.name in existing]
+    for index in inspector.get_indexes(table.name):
+        conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old}"')
+    table.create(conn)
+
+    source = sql_table(old, *[sql_column(c.name) for c in columns])
+    # Rows pointing at parents that no longer exist would fail the new constraints.
+    keep = [
+        or_(*[source.c[c.name].is_(None) for c in fk.columns],
+            source.c[fk.columns[0].name].in_(select(fk.elements[0].column)))
+        for fk in table.foreign_key_constraints if len(fk.columns) == 1
+    ]
+    conn.execute(
+        table.insert().from_select([c.name for c in columns],
+                                   select(*[source.c[c.name] for c in columns]).where(and_(True, *keep)))
+    )
+    conn.exec_driver_sql(f'DROP TABLE "{old}"')
+
+
+def upgrade_foreign_keys(echo=None):
+    """
+    Rebuild SQLite tables whose foreign keys lack the ON DELETE rules the
+    models declare. Returns the names of the rebuilt tables.
+    """
+    from flaskblog import db
+
+    if db.engine.dialect.name != "sqlite":
+        return []
+    if not _stale_foreign_key_tables(inspect(db.engine), db.metadata):
+        return []
+
+    rebuilt = []
+    with db.engine.begin() as conn:
+        if not conn.connection.dbapi_connection.in_transaction:
+            # Take the write lock before re-checking, so concurrent workers rebuild only once.
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        inspector = inspect(conn)
+        for table in _stale_foreign_key_tables(inspector, db.metadata):
+            _rebuild_table(conn, inspector, table)
+            rebuilt.append(table.name)
+            if echo:
+                echo(f"rebuilt {table.name} with ON DELETE rules")
+    return rebuilt
+
+
+@click.command("db-add-indexes")
+@with_appcontext
+def add_indexes_command():
+    """Re-create indexes declared on the models that are missing (maintenance; db-upgrade adds them)."""
+    created = add_missing_indexes(echo=click.echo)
+    click.echo(f"Created {len(created)} indexes." if created else "All indexes already exist.")
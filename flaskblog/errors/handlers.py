@@ -0,0 +1,20 @@
+from flask import Blueprint, render_template
+
+errors = Blueprint("errors", __name__)
+
+@errors.app_errorhandler(403)
+def error_403(error):
+    return render_template("errors/403.html"), 403
+
+@errors.app_errorhandler(404)
+def error_404(error):
+    return render_template("errors/404.html"), 404
+
+@errors.app_errorhandler(429)
+def error_429(error):
+    headers = {"Retry-After": str(error.retry_after)} if getattr(error, "retry_after", None) else {}
+    return render_template("errors/429.html", error=error), 429, headers
+
+@errors.app_errorhandler(500)
+def error_500(error):
+    return render_template("errors/500.html"), 500
@@ -0,0 +1,264 @@
+"""
+facets.py
+Materialised facet counts (recipes per tag, cuisine, difficulty, cook-time bucket and ingredient).
+
+The facet_count table is kept up to date incrementally: every recipe write
+passes the recipe's facet values before and after the change to
+apply_change(), which adjusts just those rows inside the same transaction.
+Reading "how many Italian recipes?" or "top 10 tags" is then an indexed
+lookup instead of a GROUP BY over recipe and recipe_tags. Ingredient counts
+(parsed ingredient names, see flaskblog.ingredients) rank the search
+suggestions.
+
+Counts for a *filtered* listing (e.g. cuisines among the "quick" recipes)
+are computed by filtered_counts() and cached per filter combination until
+the next recipe/tag write.
+"""
+
+from collections import Counter
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from flaskblog import db
+from flaskblog.models import FacetCount, Ingredient, Recipe, Tag, recipe_ingredients, recipe_tags
+
+TAG = "tag"
+CUISINE = "cuisine"
+DIFFICULTY = "difficulty"
+COOK_TIME = "cook_time"
+INGREDIENT = "ingredient"
+
+# Upper bounds (minutes) of the cook-time buckets; anything longer is "long".
+COOK_TIME_BUCKETS = (15, 30, 60)
+
+
+def cook_time_bucket(minutes):
+    """Bucket label for a cook time: "15", "30", "60", "long" or None when unknown."""
+    if minutes is None:
+        return None
+    for limit in COOK_TIME_BUCKETS:
+        if minutes <= limit:
+            return str(limit)
+    return "long"
+
+
+def _bucket_expr():
+    """SQL version of cook_time_bucket() so bucket counts can be grouped in the database."""
+    whens = [(Recipe.cook_time_mins <= limit, str(limit)) for limit in COOK_TIME_BUCKETS]
+    return db.case(*whens, else_="long")
+
+
+def recipe_facets(recipe):
+    """Set of (facet, value) pairs a recipe currently counts towards."""
+    return facet_values(
+        [t.name for t in recipe.tags], recipe.cuisine, recipe.difficulty, recipe.cook_time_mins,
+        [i.name for i in recipe.parsed_ingredients],
+    )
+
+
+def facet_values(tag_names, cuisine, difficulty, cook_time_mins, ingredient_names=()):
+    """recipe_facets() for plain values (used where no Recipe object exists, e.g. bulk import)."""
+    values = {(TAG, name) for name in tag_names}
+    values.update((INGREDIENT, name) for name in ingredient_names)
+    if cuisine:
+        values.add((CUISINE, cuisine))
+    if difficulty:
+        values.add((DIFFICULTY, difficulty))
+    bucket = cook_time_bucket(cook_time_mins)
+    if bucket:
+        values.add((COOK_TIME, bucket))
+    return values
+
+
+def apply_change(before, after):
+    """
+    Move counts from the `before` facet values to the `after` ones.
+
+    Pass an empty set as `before` for a new recipe and as `after` for a
+    deleted one. Only changed values touch the table.
+    """
+    for facet, value in before - after:
+        _bump(facet, value, -1)
+    for facet, value in after - before:
+        _bump(facet, value, 1)
+
+
+def apply_counts(deltas):
+    """Add a {(facet, value): delta} mapping in one pass (bulk writes)."""
+    for (facet, value), delta in deltas.items():
+        if delta:
+            _bump(facet, value, delta)
+
+
+def _bump(facet, value, delta):
+    table = FacetCount.__table__
+    updated = db.session.execute(
+        table.update()
+        .where(table.c.facet == facet, table.c.value == value)
+        .values(count=table.c.count + delta)
+    ).rowcount
+    if not updated and delta > 0:
+        db.session.execute(table.insert().values(facet=facet, value=value, count=delta))
+
+
+def remove_value(facet, value):
+    """Forget a facet value entirely (e.g. when a tag is deleted)."""
+    table = FacetCount.__table__
+    db.session.execute(table.delete().where(table.c.facet == facet, table.c.value == value))
+
+
+def all_counts():
+    """{facet: {value: count}} for every listing facet (not ingredients) in one query."""
+    out = {TAG: {}, CUISINE: {}, DIFFICULTY: {}, COOK_TIME: {}}
+    rows = db.session.execute(
+        db.select(FacetCount.facet, FacetCount.value, FacetCount.count)
+        .where(FacetCount.facet.in_(list(out)), FacetCount.count > 0)
+    )
+    for facet, value, count in rows:
+        out.setdefault(facet, {})[value] = count
+    return out
+
+
+def top_values(facet, limit=10):
+    """Most used values of a facet, e.g. the most popular tags."""
+    rows = db.session.execute(
+        db.select(FacetCount.value)
+        .where(FacetCount.facet == facet, FacetCount.count > 0)
+        .order_by(FacetCount.count.desc(), FacetCount.value.asc())
+        .limit(limit)
+    )
+    return [value for (value,) in rows]
+
+
+def cumulative_time_counts(bucket_counts):
+    """Turn per-bucket counts into "under N mins" totals matching the max_time filter."""
+    out = {}
+    running = 0
+    for limit in COOK_TIME_BUCKETS:
+        running += bucket_counts.get(str(limit), 0)
+        out[str(limit)] = running
+    return out
+
+
+def filtered_counts(filtered_query):
+    """
+    Facet counts among the recipes matched by the current filters.
+
+    filtered_query(skip) must return a Recipe query with every active filter
+    applied except the one named in skip, so each dropdown counts what picking
+    one of its options would give (standard faceted search).
+    """
+    out = {}
+
+    ids = filtered_query(CUISINE).with_entities(Recipe.id).subquery()
+    out[CUISINE] = dict(db.session.execute(
+        db.select(Recipe.cuisine, func.count())
+        .where(Recipe.id.in_(db.select(ids.c.id)), Recipe.cuisine.isnot(None))
+        .group_by(Recipe.cuisine)
+    ).all())
+
+    ids = filtered_query(DIFFICULTY).with_entities(Recipe.id).subquery()
+    out[DIFFICULTY] = dict(db.session.execute(
+        db.select(Recipe.difficulty, func.count())
+        .where(Recipe.id.in_(db.select(ids.c.id)), Recipe.difficulty.isnot(None))
+        .group_by(Recipe.difficulty)
+    ).all())
+
+    ids = filtered_query(TAG).with_entities(Recipe.id).subquery()
+    out[TAG] = dict(db.session.execute(
+        db.select(Tag.name, func.count())
+        .join(recipe_tags, recipe_tags.c.tag_id == Tag.id)
+        .where(recipe_tags.c.recipe_id.in_(db.select(ids.c.id)))
+        .group_by(Tag.name)
+    ).all())
+
+    ids = filtered_query(COOK_TIME).with_entities(Recipe.id).subquery()
+    bucket = _bucket_expr()
+    out[COOK_TIME] = dict(db.session.execute(
+        db.select(bucket, func.count())
+        .where(Recipe.id.in_(db.select(ids.c.id)), Recipe.cook_time_mins.isnot(None))
+        .group_by(bucket)
+    ).all())
+
+    return out
+
+
+def recipe_counts(recipe_ids=None):
+    """
+    {(facet, value): recipes} from one GROUP BY per facet, over every recipe
+    or only the recipes in recipe_ids (a SELECT of ids).
+    """
+    def among(query, column):
+        return query if recipe_ids is None else query.where(column.in_(recipe_ids))
+
+    counts = Counter()
+    for name, count in db.session.execute(among(
+        db.select(Tag.name, func.count()).join(recipe_tags, recipe_tags.c.tag_id == Tag.id).group_by(Tag.name),
+        recipe_tags.c.recipe_id,
+    )):
+        counts[(TAG, name)] = count
+    for name, count in db.session.execute(among(
+        db.select(Ingredient.name, func.count())
+        .join(recipe_ingredients, recipe_ingredients.c.ingredient_id == Ingredient.id)
+        .group_by(Ingredient.name),
+        recipe_ingredients.c.recipe_id,
+    )):
+        counts[(INGREDIENT, name)] = count
+    for column, facet in ((Recipe.cuisine, CUISINE), (Recipe.difficulty, DIFFICULTY)):
+        for value, count in db.session.execute(among(
+            db.select(column, func.count()).where(column.isnot(None), column != "").group_by(column), Recipe.id
+        )):
+            counts[(facet, value)] = count
+    bucket = _bucket_expr()
+    for value, count in db.session.execute(among(
+        db.select(bucket, func.count()).where(Recipe.cook_time_mins.isnot(None)).group_by(bucket), Recipe.id
+    )):
+        counts[(COOK_TIME, value)] = count
+    return counts
+
+
+def rebuild():
+    """Recompute every facet count from scratch. Returns the number of rows written."""
+    table = FacetCount.__table__
+    db.session.execute(table.delete())
+
+    rows = [{"facet": facet, "value": value, "count": count} for (facet, value), count in recipe_counts().items()]
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def _ingredient_rows():
+    return [
+        {"facet": INGREDIENT, "value": name, "count": count}
+        for name, count in db.session.execute(
+            db.select(Ingredient.name, func.count())
+            .join(recipe_ingredients, recipe_ingredients.c.ingredient_id == Ingredient.id)
+            .group_by(Ingredient.name)
+        )
+    ]
+
+
+def rebuild_ingredients():
+    """Recompute only the ingredient counts (after the ingredient index is rebuilt); callers commit."""
+    table = FacetCount.__table__
+    db.session.execute(table.delete().where(table.c.facet == INGREDIENT))
+    rows = _ingredient_rows()
+    if rows:
+        db.session.execute(table.insert(), rows)
+    return len(rows)
+
+
+@click.command("facets-rebuild")
+@with_appcontext
+def rebuild_facets_command():
+    """Recompute the materialised facet counts (tags, cuisines, difficulty, cook time, ingredients)."""
+    count = rebuild()
+    click.echo(f"Wrote {count} facet counts.")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_facets_command)
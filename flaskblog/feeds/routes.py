@@ -0,0 +1,176 @@
+"""
+Machine-readable listings for feed readers and search engines.
+
+    /feed.xml               Atom feed of the newest recipes; accepts the /recipes
+                            filters, e.g. /feed.xml?tag=vegan or ?cuisine=Italian
+    /sitemap.xml            sitemap index: one shard per SITEMAP_SHARD_SIZE recipe ids
+    /sitemap-<n>.xml        URLs and lastmod of the recipes in shard n (shard 1 also
+                            lists the site's fixed pages)
+    /robots.txt             points crawlers at the sitemap instead of ?page=N listings
+
+Bodies are streamed as they are generated: sitemap rows come from one
+primary-key-ordered query read with yield_per, so memory stays flat however
+big the catalogue is. Each response first computes cheap validators (newest update time, row
+count) and answers conditional GETs with 304 without running the listing.
+"""
+
+import hashlib
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import Blueprint, Response, abort, request, stream_with_context, url_for
+from sqlalchemy import func
+
+from flaskblog import db
+from flaskblog.cache import cache
+from flaskblog.models import Recipe, User, utcnow
+from flaskblog.pagination import NEWEST_FIRST
+from flaskblog.recipes.routes import apply_filters, read_filters
+
+feeds = Blueprint("feeds", __name__)
+
+FEED_SIZE = 50
+# Recipe ids per sitemap shard (the protocol allows up to 50,000 URLs per file).
+SITEMAP_SHARD_SIZE = 10000
+YIELD_PER = 1000
+
+# Fixed pages listed in the first sitemap shard.
+SITEMAP_PAGES = ("main.home", "recipes.recipe_list", "main.categories", "main.tips", "main.about")
+
+_last_update = func.coalesce(Recipe.updated_at, Recipe.date_posted)
+
+
+def _w3c(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _etag(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+
+
+def _stream(chunks, mimetype, etag, last_modified):
+    """Streamed XML response that answers conditional GETs before generating anything."""
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
+
+def _batches(query):
+    """Lists of rows of a query, fetched YIELD_PER at a time."""
+    return db.session.execute(query.execution_options(yield_per=YIELD_PER)).partitions()
+
+
+@feeds.route("/feed.xml")
+def feed():
+    filters = read_filters(request.args)
+    query, _ = apply_filters(Recipe.query, filters)
+    newest = query.with_entities(Recipe.id, Recipe.version, _last_update)
+    newest = newest.order_by(*(col.desc() for col, _ in NEWEST_FIRST)).limit(FEED_SIZE).all()
+    ids = [row[0] for row in newest]
+    updated = max((row[2] for row in newest), default=None)
+    etag = _etag(sorted(filters.items()), [tuple(row[:2]) for row in newest])
+    title = "Bonnyrigg HS Food Blog"
+    label = filters["tag"] or filters["cuisine"]
+    if label:
+        title += f": {label}"
+
+    def generate():
+        self_url = request.url
+        yield '<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n'
+        yield f"<title>{escape(title)}</title>\n<id>{escape(self_url)}</id>\n"
+        yield f'<link rel="self" href={quoteattr(self_url)}/>\n'
+        yield f'<link href={quoteattr(url_for("recipes.recipe_list", _external=True, **{k: v for k, v in filters.items() if v}))}/>\n'
+        yield f"<updated>{_w3c(updated or utcnow())}</updated>\n"
+        if not ids:
+            yield "</feed>\n"
+            return
+        rows = db.session.execute(
+            db.select(Recipe.id, Recipe.title, Recipe.summary, Recipe.cuisine, Recipe.date_posted, _last_update, User.username)
+            .join(User, User.id == Recipe.user_id)
+            .where(Recipe.id.in_(ids))
+            .order_by(*(col.desc() for col, _ in NEWEST_FIRST))
+        )
+        for recipe_id, recipe_title, summary, cuisine, posted, last_update, author in rows:
+            link = url_for("recipes.recipe_detail", recipe_id=recipe_id, _external=True)
+            yield (
+                f"<entry><title>{escape(recipe_title)}</title><id>{escape(link)}</id>"
+                f"<link href={quoteattr(link)}/>"
+                f"<published>{_w3c(posted)}</published><updated>{_w3c(last_update)}</updated>"
+                f"<author><name>{escape(author)}</name></author>"
+                + (f"<category term={quoteattr(cuisine)}/>" if cuisine else "")
+                + (f"<summary>{escape(summary)}</summary>" if summary else "")
+                + "</entry>\n"
+            )
+        yield "</feed>\n"
+
+    return _stream(generate(), "application/atom+xml", etag, updated)
+
+
+def _shard_stats():
+    shard = (Recipe.id - 1) // SITEMAP_SHARD_SIZE
+    return [
+        tuple(row) for row in db.session.execute(
+            db.select(shard, func.max(_last_update), func.count(Recipe.id)).group_by(shard).order_by(shard)
+        )
+    ]
+
+
+@feeds.route("/sitemap.xml")
+def sitemap_index():
+    # (shard, newest update, recipes) per shard; one scan, cached until the next recipe write.
+    shards = cache.get_or_set("sitemap:shards", _shard_stats, depends=("recipes",)) or [(0, None, 0)]
+    updated = max((last for _, last, _ in shards if last), default=None)
+    etag = _etag(shards)
+
+    def generate():
+        yield '<?xml version="1.0" encoding="utf-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        for n, last, _ in shards:
+            loc = url_for("feeds.sitemap_shard", shard=n + 1, _external=True)
+            lastmod = f"<lastmod>{_w3c(last)}</lastmod>" if last else ""
+            yield f"<sitemap><loc>{escape(loc)}</loc>{lastmod}</sitemap>\n"
+        yield "</sitemapindex>\n"
+
+    return _stream(generate(), "application/xml", etag, updated)
+
+
+@feeds.route("/sitemap-<int:shard>.xml")
+def sitemap_shard(shard):
+    if shard < 1:
+        abort(404)
+    in_shard = Recipe.id.between((shard - 1) * SITEMAP_SHARD_SIZE + 1, shard * SITEMAP_SHARD_SIZE)
+    updated, count = db.session.execute(db.select(func.max(_last_update), func.count(Recipe.id)).where(in_shard)).one()
+    if not count and shard > 1:
+        abort(404)
+    etag = _etag(shard, count, updated)
+
+    def generate():
+        yield '<?xml version="1.0" encoding="utf-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        if shard == 1:
+            for endpoint in SITEMAP_PAGES:
+                yield f"<url><loc>{escape(url_for(endpoint, _external=True))}</loc></url>\n"
+        # Primary-key order: a single range scan of the shard, sent a batch at a time.
+        for batch in _batches(db.select(Recipe.id, _last_update).where(in_shard).order_by(Recipe.id)):
+            yield "".join(
+                f"<url><loc>{escape(url_for('recipes.recipe_detail', recipe_id=recipe_id, _external=True))}</loc>"
+                f"<lastmod>{_w3c(last_update)}</lastmod></url>\n"
+                for recipe_id, last_update in batch
+            )
+        yield "</urlset>\n"
+
+    return _stream(generate(), "application/xml", etag, updated)
+
+
+@feeds.route("/robots.txt")
+def robots():
+    # Paginated listings are reachable through the sitemap; keep crawlers off them.
+    lines = [
+        "User-agent: *",
+        "Disallow: /*?page=",
+        "Disallow: /*&page=",
+        "Disallow: /*cursor=",
+        f"Sitemap: {url_for('feeds.sitemap_index', _external=True)}",
+    ]
+    return Response("\n".join(lines) + "\n", mimetype="text/plain")
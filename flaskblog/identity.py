@@ -0,0 +1,152 @@
+"""
+identity.py
+Cached user loader: who is logged in, without a users-table query per request.
+
+Flask-Login calls the user loader on every request from a logged-in user.
+Instead of loading the User row each time, load_user() returns a small
+read-only CachedUser snapshot (id, username, email, picture, admin flag)
+from a per-process LRU that holds USER_CACHE_MAX entries for at most
+USER_CACHE_TTL seconds. current_user is therefore a CachedUser, not a
+model instance: views that change the account load the User row
+explicitly, and ownership checks compare ids (recipe.user_id == current_user.id).
+
+Keeping snapshots fresh:
+
+- any ORM change to those columns (account page, an admin flag flipped from
+  a shell or script) bumps user.session_version in the same flush, and
+  deleting a user is noted too; once the change commits the snapshot is
+  dropped from this process's cache and the new version (or "deleted") is
+  published in the SQLite file every worker shares (throttle.shared_store())
+- load_user() compares its snapshot with the published version, so a
+  revoked admin flag or a deleted account takes effect in every gunicorn
+  worker on the next request. A published version only has to outlive the
+  snapshots, so it expires after USER_CACHE_TTL seconds
+- the session cookie also carries the version the user last saw
+  ("_user_version", written at login and after they change their own
+  account)
+- changes that bypass the ORM (raw SQL) are picked up when the snapshot
+  expires
+
+Existing databases get the session_version column from `flask db-upgrade`.
+"""
+
+import flask
+from flask_login import UserMixin, user_logged_in
+from sqlalchemy import event, inspect
+
+from flaskblog import db, login_manager, throttle
+from flaskblog.cache import MemoryCache
+from flaskblog.database import RoutingSession
+from flaskblog.models import User
+
+SESSION_KEY = "_user_version"
+# Published in place of a version once the user is deleted.
+DELETED = -1
+
+# Columns copied into a snapshot; changing any of them bumps session_version.
+FIELDS = ("id", "username", "email", "image_file", "is_admin", "session_version")
+
+_snapshots = MemoryCache(max_entries=2048)
+_ttl = 60
+
+
+class CachedUser(UserMixin):
+    """Read-only snapshot of a User, used as current_user."""
+
+    def __init__(self, id, username, email, image_file, is_admin, session_version):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.image_file = image_file
+        self.is_admin = is_admin
+        self.session_version = session_version
+
+    def __repr__(self):
+        return f"CachedUser('{self.username}', '{self.email}', admin={self.is_admin})"
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None
+    snapshot = _snapshots.get(user_id)
+    if snapshot is not None and snapshot.session_version >= flask.session.get(SESSION_KEY, 0):
+        published = _published_version(user_id)
+        if published is None or DELETED < published <= snapshot.session_version:
+            return snapshot
+
+    row = db.session.execute(
+        db.select(*(getattr(User, name) for name in FIELDS)).where(User.id == user_id)
+    ).first()
+    if row is None:
+        _snapshots.delete(user_id)
+        return None
+    snapshot = CachedUser(*row)
+    _snapshots.set(user_id, snapshot, ttl=_ttl)
+    return snapshot
+
+
+def _version_key(user_id):
+    return f"user-version:{user_id}"
+
+
+def _published_version(user_id):
+    store = throttle.shared_store()
+    return store.get(_version_key(user_id)) if store is not None else None
+
+
+def _publish_version(user_id, version):
+    store = throttle.shared_store()
+    if store is not None:
+        store.set(_version_key(user_id), version, ttl=_ttl)
+
+
+def invalidate(user_id):
+    """Forget this process's snapshot of a user (other workers follow the published version)."""
+    _snapshots.delete(user_id)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _bump_changed_users(session, flush_context, instances):
+    changed = session.info.setdefault("identity_changed", {})
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in FIELDS if name != "session_version"):
+            obj.session_version = (obj.session_version or 0) + 1
+            changed[obj.id] = obj.session_version
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed[obj.id] = None
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _drop_changed_users(session):
+    changed = session.info.pop("identity_changed", None)
+    if not changed:
+        return
+    for user_id, version in changed.items():
+        invalidate(user_id)
+        _publish_version(user_id, DELETED if version is None else version)
+        # The user changed their own account: stamp their session so every worker reloads.
+        if version is not None and flask.has_request_context() and flask.session.get("_user_id") == str(user_id):
+            flask.session[SESSION_KEY] = version
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("identity_changed", None)
+
+
+def _stamp_login(sender, user, **extra):
+    flask.session[SESSION_KEY] = user.session_version or 0
+
+
+def init_app(app):
+    global _ttl
+    _ttl = app.config.get("USER_CACHE_TTL", 60)
+    _snapshots.max_entries = app.config.get("USER_CACHE_MAX", 2048)
+    user_logged_in.connect(_stamp_login, app)
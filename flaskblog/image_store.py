@@ -0,0 +1,283 @@
+"""
+image_store.py
+Content-addressed, reference-counted storage for uploaded pictures.
+
+An upload is hashed while it is written to disk and stored as
+<digest>.<ext>, so the same photo uploaded twice (or re-used as another
+recipe's picture) is stored and processed once. The stored_image table is
+the image manifest: one row per stored file with its digest and how many
+recipes/users point at it.
+
+Write paths keep the counts in the same transaction as the change:
+
+    recipe.image_file = image_store.save_upload(...)   # +1 for the new picture
+    image_store.release("recipe_pics", old_filename)   # -1 for the replaced one
+    db.session.commit()
+    image_store.purge_orphans()                        # delete files nobody uses
+
+Files that existed before the store (seed images, older uploads, the
+default avatar shipped in the repo) keep their names; `flask
+images-reconcile` indexes them in one pass, points duplicate copies at a
+single file and recounts references. Only files the store itself named
+(<digest>.<ext>) are ever deleted: a pre-existing file that nothing
+references any more is reported and left in place.
+"""
+
+import hashlib
+import os
+import re
+import secrets
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from flaskblog import db, images
+from flaskblog.models import Recipe, StoredImage, User
+
+# Columns referencing each managed folder (used to recount references).
+REFERENCES = {
+    "recipe_pics": Recipe.image_file,
+    "profile_pics": User.image_file,
+}
+
+CHUNK_SIZE = 64 * 1024
+
+# Digest characters used in stored filenames (128 bits; the full digest is kept in the table).
+NAME_DIGEST_LENGTH = 32
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+
+_STORED_NAME = re.compile(rf"[0-9a-f]{{{NAME_DIGEST_LENGTH}}}\.(?:jpg|png|webp)")
+
+
+def is_stored_name(filename):
+    """True for names save_upload() gives files; only those may be deleted when unreferenced."""
+    return _STORED_NAME.fullmatch(filename) is not None
+
+
+def _hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _write_hashed(stream, path):
+    """Copy an upload stream to path while hashing it. Returns (digest, size)."""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+            size += len(chunk)
+            out.write(chunk)
+    return sha.hexdigest(), size
+
+
+def save_upload(form_picture, folder, ext, output_size):
+    """
+    Store an uploaded picture (deduplicated by content) and take a reference to it.
+
+    Returns the filename to save on the model. Only content not seen before is
+    queued for resizing; a repeat upload just bumps the reference count.
+    """
+    ext = ".jpg" if ext == ".jpeg" else ext
+    tmp_path = os.path.join(images.incoming_dir(folder), f"upload-{secrets.token_hex(8)}.tmp")
+    digest, size = _write_hashed(form_picture.stream, tmp_path)
+
+    existing = db.session.execute(
+        db.select(StoredImage.filename).where(StoredImage.folder == folder, StoredImage.digest == digest).limit(1)
+    ).scalar()
+    filename = existing or f"{digest[:NAME_DIGEST_LENGTH]}{ext}"
+
+    if existing or images.is_stored_or_pending(folder, filename):
+        os.remove(tmp_path)
+    else:
+        images.enqueue_upload(tmp_path, folder, filename, output_size)
+
+    acquire(folder, filename, digest, size)
+    return filename
+
+
+def acquire(folder, filename, digest, size=0):
+    """Add a reference to a stored file (creating its manifest entry if needed)."""
+    table = StoredImage.__table__
+    updated = db.session.execute(
+        table.update()
+        .where(table.c.folder == folder, table.c.filename == filename)
+        .values(refcount=table.c.refcount + 1)
+    ).rowcount
+    if not updated:
+        db.session.execute(table.insert().values(
+            folder=folder, filename=filename, digest=digest, size=size, refcount=1,
+        ))
+
+
+def release(folder, filename, count=1):
+    """
+    Drop `count` references to a stored file. Files that reach zero references are
+    deleted by purge_orphans() once the transaction has committed. Names not
+    in the manifest (e.g. default images) are ignored.
+    """
+    if not filename:
+        return
+    table = StoredImage.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.folder == folder, table.c.filename == filename)
+        .values(refcount=table.c.refcount - count)
+    )
+    db.session.info.setdefault("released_images", set()).add((folder, filename))
+
+
+def purge_orphans():
+    """Delete uploads released in this session that nothing references any more (call after commit)."""
+    released = db.session.info.pop("released_images", set())
+    if not released:
+        return 0
+
+    table = StoredImage.__table__
+    removed = []
+    for folder, filename in released:
+        if not is_stored_name(filename):
+            continue  # pre-existing files stay on disk (and in the manifest) even when unused
+        deleted = db.session.execute(
+            table.delete().where(table.c.folder == folder, table.c.filename == filename, table.c.refcount <= 0)
+        ).rowcount
+        if deleted:
+            removed.append((folder, filename))
+    db.session.commit()
+
+    static_dir = images.static_root()
+    for folder, filename in removed:
+        images.delete_image(static_dir, folder, filename)
+    return len(removed)
+
+
+def _folder_files(folder_path):
+    """[(name, path)] of the pictures directly inside a static folder."""
+    if not os.path.isdir(folder_path):
+        return []
+    files = []
+    for name in sorted(os.listdir(folder_path)):
+        path = os.path.join(folder_path, name)
+        if os.path.isfile(path) and os.path.splitext(name)[1].lower() in IMAGE_EXTS:
+            files.append((name, path))
+    return files
+
+
+def reconcile(static_dir, gc=False, echo=None):
+    """
+    Rebuild the manifest from the files on disk in a single pass.
+
+    - files already in the manifest keep their digest; others are hashed
+    - byte-identical copies in a folder collapse onto one file, and every
+      recipe/user pointing at a copy is repointed to it
+    - reference counts are recounted from the recipe and user tables
+    - pictures are hashed across every static folder, so copies shared with
+      another folder (e.g. images/) are reported; they cannot be merged,
+      since pages build picture URLs from the folder
+    - with gc=True, duplicate copies and unreferenced files are deleted if
+      the store named them; other files (seed images, pictures shipped in
+      the repo, older uploads) are only reported
+
+    Returns a summary dict.
+    """
+    echo = echo or (lambda msg: None)
+    known = {
+        (folder, filename): digest
+        for folder, filename, digest in db.session.execute(
+            db.select(StoredImage.folder, StoredImage.filename, StoredImage.digest)
+        )
+    }
+
+    summary = {
+        "files": 0, "hashed": 0, "duplicates": 0, "repointed": 0, "shared": 0,
+        "orphans": 0, "deleted": 0, "kept": 0,
+    }
+    rows = []
+    doomed = []
+    locations = {}
+    for folder, column in REFERENCES.items():
+        refs = dict(db.session.execute(db.select(column, func.count()).group_by(column)).all())
+
+        groups = {}
+        for name, path in _folder_files(os.path.join(static_dir, folder)):
+            digest = known.get((folder, name))
+            if digest is None:
+                digest = _hash_file(path)
+                summary["hashed"] += 1
+            groups.setdefault(digest, []).append((name, os.path.getsize(path)))
+            summary["files"] += 1
+
+        for digest, files in groups.items():
+            # Keep the most referenced copy, then a pre-existing one (never deleted), then the first by name.
+            files.sort(key=lambda f: (-refs.get(f[0], 0), is_stored_name(f[0]), f[0]))
+            (keep, size), duplicates = files[0], [name for name, _ in files[1:]]
+            refcount = sum(refs.get(name, 0) for name, _ in files)
+            locations.setdefault(digest, []).append(f"{folder}/{keep}")
+
+            if duplicates:
+                summary["duplicates"] += len(duplicates)
+                summary["repointed"] += db.session.execute(
+                    db.update(column.class_).where(column.in_(duplicates)).values({column.key: keep})
+                ).rowcount
+                doomed.extend((folder, name) for name in duplicates)
+                echo(f"{folder}: {', '.join(duplicates)} -> {keep}")
+            if refcount == 0:
+                summary["orphans"] += 1
+                doomed.append((folder, keep))
+                echo(f"{folder}: {keep} is not referenced")
+            rows.append({"folder": folder, "filename": keep, "digest": digest, "size": size, "refcount": refcount})
+
+    # Other static folders are only hashed, to find pictures also stored under a managed folder.
+    for folder in sorted(os.listdir(static_dir)):
+        if folder in REFERENCES or not os.path.isdir(os.path.join(static_dir, folder)):
+            continue
+        for name, path in _folder_files(os.path.join(static_dir, folder)):
+            digest = _hash_file(path)
+            if digest in locations:
+                locations[digest].append(f"{folder}/{name}")
+    for paths in locations.values():
+        if len(paths) > 1:
+            summary["shared"] += len(paths) - 1
+            echo(f"same picture in {', '.join(paths)}")
+
+    db.session.execute(StoredImage.__table__.delete())
+    if rows:
+        db.session.execute(StoredImage.__table__.insert(), rows)
+    db.session.commit()
+
+    if gc:
+        for folder, name in doomed:
+            if is_stored_name(name):
+                images.delete_image(static_dir, folder, name)
+                summary["deleted"] += 1
+            else:
+                summary["kept"] += 1
+                echo(f"{folder}: kept {name} (not an upload)")
+        db.session.execute(
+            StoredImage.__table__.delete().where(StoredImage.refcount <= 0, StoredImage.filename.in_(
+                [name for _, name in doomed if is_stored_name(name)]
+            ))
+        )
+        db.session.commit()
+    return summary
+
+
+@click.command("images-reconcile")
+@click.option("--gc", is_flag=True, help="Also delete duplicate and unreferenced uploads (other files are kept).")
+@with_appcontext
+def reconcile_images_command(gc):
+    """Index existing pictures into the image manifest, merge duplicates and recount references."""
+    summary = reconcile(images.static_root(), gc=gc, echo=click.echo)
+    click.echo(
+        "{files} files ({hashed} hashed), {duplicates} duplicates, {repointed} references repointed, "
+        "{shared} shared with other folders, {orphans} unreferenced, {deleted} deleted, {kept} kept.".format(**summary)
+    )
+
+
+def init_app(app):
+    app.cli.add_command(reconcile_images_command)
@@ -0,0 +1,315 @@
+"""
+images.py
+Background image processing with responsive variants.
+
+Uploads are written to static/<folder>/_incoming/ and a job is queued on a
+small bounded thread pool, so the request returns without decoding or
+resizing anything. The worker then:
+
+- applies the EXIF orientation and strips all metadata (GPS etc.)
+- writes resized variants in WebP and JPEG (see VARIANT_WIDTHS)
+- finally writes the main image, which marks the image as ready
+
+Until an image is ready, templates show a placeholder. Templates build
+<picture>/srcset markup through the image_set() Jinja global (see
+templates/macros/images.html).
+
+If the queue is full the upload is processed inline, so a burst of uploads
+slows down the uploader rather than growing memory without bound.
+
+When processing fails the error is logged and the original stays in
+_incoming/ for inspection. It still carries its metadata, so it is not
+moved into place; the image keeps showing the placeholder.
+
+Pillow is imported on first use rather than at startup, since most
+processes (CLI commands, workers serving pages) never decode an image;
+flaskblog.preload imports it in the gunicorn master.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+
+INCOMING_DIR = "_incoming"
+VARIANTS_DIR = "variants"
+PLACEHOLDER = "images/placeholder.svg"
+
+logger = logging.getLogger("flaskblog.images")
+
+# Widths generated per upload folder. Browsers pick from these via srcset,
+# so list cards fetch a ~480px image and high-DPI screens get the 2x sizes.
+VARIANT_WIDTHS = {
+    "recipe_pics": (480, 960, 1200, 2400),
+    "profile_pics": (128, 256),
+}
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# Sizes attribute per use, telling the browser how wide the image is drawn.
+SIZES = {
+    "card": "(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw",
+    "hero": "(min-width: 1200px) 1140px, 100vw",
+    "avatar": "128px",
+}
+
+
+class ImagePool:
+    """Bounded worker pool: at most `workers` jobs run and `max_queue` wait."""
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.workers = 2
+        self.max_queue = 32
+        atexit.register(self.shutdown)
+
+    def configure(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+
+    def _ensure_started(self):
+        # Started lazily so each forked gunicorn worker gets its own threads.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="images")
+                self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+
+    def submit(self, fn, *args):
+        """Run fn in the background, or inline when the queue is full. Returns a Future or None."""
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            fn(*args)
+            return None
+
+        def run():
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Image job %s%r failed", fn.__name__, args)
+                raise
+            finally:
+                self._slots.release()
+
+        return self._executor.submit(run)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+pool = ImagePool()
+
+# Images whose variants are known to exist (until delete_image() removes them).
+_with_variants = set()
+
+
+def static_root(app=None):
+    return os.path.join((app or current_app).root_path, "static")
+
+
+def _variant_name(filename, width, fmt):
+    stem, _ = os.path.splitext(filename)
+    return f"{stem}-{width}.{fmt}"
+
+
+def _prepare(img):
+    """Apply EXIF rotation and drop metadata by copying pixels only."""
+    from PIL import ImageOps
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+    return img
+
+
+def _save(img, path, fmt):
+    from PIL import Image
+
+    tmp = path + ".tmp"
+    if fmt == "jpg":
+        if img.mode == "RGBA":
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        img.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        img.save(tmp, fmt.upper() if fmt != "jpeg" else "JPEG")
+    os.replace(tmp, path)
+
+
+def generate_variants(source_path, folder_path, filename, widths):
+    """Write every width in WebP and JPEG for one image (never upscaling)."""
+    from PIL import Image
+
+    variants_dir = os.path.join(folder_path, VARIANTS_DIR)
+    os.makedirs(variants_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        img = _prepare(original)
+        for width in widths:
+            resized = img
+            if img.width > width:
+                height = round(img.height * width / img.width)
+                resized = img.resize((width, height), Image.LANCZOS)
+            for fmt in ("webp", "jpg"):
+                _save(resized, os.path.join(variants_dir, _variant_name(filename, width, fmt)), fmt)
+
+
+def process_upload(static_dir, folder, filename, output_size):
+    """
+    Worker job: variants first, then the main image (its existence means
+    "ready"). The upload is removed from _incoming/ only once that succeeded;
+    if Pillow fails the exception propagates and the original is kept.
+    """
+    from PIL import Image
+
+    folder_path = os.path.join(static_dir, folder)
+    incoming = os.path.join(folder_path, INCOMING_DIR, filename)
+    generate_variants(incoming, folder_path, filename, VARIANT_WIDTHS.get(folder, ()))
+    with Image.open(incoming) as original:
+        img = _prepare(original)
+        img.thumbnail(output_size)
+        ext = os.path.splitext(filename)[1].lstrip(".").lower()
+        _save(img, os.path.join(folder_path, filename), {"jpeg": "jpg"}.get(ext, ext))
+    os.remove(incoming)
+
+
+def incoming_dir(folder):
+    """Directory holding uploads that are waiting to be processed."""
+    path = os.path.join(static_root(), folder, INCOMING_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def is_stored_or_pending(folder, filename):
+    folder_path = os.path.join(static_root(), folder)
+    return (os.path.exists(os.path.join(folder_path, filename))
+            or os.path.exists(os.path.join(folder_path, INCOMING_DIR, filename)))
+
+
+def enqueue_upload(path, folder, filename, output_size):
+    """
+    Queue processing of an upload already written to `path` (inside
+    incoming_dir(folder)) under its final name. Raises ValueError if the file
+    is not a readable image (checked from the header, without decoding).
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            img.verify()
+    except Exception as exc:
+        os.remove(path)
+        raise ValueError("That file is not a valid image.") from exc
+
+    os.replace(path, os.path.join(incoming_dir(folder), filename))
+    pool.submit(process_upload, static_root(), folder, filename, output_size)
+    return filename
+
+
+def delete_image(static_dir, folder, filename):
+    """Remove a stored image together with its variants."""
+    folder_path = os.path.join(static_dir, folder)
+    paths = [os.path.join(folder_path, filename), os.path.join(folder_path, INCOMING_DIR, filename)]
+    for width in VARIANT_WIDTHS.get(folder, ()):
+        for fmt in ("webp", "jpg"):
+            paths.append(os.path.join(folder_path, VARIANTS_DIR, _variant_name(filename, width, fmt)))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    _with_variants.discard((folder, filename))
+
+
+class ImageSet:
+    """URLs for one image: fallback src plus WebP/JPEG srcsets (empty when no variants exist)."""
+
+    def __init__(self, src, webp_srcset="", jpeg_srcset="", ready=True, jpeg_by_width=None):
+        self.src = src
+        self.webp_srcset = webp_srcset
+        self.jpeg_srcset = jpeg_srcset
+        self.ready = ready
+        self._jpeg_by_width = jpeg_by_width or {}
+
+    def sized(self, width):
+        """URL of the smallest JPEG variant at least `width` wide (for CSS backgrounds)."""
+        for w in sorted(self._jpeg_by_width):
+            if w >= width:
+                return self._jpeg_by_width[w]
+        return self.src
+
+
+def image_set(folder, filename):
+    """Jinja global: responsive URLs for a stored image, or the placeholder while it is processing."""
+    static_dir = static_root()
+    main_path = os.path.join(static_dir, folder, filename or "")
+    if not filename or not os.path.exists(main_path):
+        return ImageSet(url_for("static", filename=PLACEHOLDER), ready=False)
+
+    src = url_for("static", filename=f"{folder}/{filename}")
+    widths = VARIANT_WIDTHS.get(folder, ())
+    key = (folder, filename)
+    if key not in _with_variants:
+        probe = os.path.join(static_dir, folder, VARIANTS_DIR, _variant_name(filename, widths[0], "jpg")) if widths else None
+        if not probe or not os.path.exists(probe):
+            return ImageSet(src)
+        _with_variants.add(key)
+
+    urls = {
+        fmt: {w: url_for("static", filename=f"{folder}/{VARIANTS_DIR}/{_variant_name(filename, w, fmt)}") for w in widths}
+        for fmt in ("webp", "jpg")
+    }
+
+    def srcset(fmt):
+        return ", ".join(f"{url} {w}w" for w, url in urls[fmt].items())
+
+    return ImageSet(src, srcset("webp"), srcset("jpg"), jpeg_by_width=urls["jpg"])
+
+
+def regenerate(static_dir, folders=None, echo=None):
+    """Create variants for every existing image in the given folders. Returns the number processed."""
+    count = 0
+    futures = []
+    for folder in folders or VARIANT_WIDTHS:
+        folder_path = os.path.join(static_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for name in sorted(os.listdir(folder_path)):
+            path = os.path.join(folder_path, name)
+            if not os.path.isfile(path) or os.path.splitext(name)[1].lower() not in {".jpg", ".jpeg", ".png", ".webp"}:
+                continue
+            futures.append(pool.submit(generate_variants, path, folder_path, name, VARIANT_WIDTHS[folder]))
+            count += 1
+            if echo:
+                echo(f"queued {folder}/{name}")
+    for future in futures:
+        if future is not None:
+            future.result()
+    return count
+
+
+@click.command("images-regenerate")
+@click.option("--folder", "folders", multiple=True, type=click.Choice(sorted(VARIANT_WIDTHS)),
+              help="Only this folder (repeatable). Defaults to all.")
+@with_appcontext
+def regenerate_images_command(folders):
+    """Generate responsive WebP/JPEG variants for images already in static/."""
+    count = regenerate(static_root(), folders or None, echo=click.echo)
+    click.echo(f"Generated variants for {count} images.")
+
+
+def init_app(app):
+    pool.configure(app.config.get("IMAGE_WORKERS", 2), app.config.get("IMAGE_QUEUE_MAX", 32))
+    app.jinja_env.globals["image_set"] = image_set
+    app.jinja_env.globals["image_sizes"] = SIZES
+    app.cli.add_command(regenerate_images_command)
@@ -0,0 +1,297 @@
+"""
+ingredients.py
+Normalised ingredient index built from the free-text Recipe.ingredients column.
+
+Each line of a recipe's ingredients is parsed into a clean ingredient name
+("500g chicken thigh" -> "chicken thigh") and stored in the ingredient table,
+linked to recipes through recipe_ingredients. Ingredient filters and the
+pantry ("what can I cook?") search then run as indexed lookups on that
+association table instead of substring scans over every recipe.
+"""
+
+import re
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_
+
+from flaskblog import db, facets
+from flaskblog.models import Ingredient, Recipe, recipe_ingredients
+
+MAX_NAME_LENGTH = 80
+
+# Units and measuring words that can follow (or be glued to) a quantity.
+UNITS = {
+    "g", "gram", "grams", "kg", "kilogram", "kilograms", "mg",
+    "ml", "millilitre", "millilitres", "milliliter", "milliliters",
+    "l", "litre", "litres", "liter", "liters",
+    "tsp", "teaspoon", "teaspoons", "tbsp", "tablespoon", "tablespoons",
+    "cup", "cups", "oz", "ounce", "ounces", "lb", "lbs", "pound", "pounds",
+    "pinch", "pinches", "dash", "handful", "handfuls",
+    "clove", "cloves", "slice", "slices", "can", "cans", "tin", "tins",
+    "packet", "packets", "pack", "bunch", "bunches", "sprig", "sprigs",
+    "piece", "pieces", "stick", "sticks",
+}
+
+# Leading words that describe the line rather than the ingredient.
+FILLER_WORDS = {"of", "optional", "extra", "a", "an", "some"}
+
+# Always assumed to be in the kitchen, so they never count against pantry coverage.
+PANTRY_STAPLES = {"salt", "pepper", "water", "oil", "olive oil"}
+
+_PARENS_RE = re.compile(r"\([^)]*\)")
+_QUANTITY_RE = re.compile(r"^(?:[\d½¼¾⅓⅔][\d½¼¾⅓⅔.,/\-]*\s*(?:x\s+)?)+")
+_GLUED_UNIT_RE = re.compile(r"^([a-z]+)\b")
+_NON_WORD_RE = re.compile(r"[^a-z\s]")
+
+
+def _singular(word: str) -> str:
+    """Very small singulariser so "eggs" and "egg" index as the same ingredient."""
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(line: str) -> str:
+    """
+    Reduce one ingredient line to its ingredient name.
+
+    - drops "(optional)"-style notes and anything after a comma ("onion, diced")
+    - strips leading quantities and units ("2 tbsp", "500g", "1/2 cup of")
+      plus filler such as "optional:" and trailing "for the pan"
+    - lowercases, removes punctuation and singularises the last word
+    Returns "" when nothing usable is left.
+    """
+    text = _PARENS_RE.sub(" ", (line or "").lower())
+    text = text.split(",", 1)[0].strip()
+
+    text = _QUANTITY_RE.sub("", text)
+    # A unit may be glued to the number we just removed ("500g" -> "g chicken").
+    match = _GLUED_UNIT_RE.match(text)
+    if match and match.group(1) in UNITS:
+        text = text[match.end():]
+    words = _NON_WORD_RE.sub(" ", text).split()
+    while words and (words[0] in UNITS or words[0] in FILLER_WORDS):
+        words = words[1:]
+    # "oil for the pan" -> "oil"
+    if "for" in words[1:]:
+        words = words[:words.index("for", 1)]
+    if not words:
+        return ""
+
+    words[-1] = _singular(words[-1])
+    return " ".join(words)[:MAX_NAME_LENGTH]
+
+
+def parse_ingredients(text: str):
+    """
+    Parse a newline-separated ingredients blob into unique ingredient names.
+
+    Lines joined with "+" or "&" ("Salt + pepper") become separate ingredients.
+    Order is preserved so the first mention wins.
+    """
+    names = []
+    seen = set()
+    for line in (text or "").splitlines():
+        for part in re.split(r"\s*[+&]\s*|\s+and\s+", line):
+            name = normalize_ingredient(part)
+            if name and name not in seen:
+                names.append(name)
+                seen.add(name)
+    return names
+
+
+def get_or_create_ingredients(names):
+    """Return Ingredient rows for the given names, creating any that are missing (one lookup query)."""
+    if not names:
+        return []
+    existing = {i.name: i for i in Ingredient.query.filter(Ingredient.name.in_(names)).all()}
+    out = []
+    for name in names:
+        ingredient = existing.get(name)
+        if ingredient is None:
+            ingredient = Ingredient(name=name)
+            db.session.add(ingredient)
+            existing[name] = ingredient
+        out.append(ingredient)
+    return out
+
+
+def sync_recipe_ingredients(recipe):
+    """Re-parse recipe.ingredients and replace its links in the ingredient index."""
+    with db.session.no_autoflush:
+        recipe.parsed_ingredients = get_or_create_ingredients(parse_ingredients(recipe.ingredients))
+
+
+# --- Query helpers ---
+
+def _name_matches(term: str):
+    """
+    Match an ingredient name that is the (normalised) term or contains it as a
+    whole word, so "chicken" finds "chicken thigh" and "beef" finds "minced beef".
+    This runs against the (small) ingredient vocabulary, never the recipe table.
+    """
+    return or_(
+        Ingredient.name == term,
+        Ingredient.name.like(f"{term} %"),
+        Ingredient.name.like(f"% {term}"),
+        Ingredient.name.like(f"% {term} %"),
+    )
+
+
+def _recipes_with_any(terms):
+    """Subquery of recipe ids using at least one ingredient matching any of the terms."""
+    ingredient_ids = db.select(Ingredient.id).where(or_(*[_name_matches(t) for t in terms]))
+    return (
+        db.select(recipe_ingredients.c.recipe_id)
+        .where(recipe_ingredients.c.ingredient_id.in_(ingredient_ids))
+    )
+
+
+def parse_ingredient_query(query: str):
+    """
+    Split an ingredient filter into (required, excluded).
+
+    Syntax: commas separate terms that must ALL match, "|" separates
+    alternatives and a leading "-" excludes, e.g.
+        "chicken, rice | noodles, -peanut"
+        -> required=[["chicken"], ["rice", "noodles"]], excluded=["peanut"]
+    """
+    required, excluded = [], []
+    for part in (query or "").split(","):
+        part = part.strip()
+        if part.startswith("-"):
+            term = normalize_ingredient(part[1:])
+            if term:
+                excluded.append(term)
+            continue
+        options = normalize_terms(part.split("|"))
+        if options:
+            required.append(options)
+    return required, excluded
+
+
+def normalize_terms(terms):
+    """Normalise user-typed ingredient terms the same way recipe lines are, dropping empties."""
+    out = []
+    for t in terms:
+        name = normalize_ingredient(t)
+        if name and name not in out:
+            out.append(name)
+    return out
+
+
+def filter_by_ingredients(query, expression: str):
+    """Apply an AND/OR/NOT ingredient expression (see parse_ingredient_query) to a Recipe query."""
+    required, excluded = parse_ingredient_query(expression)
+    for options in required:
+        query = query.filter(Recipe.id.in_(_recipes_with_any(options)))
+    if excluded:
+        query = query.filter(Recipe.id.not_in(_recipes_with_any(excluded)))
+    return query
+
+
+def pantry_query(pantry_terms):
+    """
+    Recipes that use ingredients from the pantry list, best coverage first.
+
+    Returns a select of (Recipe, matched, total) where matched counts the
+    recipe's ingredients found in the pantry (staples always count) and
+    total is the recipe's ingredient count. Callers must pass at least one
+    usable term (see normalize_terms).
+    """
+    terms = normalize_terms(pantry_terms)
+    ri = recipe_ingredients
+
+    staples = or_(*[Ingredient.name == s for s in PANTRY_STAPLES])
+    in_pantry = db.select(Ingredient.id).where(or_(staples, *[_name_matches(t) for t in terms]))
+    using_pantry = _recipes_with_any(terms)
+
+    totals = (
+        db.select(
+            ri.c.recipe_id,
+            func.count().label("total"),
+            func.sum(db.case((ri.c.ingredient_id.in_(in_pantry), 1), else_=0)).label("matched"),
+        )
+        .where(ri.c.recipe_id.in_(using_pantry))
+        .group_by(ri.c.recipe_id)
+        .subquery()
+    )
+    coverage = (totals.c.matched * 1.0) / totals.c.total
+
+    return (
+        db.select(Recipe, totals.c.matched, totals.c.total)
+        .join(totals, totals.c.recipe_id == Recipe.id)
+        .order_by(coverage.desc(), totals.c.matched.desc(), Recipe.date_posted.desc())
+    )
+
+
+def missing_ingredients(recipe, pantry_terms):
+    """Names of the recipe's parsed ingredients not covered by the pantry list (for display)."""
+    terms = normalize_terms(pantry_terms)
+    missing = []
+    for ingredient in recipe.parsed_ingredients:
+        words = ingredient.name.split()
+        if ingredient.name in PANTRY_STAPLES:
+            continue
+        if any(t == ingredient.name or all(w in words for w in t.split()) for t in terms):
+            continue
+        missing.append(ingredient.name)
+    return missing
+
+
+# --- Backfill ---
+
+def backfill(batch_size: int = 500) -> int:
+    """
+    Rebuild recipe_ingredients for every recipe.
+
+    Ingredient ids are resolved through an in-memory name -> id map and the
+    links are written in executemany batches inside a single transaction,
+    together with fresh ingredient facet counts.
+    """
+    db.session.execute(recipe_ingredients.delete())
+    name_to_id = dict(db.session.execute(db.select(Ingredient.name, Ingredient.id)).all())
+
+    count = 0
+    links = []
+    rows = db.session.execute(
+        db.select(Recipe.id, Recipe.ingredients).order_by(Recipe.id).execution_options(yield_per=batch_size)
+    )
+    for recipe_id, text in rows:
+        for name in parse_ingredients(text):
+            ingredient_id = name_to_id.get(name)
+            if ingredient_id is None:
+                ingredient_id = db.session.execute(
+                    Ingredient.__table__.insert().values(name=name)
+                ).inserted_primary_key[0]
+                name_to_id[name] = ingredient_id
+            links.append({"recipe_id": recipe_id, "ingredient_id": ingredient_id})
+        count += 1
+        if len(links) >= batch_size:
+            db.session.execute(recipe_ingredients.insert(), links)
+            links = []
+
+    if links:
+        db.session.execute(recipe_ingredients.insert(), links)
+    facets.rebuild_ingredients()
+    db.session.commit()
+    return count
+
+
+@click.command("ingredients-backfill")
+@with_appcontext
+def backfill_ingredients_command():
+    """Parse every recipe's ingredients into the normalised ingredient index."""
+    count = backfill()
+    click.echo(f"Indexed ingredients for {count} recipes.")
+
+
+def init_app(app):
+    app.cli.add_command(backfill_ingredients_command)
@@ -0,0 +1,244 @@
+"""
+instrumentation.py
+Per-request performance instrumentation (enabled with PERF_INSTRUMENTATION=1).
+
+For every request this records:
+- how many SQL statements ran and how long they took
+- repeated statements (the same SQL run again and again is usually an N+1 lazy load)
+- how long each Jinja template took to render
+
+Results are sent back in a Server-Timing header (visible in browser dev tools),
+written as one JSON log line per request, and kept in a rolling window per
+endpoint so the admin performance page can show p50/p95/p99 latencies.
+
+count_queries() can be used on its own (e.g. in tests) to check a query budget:
+
+    with count_queries() as q:
+        client.get("/")
+    assert q.count <= 4
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("flaskblog.perf")
+
+# The same statement run this many times in one request is reported as a likely N+1.
+REPEAT_THRESHOLD = 3
+
+# Number of recent requests kept per endpoint for percentile stats.
+WINDOW_SIZE = 500
+
+_local = threading.local()
+_listeners_installed = False
+
+
+class QueryCounter:
+    """Collects SQL statements executed while it is active."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """Statements executed at least `threshold` times, most frequent first."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+class count_queries:
+    """Context manager that counts SQL statements run in this thread."""
+
+    def __enter__(self):
+        _install_listeners()
+        self.counter = QueryCounter()
+        _active_counters().append(self.counter)
+        return self.counter
+
+    def __exit__(self, *exc):
+        _active_counters().remove(self.counter)
+        return False
+
+
+def _active_counters():
+    if not hasattr(_local, "counters"):
+        _local.counters = []
+    return _local.counters
+
+
+class EndpointStats:
+    """Rolling latency window per endpoint, shared by all threads in this worker."""
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=self.window))
+        self._queries = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = Counter()
+
+    def add(self, endpoint, duration_ms, query_count):
+        with self._lock:
+            self._durations[endpoint].append(duration_ms)
+            self._queries[endpoint].append(query_count)
+            self._totals[endpoint] += 1
+
+    def snapshot(self):
+        """List of per-endpoint summaries, slowest p95 first."""
+        with self._lock:
+            data = {ep: (list(d), list(self._queries[ep]), self._totals[ep]) for ep, d in self._durations.items()}
+
+        rows = []
+        for endpoint, (durations, queries, total) in data.items():
+            durations.sort()
+            rows.append(dict(
+                endpoint=endpoint,
+                requests=total,
+                p50=_percentile(durations, 50),
+                p95=_percentile(durations, 95),
+                p99=_percentile(durations, 99),
+                avg_queries=sum(queries) / len(queries) if queries else 0,
+                max_queries=max(queries) if queries else 0,
+            ))
+        rows.sort(key=lambda r: r["p95"], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._queries.clear()
+            self._totals.clear()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+stats = EndpointStats()
+
+
+# --- SQLAlchemy hooks (installed once, on every Engine) ---
+
+# The start time rides on the statement's execution context, so a statement that
+# fails (no after_cursor_execute) leaves nothing behind on the connection.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._perf_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_perf_start", None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+
+    for counter in _active_counters():
+        counter.record(statement, duration)
+    if has_request_context():
+        perf = g.get("perf")
+        if perf is not None:
+            perf.queries.record(statement, duration)
+
+
+def _install_listeners():
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _listeners_installed = True
+
+
+# --- Request / template hooks ---
+
+class RequestPerf:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = QueryCounter()
+        self.templates = []          # (name, seconds)
+        self._template_starts = []
+
+
+def _before_request():
+    g.perf = RequestPerf()
+
+
+def _before_render(sender, template, context, **extra):
+    perf = g.get("perf") if has_request_context() else None
+    if perf is not None:
+        perf._template_starts.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    perf = g.get("perf") if has_request_context() else None
+    if perf is not None and perf._template_starts:
+        perf.templates.append((template.name, time.perf_counter() - perf._template_starts.pop()))
+
+
+def _after_request(response):
+    perf = g.pop("perf", None)
+    if perf is None:
+        return response
+
+    total_ms = (time.perf_counter() - perf.start) * 1000
+    db_ms = perf.queries.duration * 1000
+    tpl_ms = sum(seconds for _, seconds in perf.templates) * 1000
+    repeated = perf.queries.repeated()
+    endpoint = request.endpoint or "<unmatched>"
+
+    timings = [
+        f'db;dur={db_ms:.1f};desc="{perf.queries.count} queries"',
+        f"tpl;dur={tpl_ms:.1f}",
+        f"total;dur={total_ms:.1f}",
+    ]
+    response.headers.add("Server-Timing", ", ".join(timings))
+
+    if endpoint != "static":
+        stats.add(endpoint, total_ms, perf.queries.count)
+
+    log = logger.warning if repeated else logger.info
+    log(json.dumps({
+        "event": "request",
+        "method": request.method,
+        "path": request.path,
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "total_ms": round(total_ms, 2),
+        "db_ms": round(db_ms, 2),
+        "queries": perf.queries.count,
+        "templates": [{"name": name, "ms": round(s * 1000, 2)} for name, s in perf.templates],
+        "repeated_queries": [{"sql": sql[:200], "count": n} for sql, n in repeated],
+    }))
+    return response
+
+
+def init_app(app):
+    """Hook instrumentation into the app when PERF_INSTRUMENTATION is on."""
+    if not app.config.get("PERF_INSTRUMENTATION"):
+        return
+    _install_listeners()
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.extensions["perf_instrumentation"] = True
@@ -0,0 +1,115 @@
+from flask import Blueprint, current_app, render_template, request
+from flaskblog.models import Recipe, Tag, RECIPE_CARD_OPTIONS
+from flaskblog.pagination import keyset_paginate, NEWEST_FIRST
+from flaskblog.cache import cache, cached_page
+from flaskblog import facets, popularity
+
+# Create the Blueprint for the "main" section of the site (home/about/tips).
+main = Blueprint("main", __name__)
+
+@main.route("/")
+@main.route("/home")
+# The popularity panels change with views, not writes: expire with the ranking's cache.
+@cached_page(depends=("recipes", "tags"), ttl=popularity.POPULAR_CACHE_TTL)
+def home():
+    # Read the page cursor from the query string (old ?page=N links still work).
+    cursor = request.args.get("cursor", "", type=str)
+    page = request.args.get("page", 1, type=int)
+
+    # Newest recipes first, keyset-paginated so every page costs the same.
+    # Cards only need the light columns + tags, loaded in one extra batched query.
+    recipes = keyset_paginate(
+        Recipe.query.options(*RECIPE_CARD_OPTIONS), NEWEST_FIRST, cursor=cursor, page=page, per_page=6
+    )
+
+    # Pull recipes tagged as "featured" to display in the homepage carousel.
+    # This query MUST stay inside the route to ensure an active Flask app context.
+    featured = (
+        Recipe.query
+        .options(*RECIPE_CARD_OPTIONS[:-1])  # carousel shows no tags
+        .join(Recipe.tags)
+        .filter(Tag.name == "featured")
+        .order_by(Recipe.date_posted.desc())
+        .limit(5)
+        .all()
+    )
+
+    # Too few featured recipes: fill the remaining slides with the most viewed ones.
+    popular_ids = set()
+    if len(featured) < 5 and current_app.config.get("POPULAR_CAROUSEL_FALLBACK", True):
+        fillers = popularity.popular_recipes(5 - len(featured), exclude={r.id for r in featured})
+        popular_ids = {r.id for r in fillers}
+        featured += fillers
+
+    # "Popular right now" sidebar (ranking cached for a minute).
+    popular = popularity.popular_recipes(5)
+
+    # Most used tags for the sidebar "Top tags" section (materialised counts, cached until a write).
+    top_tags = cache.get_or_set(
+        "top_tags:10",
+        lambda: facets.top_values(facets.TAG, 10),
+        depends=("recipes", "tags"),
+    )
+
+    # Render the homepage with recipes, featured carousel items, and sidebar tags.
+    return render_template(
+        "main/home.html",
+        recipes=recipes,
+        featured=featured,
+        popular_ids=popular_ids,
+        popular=popular,
+        top_tags=top_tags
+    )
+
+@main.route("/tips")
+def tips():
+    # Simple tips list used to make the site feel complete for marking.
+    tips_list = [
+        {"title": "Kitchen Safety Basics", "body": "Wash hands, tie hair back, and keep your bench clean."},
+        {"title": "How to Season Properly", "body": "Taste as you go. Add salt gradually and balance with acid (lemon/vinegar)."},
+        {"title": "Food Storage", "body": "Cool foods quickly, refrigerate within 2 hours, and label containers."},
+    ]
+
+    # Render the tips page as a clean, static content section.
+    return render_template("main/tips.html", title="Cooking Tips", tips=tips_list)
+
+@main.route("/about")
+def about():
+    # About page gives context for the school project and how to use the site.
+    return render_template("main/about.html", title="About")
+
+@main.route("/categories")
+# Also shows popular recipes: same TTL as home.
+@cached_page(depends=("recipes", "tags"), ttl=popularity.POPULAR_CACHE_TTL)
+def categories():
+    tiles = [
+        {"title": "Italian", "q": {"cuisine": "Italian"}, "img": "cat_italian.jpg"},
+        {"title": "Asian", "q": {"cuisine": "Asian"}, "img": "cat_asian.jpg"},
+        {"title": "Mexican", "q": {"cuisine": "Mexican"}, "img": "cat_mexican.jpg"},
+        {"title": "Dessert", "q": {"cuisine": "Dessert"}, "img": "cat_dessert.jpg"},
+        {"title": "Easy", "q": {"difficulty": "Easy"}, "img": "cat_easy.jpg"},
+        {"title": "Under 30 mins", "q": {"max_time": "30"}, "img": "cat_quick.jpg"},
+    ]
+
+    # Latest recipes preview (fills the page visually); "more" continues from the last one.
+    latest = keyset_paginate(Recipe.query.options(*RECIPE_CARD_OPTIONS[:-1]), NEWEST_FIRST, per_page=6)
+
+    # Most viewed recipes lately (decayed view counts).
+    popular = popularity.popular_recipes(6)
+
+    # Popular tags (quick navigation).
+    top_tags = cache.get_or_set(
+        "top_tags:12",
+        lambda: facets.top_values(facets.TAG, 12),
+        depends=("recipes", "tags"),
+    )
+
+    return render_template(
+        "main/categories.html",
+        title="Categories",
+        tiles=tiles,
+        latest=latest.items,
+        more_cursor=latest.next_cursor,
+        popular=popular,
+        top_tags=top_tags
+    )
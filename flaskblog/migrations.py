@@ -0,0 +1,184 @@
+"""
+migrations.py
+Versioned schema migrations, applied with `flask db-upgrade`.
+
+The app no longer creates or alters tables when it starts: create_app()
+only reads the schema version (one small query) and logs a warning if
+migrations are pending. `flask db-upgrade` runs the missing ones in order
+and records each in the schema_migration table; `flask db-status` lists
+them. Run it once per deploy, before starting the server.
+
+Every migration is idempotent. Migration 1 creates whatever tables are
+missing from the current models, so on a new database the column upgrades
+after it find nothing to do; databases from before this module existed
+start at version 0 and get exactly the upgrades they lack.
+
+To change the schema, update the model and append a migration (the next
+version number) that brings existing databases up to it.
+"""
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, inspect
+
+from flaskblog import comments, counters, database, db, facets, ingredients, related, search
+from flaskblog.models import (
+    Comment, FacetCount, Recipe, RelatedRecipe, SchemaMigration, SiteCounter, User, recipe_ingredients,
+)
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a migration function under a version number (which must increase)."""
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+@migration(1, "create missing tables")
+def _create_tables():
+    db.create_all()
+
+
+@migration(2, "user.session_version")
+def _user_session_version():
+    database.add_column(User.__table__.c.session_version)
+
+
+@migration(3, "recipe.version and recipe.updated_at")
+def _recipe_revisions():
+    database.add_column(Recipe.__table__.c.version)
+    if database.add_column(Recipe.__table__.c.updated_at):
+        db.session.execute(
+            db.update(Recipe).values(updated_at=Recipe.date_posted).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+@migration(4, "recipe.comment_count")
+def _recipe_comment_count():
+    if database.add_column(Recipe.__table__.c.comment_count):
+        comments.recount()
+
+
+@migration(5, "comment.approved")
+def _comment_approved():
+    # Comments posted before moderation existed were already public: count them as approved.
+    if database.add_column(Comment.__table__.c.approved):
+        db.session.execute(db.update(Comment).values(approved=True))
+        db.session.commit()
+
+
+@migration(6, "ON DELETE rules on foreign keys")
+def _foreign_keys():
+    # After the column upgrades above, so the rebuilt tables keep their values.
+    database.upgrade_foreign_keys(echo=click.echo)
+
+
+@migration(7, "recipe full-text search index")
+def _search_index():
+    existed = inspect(db.engine).has_table(search.FTS_TABLE)
+    if search.create_index() and not existed and _has_recipes():
+        search.rebuild_index()
+
+
+@migration(8, "indexes declared on the models")
+def _indexes():
+    database.add_missing_indexes(echo=click.echo)
+
+
+@migration(9, "dashboard counters")
+def _counters():
+    if db.session.execute(db.select(SiteCounter.name).limit(1)).scalar() is None:
+        counters.rebuild()
+
+
+@migration(10, "ingredient index")
+def _ingredient_index():
+    # Before the facet counts and related recipes, which are computed from it.
+    if _has_recipes() and db.session.execute(db.select(recipe_ingredients.c.recipe_id).limit(1)).scalar() is None:
+        ingredients.backfill()
+
+
+@migration(11, "facet counts")
+def _facet_counts():
+    if not _has_recipes():
+        return
+    counted = set(db.session.execute(db.select(FacetCount.facet).distinct()).scalars())
+    # Ingredient counts alone may just have been written by the backfill above.
+    if not counted - {facets.INGREDIENT}:
+        facets.rebuild()
+    elif facets.INGREDIENT not in counted:
+        facets.rebuild_ingredients()
+        db.session.commit()
+
+
+@migration(12, "related recipes")
+def _related():
+    if _has_recipes() and db.session.execute(db.select(RelatedRecipe.recipe_id).limit(1)).scalar() is None:
+        related.rebuild()
+
+
+def _has_recipes():
+    return db.session.execute(db.select(Recipe.id).limit(1)).scalar() is not None
+
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+
+def current_version():
+    """Highest migration applied to the database (0 for a new or pre-migration database)."""
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return 0
+    return db.session.execute(db.select(func.max(SchemaMigration.version))).scalar() or 0
+
+
+def upgrade(echo=None):
+    """Apply every pending migration, each recorded as it completes. Returns the versions applied."""
+    current = current_version()
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        if echo:
+            echo(f"{version:>3}  {name}")
+        fn()
+        db.session.add(SchemaMigration(version=version, name=name))
+        db.session.commit()
+        applied.append(version)
+    return applied
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def upgrade_command():
+    """Create or upgrade the database schema to the latest version."""
+    applied = upgrade(echo=click.echo)
+    if applied:
+        click.echo(f"Applied {len(applied)} migrations; the schema is at version {latest_version()}.")
+    else:
+        click.echo(f"The schema is up to date (version {latest_version()}).")
+
+
+@click.command("db-status")
+@with_appcontext
+def status_command():
+    """List the schema migrations and whether each has been applied."""
+    current = current_version()
+    for version, name, _ in MIGRATIONS:
+        click.echo(f"{version:>3}  {'applied' if version <= current else 'pending':<8} {name}")
+
+
+def init_app(app):
+    app.cli.add_command(upgrade_command)
+    app.cli.add_command(status_command)
+    with app.app_context():
+        current = current_version()
+    app.extensions["schema_version"] = current
+    if current < latest_version():
+        app.logger.warning(
+            "Database schema is at version %d of %d: run `flask db-upgrade`.", current, latest_version()
+        )
@@ -0,0 +1,223 @@
+from datetime import datetime, timezone
+from flaskblog import db
+from flask_login import UserMixin
+from sqlalchemy.orm import defer, selectinload
+
+
+def utcnow():
+    """Current UTC time as a naive datetime, the way every DateTime column is stored."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+recipe_tags = db.Table(
+    "recipe_tags",
+    db.Column("recipe_id", db.Integer, db.ForeignKey("recipe.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tag.id", ondelete="CASCADE"), primary_key=True),
+    # Tag filters and tag counts go tag -> recipes.
+    db.Index("ix_recipe_tags_tag_recipe", "tag_id", "recipe_id"),
+)
+
+recipe_ingredients = db.Table(
+    "recipe_ingredients",
+    db.Column("recipe_id", db.Integer, db.ForeignKey("recipe.id", ondelete="CASCADE"), primary_key=True),
+    db.Column("ingredient_id", db.Integer, db.ForeignKey("ingredient.id", ondelete="CASCADE"), primary_key=True),
+    # Lookups go ingredient -> recipes, so index that direction too.
+    db.Index("ix_recipe_ingredients_ingredient_recipe", "ingredient_id", "recipe_id"),
+)
+
+class User(db.Model, UserMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(40), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    image_file = db.Column(db.String(80), nullable=False, default="default.jpg")
+    password = db.Column(db.String(128), nullable=False)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False)
+    # Bumped whenever the profile or admin flag changes (see flaskblog.identity).
+    session_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    recipes = db.relationship("Recipe", backref="author", lazy=True)
+    comments = db.relationship("Comment", backref="author", lazy=True)
+
+    def __repr__(self):
+        return f"User('{self.username}', '{self.email}', admin={self.is_admin})"
+
+class Recipe(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(120), nullable=False)
+    summary = db.Column(db.String(240), nullable=True)
+    image_file = db.Column(db.String(80), nullable=False, default="default_recipe.jpg")
+
+    cuisine = db.Column(db.String(50), nullable=True)
+    difficulty = db.Column(db.String(20), nullable=True)
+    cook_time_mins = db.Column(db.Integer, nullable=True)
+
+    ingredients = db.Column(db.Text, nullable=False)      # newline separated
+    instructions = db.Column(db.Text, nullable=False)     # newline separated
+    video_url = db.Column(db.String(255), nullable=True)
+
+    date_posted = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    # Denormalised number of comments, maintained by flaskblog.comments.
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # Moved on every edit by flaskblog.revisions (API ETags and Last-Modified).
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+
+    # Never loaded whole: pages come from flaskblog.comments. Deleting a recipe
+    # leaves comments and tag/ingredient links to the database's ON DELETE CASCADE.
+    comments = db.relationship("Comment", backref="recipe", lazy="write_only", passive_deletes=True)
+    # Loaded explicitly per view (see RECIPE_CARD_OPTIONS) rather than on every Recipe load.
+    tags = db.relationship("Tag", secondary=recipe_tags, lazy=True, passive_deletes=True,
+                           backref=db.backref("recipes", lazy=True))
+    # Normalised ingredient names parsed from the ingredients text (see flaskblog.ingredients).
+    parsed_ingredients = db.relationship("Ingredient", secondary=recipe_ingredients, lazy=True, passive_deletes=True,
+                                         backref=db.backref("recipes", lazy=True))
+
+    __table_args__ = (
+        # Newest-first listings and keyset pagination: (date_posted, id).
+        db.Index("ix_recipe_date_posted_id", "date_posted", "id"),
+        # Filters, each followed by the listing order so filtered pages need no sort.
+        db.Index("ix_recipe_cuisine_date_posted", "cuisine", "date_posted", "id"),
+        db.Index("ix_recipe_difficulty_date_posted", "difficulty", "date_posted", "id"),
+        db.Index("ix_recipe_cook_time_mins", "cook_time_mins"),
+        db.Index("ix_recipe_user_id", "user_id"),
+        # Recipes edited since a point in time (search suggestions catching up).
+        db.Index("ix_recipe_updated_at", "updated_at"),
+    )
+
+    def __repr__(self):
+        return f"Recipe('{self.title}', '{self.date_posted}')"
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(40), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f"Tag('{self.name}')"
+
+class Ingredient(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f"Ingredient('{self.name}')"
+
+class FacetCount(db.Model):
+    """Materialised number of recipes per facet value (see flaskblog.facets)."""
+    __tablename__ = "facet_count"
+
+    facet = db.Column(db.String(20), primary_key=True)      # tag / cuisine / difficulty / cook_time
+    value = db.Column(db.String(80), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index("ix_facet_count_facet_count", "facet", "count"),)
+
+    def __repr__(self):
+        return f"FacetCount('{self.facet}', '{self.value}', {self.count})"
+
+class SiteCounter(db.Model):
+    """Maintained site-wide total, e.g. number of recipes (see flaskblog.counters)."""
+    __tablename__ = "site_counter"
+
+    name = db.Column(db.String(40), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"SiteCounter('{self.name}', {self.value})"
+
+class StoredImage(db.Model):
+    """Image manifest entry: one stored file per distinct content (see flaskblog.image_store)."""
+    __tablename__ = "stored_image"
+
+    id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(40), nullable=False)      # recipe_pics / profile_pics
+    filename = db.Column(db.String(80), nullable=False)
+    digest = db.Column(db.String(64), nullable=False)      # sha256 of the bytes as uploaded
+    size = db.Column(db.Integer, nullable=False, default=0)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("folder", "filename", name="uq_stored_image_folder_filename"),
+        db.Index("ix_stored_image_folder_digest", "folder", "digest"),
+    )
+
+    def __repr__(self):
+        return f"StoredImage('{self.folder}/{self.filename}', refs={self.refcount})"
+
+class Comment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    body = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    # Cleared by a moderator in the admin queue (comments are visible either way).
+    approved = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id", ondelete="CASCADE"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    __table_args__ = (
+        # A recipe's comments in posting order, and the admin list (newest first).
+        db.Index("ix_comment_recipe_created_at", "recipe_id", "created_at"),
+        db.Index("ix_comment_created_at", "created_at"),
+        db.Index("ix_comment_user_id", "user_id"),
+        # The moderation queue: unapproved comments, newest first.
+        db.Index("ix_comment_approved_created_at", "approved", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"Comment(recipe_id={self.recipe_id}, user_id={self.user_id})"
+
+class RelatedRecipe(db.Model):
+    """Precomputed "you might also like" neighbour of a recipe (see flaskblog.related)."""
+    __tablename__ = "related_recipe"
+
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id", ondelete="CASCADE"), primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey("recipe.id", ondelete="CASCADE"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    # Which lists a recipe appears in (refilled when it is deleted).
+    __table_args__ = (db.Index("ix_related_recipe_related_id", "related_id"),)
+
+    def __repr__(self):
+        return f"RelatedRecipe({self.recipe_id} -> {self.related_id}, {self.score:.3f})"
+
+class RecipeStats(db.Model):
+    """View count and decayed popularity of a recipe (see flaskblog.popularity)."""
+    __tablename__ = "recipe_stats"
+
+    recipe_id = db.Column(db.Integer, db.ForeignKey("recipe.id", ondelete="CASCADE"), primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    # Views weighted by how recent they are, in the scale of score_epoch.
+    score = db.Column(db.Float, nullable=False, default=0.0)
+    score_epoch = db.Column(db.Integer, nullable=False, default=0)
+    last_viewed = db.Column(db.DateTime)
+
+    # Most popular first, read a page at a time per epoch.
+    __table_args__ = (db.Index("ix_recipe_stats_score", "score_epoch", "score"),)
+
+    def __repr__(self):
+        return f"RecipeStats({self.recipe_id}, views={self.views})"
+
+
+class SchemaMigration(db.Model):
+    """A schema migration that has been applied to this database (see flaskblog.migrations)."""
+    __tablename__ = "schema_migration"
+
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return f"SchemaMigration({self.version}, '{self.name}')"
+
+# Loader options for recipe cards/lists: skip the large text columns the cards
+# never show and fetch every card's tags in one batched query.
+RECIPE_CARD_OPTIONS = (
+    defer(Recipe.ingredients),
+    defer(Recipe.instructions),
+    defer(Recipe.video_url),
+    selectinload(Recipe.tags),
+)
@@ -0,0 +1,210 @@
+"""
+moderation.py
+Admin moderation queues and set-based bulk actions.
+
+The comment and recipe queues are keyset-paginated (newest first) and can
+be filtered by author, recipe, date range and text. Bulk actions apply to
+either the ticked rows or everything matching the current filters, and run
+as a few set-based statements however many rows they touch:
+
+- approve: one UPDATE
+- delete comments: one GROUP BY to adjust each recipe's comment_count,
+  then one DELETE
+- delete recipes: GROUP BY aggregates for the facet counts, image
+  references and counters, then one DELETE; comments, tag/ingredient links and
+  related-recipe rows go with it through ON DELETE CASCADE (lists that
+  pointed at a deleted recipe are refilled when there are few of them)
+
+Every action takes a SELECT of the ids to act on, so "ticked rows" and
+"all matching" share one code path. The admin views refuse an "all
+matching" delete when no filter narrows it (it would empty the table).
+Counters (flaskblog.counters), facet counts, the search index and image
+references are adjusted in the same transaction; callers commit.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import joinedload, load_only
+
+from flaskblog import counters, db, facets, image_store, related
+from flaskblog import search as recipe_search
+from flaskblog.models import Comment, Recipe, User
+
+PER_PAGE = 50
+
+COMMENT_FILTERS = ("status", "author", "recipe", "q", "date_from", "date_to")
+RECIPE_FILTERS = ("author", "q", "date_from", "date_to")
+
+# Comment queue statuses; "pending" (not yet approved) is the default view.
+STATUSES = ("pending", "approved", "all")
+
+
+def read_filters(args, names):
+    """Filter values from request args/form (always strings, stripped)."""
+    return {name: (args.get(name) or "").strip() for name in names}
+
+
+def _day(value, end=False):
+    """Parse YYYY-MM-DD. With end=True, returns the start of the next day (an exclusive bound)."""
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+    return day + timedelta(days=1) if end else day
+
+
+def _author_ids(username):
+    return db.select(User.id).where(func.lower(User.username) == username.lower())
+
+
+def _date_criteria(column, filters):
+    criteria = []
+    start, end = _day(filters["date_from"]), _day(filters["date_to"], end=True)
+    if start:
+        criteria.append(column >= start)
+    if end:
+        criteria.append(column < end)
+    return criteria
+
+
+def comment_criteria(filters):
+    """WHERE clauses for the comment queue."""
+    criteria = []
+    status = filters["status"] or "pending"
+    if status == "pending":
+        criteria.append(Comment.approved.is_(False))
+    elif status == "approved":
+        criteria.append(Comment.approved.is_(True))
+    if filters["author"]:
+        criteria.append(Comment.user_id.in_(_author_ids(filters["author"])))
+    if filters["recipe"].isdigit():
+        criteria.append(Comment.recipe_id == int(filters["recipe"]))
+    elif filters["recipe"]:
+        criteria.append(Comment.recipe_id.in_(
+            db.select(Recipe.id).where(Recipe.title.ilike(f"%{filters['recipe']}%"))
+        ))
+    if filters["q"]:
+        criteria.append(Comment.body.ilike(f"%{filters['q']}%"))
+    return criteria + _date_criteria(Comment.created_at, filters)
+
+
+def recipe_criteria(filters):
+    """WHERE clauses for the recipe queue."""
+    criteria = []
+    if filters["author"]:
+        criteria.append(Recipe.user_id.in_(_author_ids(filters["author"])))
+    if filters["q"]:
+        criteria.append(Recipe.title.ilike(f"%{filters['q']}%"))
+    return criteria + _date_criteria(Recipe.date_posted, filters)
+
+
+def comment_queue(filters):
+    """Comment queue query, with each comment's author name and recipe title joined in."""
+    return (
+        Comment.query
+        .filter(*comment_criteria(filters))
+        .options(
+            joinedload(Comment.author).load_only(User.username),
+            joinedload(Comment.recipe).load_only(Recipe.title),
+        )
+    )
+
+
+def recipe_queue(filters):
+    return (
+        Recipe.query
+        .filter(*recipe_criteria(filters))
+        .options(
+            load_only(Recipe.id, Recipe.title, Recipe.date_posted, Recipe.user_id, Recipe.comment_count),
+            joinedload(Recipe.author).load_only(User.username),
+        )
+    )
+
+
+def selected_ids(model, criteria, ids=None):
+    """
+    SELECT of the ids a bulk action applies to: the ticked `ids` when given
+    (still limited by the filters), otherwise every row matching `criteria`.
+    """
+    query = db.select(model.id).where(*criteria)
+    if ids is not None:
+        query = query.where(model.id.in_(ids))
+    return query
+
+
+def approve_comments(id_select):
+    """Mark comments approved. Returns how many changed."""
+    approved = db.session.execute(
+        db.update(Comment)
+        .where(Comment.id.in_(id_select), Comment.approved.is_(False))
+        .values(approved=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    counters.apply({counters.PENDING_COMMENTS: -approved})
+    return approved
+
+
+def delete_comments(id_select):
+    """Delete comments, keeping recipe comment counts and counters in step. Returns how many."""
+    per_recipe = db.session.execute(
+        db.select(
+            Comment.recipe_id,
+            func.count(Comment.id),
+            func.count(Comment.id).filter(Comment.approved.is_(False)),
+        )
+        .where(Comment.id.in_(id_select))
+        .group_by(Comment.recipe_id)
+    ).all()
+    if not per_recipe:
+        return 0
+
+    table = Recipe.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam("recipe_id"))
+        .values(comment_count=table.c.comment_count - bindparam("removed")),
+        [{"recipe_id": recipe_id, "removed": removed} for recipe_id, removed, _ in per_recipe],
+    )
+    db.session.execute(
+        db.delete(Comment).where(Comment.id.in_(id_select)).execution_options(synchronize_session=False)
+    )
+
+    removed = sum(count for _, count, _ in per_recipe)
+    counters.apply({
+        counters.COMMENTS: -removed,
+        counters.PENDING_COMMENTS: -sum(pending for _, _, pending in per_recipe),
+    })
+    return removed
+
+
+def delete_recipes(id_select):
+    """
+    Delete recipes with everything that hangs off them. Returns how many.
+
+    Comments and tag/ingredient links are removed by ON DELETE CASCADE;
+    facet counts, counters, image references and the search index are
+    adjusted here from aggregates over the doomed rows.
+    """
+    facet_deltas = Counter({value: -count for value, count in facets.recipe_counts(id_select).items()})
+    images = Counter(dict(db.session.execute(
+        db.select(Recipe.image_file, func.count()).where(Recipe.id.in_(id_select)).group_by(Recipe.image_file)
+    ).all()))
+    if not images:
+        return 0
+
+    deltas = Counter(counters.recipe_comment_deltas(id_select))
+    recipe_search.remove_recipes(id_select)
+    lost_neighbour = related.dependents(id_select)
+    removed = db.session.execute(
+        db.delete(Recipe).where(Recipe.id.in_(id_select)).execution_options(synchronize_session=False)
+    ).rowcount
+
+    facets.apply_counts(facet_deltas)
+    for filename, references in images.items():
+        image_store.release("recipe_pics", filename, references)
+    deltas[counters.RECIPES] = -removed
+    counters.apply(deltas)
+    related.refill(lost_neighbour)
+    return removed
@@ -0,0 +1,210 @@
+"""
+pagination.py
+Keyset (cursor) pagination for recipe listings (and other long lists).
+
+OFFSET pagination makes the database walk and discard every earlier row, so
+page 5000 costs 5000x page 1 and rows shift when new recipes are posted.
+Keyset pagination instead remembers the sort key of the last row shown
+(e.g. date_posted, id) and asks for rows strictly after it, which is a
+single index range scan no matter how deep the page is.
+
+Cursors are opaque URL-safe tokens; callers should never parse them.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, inspect, or_, select, func, tuple_, literal
+
+from flaskblog import db
+from flaskblog.models import Recipe
+
+# Default listing order; id breaks ties between recipes posted in the same instant.
+NEWEST_FIRST = [(Recipe.date_posted, True), (Recipe.id, True)]
+
+# Counting stops here; beyond it we show "1000+" instead of scanning the whole result set.
+COUNT_CAP = 1000
+
+
+class CursorError(ValueError):
+    """Raised when a cursor token is malformed (tampered with or from another listing)."""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values, direction: str) -> str:
+    payload = json.dumps({"k": [_encode_value(v) for v in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str):
+    """Return (values, direction) from a cursor token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = [_decode_value(v) for v in data["k"]] if isinstance(data["k"], list) else None
+        direction = data["d"]
+    except (ValueError, KeyError, TypeError, binascii.Error) as exc:
+        raise CursorError("Invalid cursor") from exc
+    if values is None or direction not in ("next", "prev"):
+        raise CursorError("Invalid cursor")
+    return values, direction
+
+
+def _coerce(column, value):
+    """A cursor value as the Python type of its sort column (raises CursorError if it cannot be)."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+
+    if python_type is datetime:
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError as exc:
+                raise CursorError("Invalid cursor") from exc
+        if isinstance(value, datetime):
+            return value
+    elif python_type is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    elif python_type is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif python_type is str:
+        if isinstance(value, str):
+            return value
+    elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    raise CursorError("Invalid cursor")
+
+
+def cursor_values(keys, values):
+    """Check decoded cursor values against the sort keys: one per key, each of its column's type."""
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise CursorError("Invalid cursor")
+    return [_coerce(col, value) for (col, _), value in zip(keys, values)]
+
+
+def _after(keys, values, reverse=False):
+    """
+    WHERE clause selecting rows that sort strictly after `values`.
+
+    keys is a list of (column, descending). When every key sorts the same way
+    a row-value comparison is used so the database can seek the index directly;
+    mixed directions fall back to the expanded OR form.
+    """
+    descending = [desc != reverse for _, desc in keys]
+    columns = [col for col, _ in keys]
+    bound = [literal(v, type_=col.type) for (col, _), v in zip(keys, values)]
+
+    if all(descending):
+        return tuple_(*columns) < tuple_(*bound)
+    if not any(descending):
+        return tuple_(*columns) > tuple_(*bound)
+
+    clauses = []
+    for i, (col, desc) in enumerate(zip(columns, descending)):
+        equal_prefix = [columns[j] == bound[j] for j in range(i)]
+        step = col < bound[i] if desc else col > bound[i]
+        clauses.append(and_(*equal_prefix, step))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated query (mirrors the bits of Flask-SQLAlchemy's Pagination we use)."""
+
+    def __init__(self, items, has_next, has_prev, next_cursor, prev_cursor, total=None, total_capped=False):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_capped = total_capped
+
+
+def capped_count(query, cap: int = COUNT_CAP):
+    """
+    Count rows of a query, but stop at `cap`.
+
+    Returns (count, capped). The cost is bounded by the cap rather than by
+    the size of the table, so it is the same on page 1 and page 5000.
+    """
+    entity = query.column_descriptions[0]["entity"]
+    limited = query.order_by(None).with_entities(inspect(entity).primary_key[0]).limit(cap + 1).subquery()
+    count = db.session.execute(select(func.count()).select_from(limited)).scalar()
+    return min(count, cap), count > cap
+
+
+def keyset_paginate(query, keys, cursor=None, per_page=6, with_count=False, page=1):
+    """
+    Paginate a query (recipes, comments, ...) by keyset.
+
+    keys:   list of (column_expression, descending) making a unique sort order,
+            normally [(Recipe.date_posted, True), (Recipe.id, True)].
+    cursor: token from a previous page's next_cursor/prev_cursor, or None for page 1.
+    with_count: also return a capped total (see capped_count).
+    page:   legacy ?page=N number, honoured with an OFFSET only when there is
+            no cursor so old bookmarks keep working; links from that page on
+            are cursors again.
+
+    An invalid cursor is treated like no cursor (first page).
+    """
+    values, direction = None, "next"
+    if cursor:
+        try:
+            values, direction = decode_cursor(cursor)
+            values = cursor_values(keys, values)
+        except CursorError:
+            values, direction = None, "next"
+
+    total, total_capped = (None, False)
+    if with_count:
+        total, total_capped = capped_count(query)
+
+    backwards = direction == "prev"
+    page_query = query
+    offset = 0
+    if values is not None:
+        page_query = page_query.filter(_after(keys, values, reverse=backwards))
+    elif page and page > 1:
+        offset = (page - 1) * per_page
+
+    order = []
+    for col, desc in keys:
+        order.append(col.desc() if desc != backwards else col.asc())
+
+    labels = [col.label(f"_key{i}") for i, (col, _) in enumerate(keys)]
+    rows = page_query.order_by(None).order_by(*order).add_columns(*labels).limit(per_page + 1).offset(offset).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    row_keys = [list(row[1:]) for row in rows]
+
+    if backwards:
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = values is not None or offset > 0, more
+
+    next_cursor = encode_cursor(row_keys[-1], "next") if has_next and rows else None
+    prev_cursor = encode_cursor(row_keys[0], "prev") if has_prev and rows else None
+
+    return KeysetPage(items, has_next, has_prev, next_cursor, prev_cursor, total, total_capped)
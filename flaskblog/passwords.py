@@ -0,0 +1,135 @@
+"""
+passwords.py
+Password hashing off the request threads, with back-pressure.
+
+bcrypt is deliberately slow (a few hundred milliseconds of CPU per call at
+the default cost). Run inline, a burst of logins at the start of a period,
+or a credential-stuffing run, ties up every request worker and starves
+all other pages. Instead:
+
+- hash_password() and check_password() run bcrypt in a bounded process
+  pool: PASSWORD_HASH_WORKERS processes, with at most
+  PASSWORD_HASH_QUEUE_MAX calls waiting. When it is full they raise
+  PasswordServiceBusy immediately, which is answered as a 429 with a
+  Retry-After header rather than piling up requests.
+- BCRYPT_LOG_ROUNDS sets the cost of new hashes. needs_rehash() reports
+  hashes made with another cost so login can upgrade them transparently.
+
+Login throttling (flaskblog.throttle) runs before any of this, so rejected
+attempts never reach bcrypt. PASSWORD_HASH_WORKERS=0 hashes inline (CLI
+scripts, tests).
+"""
+
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import bcrypt
+from werkzeug.exceptions import TooManyRequests
+
+# bcrypt only looks at the first 72 bytes; newer releases raise instead of truncating.
+MAX_PASSWORD_BYTES = 72
+
+
+class PasswordServiceBusy(TooManyRequests):
+    """The hashing pool is saturated; try again shortly (answered as a 429)."""
+
+    def __init__(self):
+        super().__init__("Too many sign-ins are being processed. Please try again shortly.", retry_after=2)
+
+
+class HashPool:
+    """Bounded process pool: at most `workers` hashes run and `max_queue` wait."""
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.workers = 2
+        self.max_queue = 16
+        self.timeout = 10
+        atexit.register(self.shutdown)
+
+    def configure(self, workers, max_queue, timeout):
+        self.shutdown()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+    def _ensure_started(self):
+        # Started lazily so each forked gunicorn worker gets its own processes.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+
+    def run(self, fn, *args):
+        """Run fn(*args) in a worker process and return its result, or raise PasswordServiceBusy."""
+        if self.workers <= 0:
+            return fn(*args)
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            raise PasswordServiceBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is freed when the job finishes, even if this caller gave up waiting.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout as exc:
+            future.cancel()
+            raise PasswordServiceBusy() from exc
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+pool = HashPool()
+rounds = 12
+
+
+def _encode(password):
+    return password.encode("utf-8")[:MAX_PASSWORD_BYTES]
+
+
+def hash_password(password):
+    """bcrypt hash (str) of password at the configured cost."""
+    # The salt is cheap to make here; only the hashing itself goes to the pool.
+    hashed = pool.run(bcrypt.hashpw, _encode(password), bcrypt.gensalt(rounds))
+    return hashed.decode("utf-8")
+
+
+def check_password(hashed, password):
+    """True if password matches the stored hash."""
+    try:
+        return pool.run(bcrypt.checkpw, _encode(password), hashed.encode("utf-8"))
+    except ValueError:
+        # Not a bcrypt hash.
+        return False
+
+
+def hash_cost(hashed):
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None."""
+    parts = hashed.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+def needs_rehash(hashed):
+    return hash_cost(hashed) != rounds
+
+
+def init_app(app):
+    global rounds
+    rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+    pool.configure(
+        app.config.get("PASSWORD_HASH_WORKERS", 2),
+        app.config.get("PASSWORD_HASH_QUEUE_MAX", 16),
+        app.config.get("PASSWORD_HASH_TIMEOUT", 10),
+    )
@@ -0,0 +1,238 @@
+"""
+popularity.py
+Recipe view counts and a "popular right now" ranking, without a write per page view.
+
+recipe_detail calls record_view(). Nothing is written during the request:
+
+- a session counts once per recipe (the last VIEW_DEDUP_SIZE recipes it
+  viewed are remembered in the session cookie), so reloads and back/forward
+  navigation are not views
+- hits are added to an in-memory tally in each worker process
+- a background thread writes the tally to recipe_stats every
+  VIEW_FLUSH_INTERVAL seconds, or sooner once VIEW_FLUSH_SIZE hits are
+  waiting, as one transaction of batched statements
+
+Tallies are also written when the worker exits normally (gunicorn restarts,
+max_requests recycling), so a worker that is killed loses at most one
+interval's worth of views. A failed write puts the tally back for the next
+attempt.
+
+Popularity is the number of views with each one halving in weight every
+POPULARITY_HALF_LIFE_HOURS. Rather than decaying every row on a timer, a
+view is stored with the weight 2^(half-lives since the current epoch), so
+older views shrink relative to newer ones automatically and writes are plain
+additions (atomic across workers). Every EPOCH_HALF_LIVES half-lives a new
+epoch starts; a row carried over from the previous epoch is scaled down
+when it is next written, and anything older is worth nothing.
+
+popular_ids() serves the ranking (cached for POPULAR_CACHE_TTL seconds);
+the home page carousel falls back to it when too few recipes are tagged
+"featured" (POPULAR_CAROUSEL_FALLBACK).
+"""
+
+import atexit
+import threading
+import time
+from collections import Counter
+
+from flask import request, session
+from sqlalchemy.exc import IntegrityError
+
+from flaskblog import db
+from flaskblog.cache import cache
+from flaskblog.models import RECIPE_CARD_OPTIONS, Recipe, RecipeStats, utcnow
+
+SESSION_KEY = "_viewed"
+
+# Half-lives per epoch: scores stay below 2^64 times the view count.
+EPOCH_HALF_LIVES = 64
+POPULAR_CACHE_TTL = 60
+
+_half_life = 72 * 3600.0
+
+
+def _position(now=None):
+    """(epoch, half-lives elapsed within it) at a point in time."""
+    elapsed = (now or time.time()) / _half_life
+    epoch = int(elapsed // EPOCH_HALF_LIVES)
+    return epoch, elapsed - epoch * EPOCH_HALF_LIVES
+
+
+def _write(counts):
+    """Add {recipe_id: views} to recipe_stats in one transaction (deleted recipes are skipped)."""
+    epoch, offset = _position()
+    weight = 2.0 ** offset
+    now = utcnow()
+    table = RecipeStats.__table__
+    ids = list(counts)
+
+    existing = set(db.session.execute(db.select(table.c.recipe_id).where(table.c.recipe_id.in_(ids))).scalars())
+    updates = [{"rid": rid, "n": counts[rid], "inc": counts[rid] * weight} for rid in ids if rid in existing]
+    inserts = [{"rid": rid, "n": counts[rid], "inc": counts[rid] * weight} for rid in ids if rid not in existing]
+
+    if updates:
+        carried = db.case(
+            (table.c.score_epoch == epoch, table.c.score),
+            (table.c.score_epoch == epoch - 1, table.c.score * 2.0 ** -EPOCH_HALF_LIVES),
+            else_=0.0,
+        )
+        db.session.execute(
+            table.update()
+            .where(table.c.recipe_id == db.bindparam("rid"))
+            .values(
+                views=table.c.views + db.bindparam("n"),
+                score=carried + db.bindparam("inc"),
+                score_epoch=epoch,
+                last_viewed=now,
+            ),
+            updates,
+        )
+    if inserts:
+        # INSERT ... SELECT from recipe, so a recipe deleted since its views were counted is skipped.
+        db.session.execute(
+            table.insert().from_select(
+                ["recipe_id", "views", "score", "score_epoch", "last_viewed"],
+                db.select(
+                    Recipe.id,
+                    db.bindparam("n", type_=db.Integer),
+                    db.bindparam("inc", type_=db.Float),
+                    db.literal(epoch),
+                    db.literal(now),
+                ).where(Recipe.id == db.bindparam("rid")),
+            ),
+            inserts,
+        )
+    db.session.commit()
+
+
+class ViewBuffer:
+    """Per-process tally of recipe views, written to the database in batches."""
+
+    def __init__(self):
+        self.app = None
+        self.interval = 30.0
+        self.max_pending = 500
+        self._counts = Counter()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def configure(self, app, interval, max_pending):
+        self.app = app
+        self.interval = interval
+        self.max_pending = max_pending
+
+    def _ensure_started(self):
+        # Started lazily so each forked gunicorn worker gets its own thread.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="view-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def add(self, recipe_id):
+        with self._lock:
+            self._counts[recipe_id] += 1
+            self._pending += 1
+            full = self._pending >= self.max_pending
+        if self.interval <= 0:
+            self.flush()
+            return
+        self._ensure_started()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write the waiting views now. Returns how many were written."""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._pending = 0
+        if not counts or self.app is None:
+            return 0
+        try:
+            with self.app.app_context():
+                try:
+                    _write(counts)
+                except IntegrityError:
+                    # Another worker inserted one of the new rows first; they are updates now.
+                    db.session.rollback()
+                    _write(counts)
+        except Exception:
+            # Keep the views for the next attempt (the tally is bounded by the number of recipes).
+            with self._lock:
+                self._counts.update(counts)
+                self._pending += sum(counts.values())
+            self.app.logger.exception("Could not write %d recipe views", sum(counts.values()))
+            return 0
+        return sum(counts.values())
+
+
+buffer = ViewBuffer()
+_dedup_size = 50
+
+
+def record_view(recipe_id):
+    """Count a GET of a recipe page, once per session."""
+    if request.method != "GET":
+        return
+    seen = session.get(SESSION_KEY, [])
+    if recipe_id in seen:
+        return
+    session[SESSION_KEY] = (seen + [recipe_id])[-_dedup_size:]
+    buffer.add(recipe_id)
+
+
+# --- Ranking ---
+
+def ranking(limit):
+    """[(recipe_id, decayed views)] of the most popular recipes, best first."""
+    epoch, offset = _position()
+    table = RecipeStats.__table__
+    ranked = []
+    # Each epoch's rows come from the (score_epoch, score) index in order; the two lists are then merged.
+    for row_epoch, scale in ((epoch, 2.0 ** -offset), (epoch - 1, 2.0 ** -(offset + EPOCH_HALF_LIVES))):
+        rows = db.session.execute(
+            db.select(table.c.recipe_id, table.c.score)
+            .where(table.c.score_epoch == row_epoch)
+            .order_by(table.c.score.desc())
+            .limit(limit)
+        )
+        ranked.extend((recipe_id, score * scale) for recipe_id, score in rows)
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked[:limit]
+
+
+def popular_ids(limit):
+    """Ids of the most popular recipes, best first (cached briefly; views arrive in batches anyway)."""
+    return cache.get_or_set(
+        f"popular:{limit}",
+        lambda: [recipe_id for recipe_id, _ in ranking(limit)],
+        depends=("recipes",),
+        ttl=POPULAR_CACHE_TTL,
+    )
+
+
+def popular_recipes(limit, exclude=()):
+    """Card-ready Recipe objects of the most popular recipes, leaving out the ids in exclude."""
+    ids = [recipe_id for recipe_id in popular_ids(limit + len(exclude)) if recipe_id not in exclude][:limit]
+    if not ids:
+        return []
+    by_id = {r.id: r for r in Recipe.query.options(*RECIPE_CARD_OPTIONS[:-1]).filter(Recipe.id.in_(ids))}
+    return [by_id[recipe_id] for recipe_id in ids if recipe_id in by_id]
+
+
+def init_app(app):
+    global _half_life, _dedup_size
+    _half_life = app.config.get("POPULARITY_HALF_LIFE_HOURS", 72) * 3600.0
+    _dedup_size = app.config.get("VIEW_DEDUP_SIZE", 50)
+    buffer.configure(app, app.config.get("VIEW_FLUSH_INTERVAL", 30), app.config.get("VIEW_FLUSH_SIZE", 500))
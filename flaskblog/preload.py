@@ -0,0 +1,76 @@
+"""
+preload.py
+Start-up work done once per server instead of once per worker.
+
+gunicorn.conf.py runs gunicorn with preload_app: the master process calls
+create_app() (importing every module and building the URL map), then
+warm() compiles every template and the URL matcher, loads Pillow
+(imported lazily elsewhere) and requests the busiest pages (WARM_PATHS)
+once, which configures the ORM and compiles their SQL into the engines'
+statement caches, all before any worker is forked. Workers inherit all of
+that copy-on-write, so a new or recycled worker serves its first request
+almost as fast as its hundredth.
+
+Compiled templates are also written to a Jinja bytecode cache
+(JINJA_BYTECODE_CACHE, in instance/jinja_cache unless JINJA_CACHE_DIR is
+set), so processes that start cold (the flask CLI, seed scripts, the
+development server, workers without preloading) load templates without
+parsing them. Entries are keyed by the template source, so edited templates
+are recompiled.
+
+after_fork() runs in each worker. Connections the master opened while
+starting (database pools, the shared SQLite page cache and login-throttle
+counters) must not be used by two processes, so the worker drops its
+inherited copies and opens its own on first use. Background threads and process pools already start
+lazily in each worker (passwords, images, popularity, suggest).
+"""
+
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+from flaskblog import db, throttle
+from flaskblog.cache import cache
+
+# Pages requested once by warm(): their queries are the ones most workers run first.
+WARM_PATHS = ("/", "/categories", "/recipes")
+
+
+def warm(app):
+    """Compile templates, SQL and the URL matcher, and load Pillow. Returns the number of templates."""
+    from PIL import Image
+
+    # flaskblog.images imports Pillow on first use; init() loads its format plugins.
+    Image.init()
+    app.url_map.update()
+    names = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in names:
+        app.jinja_env.get_template(name)
+
+    client = app.test_client()
+    for path in WARM_PATHS:
+        status = client.get(path).status_code
+        if status != 200:
+            app.logger.warning("Warm-up request to %s returned %d", path, status)
+    # Close this process's connections; the compiled statements stay with the engines.
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    return len(names)
+
+
+def after_fork(app):
+    """Drop connections inherited from the parent process (call first thing in a forked worker)."""
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: the parent's connections are left alone, only forgotten here.
+            engine.dispose(close=False)
+    cache.after_fork()
+    throttle.after_fork()
+
+
+def init_app(app):
+    if app.config.get("JINJA_BYTECODE_CACHE"):
+        directory = app.config.get("JINJA_CACHE_DIR") or os.path.join(app.instance_path, "jinja_cache")
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
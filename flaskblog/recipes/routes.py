@@ -0,0 +1,511 @@
+from flask import Blueprint, render_template, request, url_for, flash, redirect, abort, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload, joinedload
+
+# Import the database session so we can commit changes.
+from flaskblog import db
+
+# Full-text search index kept in sync with recipe writes.
+from flaskblog import search as recipe_search
+
+# Normalised ingredient index (multi-ingredient filters + pantry search).
+from flaskblog import ingredients as ingredient_index
+
+# Materialised facet counts, adjusted on every recipe write.
+from flaskblog import facets
+
+# Comment writes keep recipe.comment_count in step; comments are read a page at a time.
+from flaskblog import comments as recipe_comments
+
+# Precomputed "related recipes" panel, refreshed on every recipe write.
+from flaskblog import related
+
+# Page views, tallied in memory and written in batches (popular recipes ranking).
+from flaskblog import popularity
+
+# Search-as-you-type suggestions from an in-memory prefix index.
+from flaskblog import suggest
+
+# Set-based deletes shared with the admin moderation queue.
+from flaskblog import moderation
+
+# Import models used in recipe CRUD, filtering, and comments.
+from flaskblog.models import Recipe, Tag, RECIPE_CARD_OPTIONS
+
+# Import WTForms used for creating/editing recipes and adding comments.
+from flaskblog.recipes.forms import RecipeForm, CommentForm
+
+# Utility function for safely saving and resizing uploaded images.
+from flaskblog.utils import save_image
+
+# Reference-counted image store (releases pictures that are no longer used).
+from flaskblog import image_store
+
+# Keyset pagination so deep pages cost the same as page 1.
+from flaskblog.pagination import keyset_paginate, NEWEST_FIRST
+
+# Page/fragment cache, invalidated below whenever recipes or tags are written.
+from flaskblog.cache import cache, cached_page
+
+# Create a Blueprint to logically group all recipe-related routes.
+recipes = Blueprint("recipes", __name__)
+
+
+def _parse_tags(tag_string: str):
+    """
+    Convert a comma-separated tag string into a clean list of unique tag names.
+
+    This function:
+    - Normalises case (lowercase)
+    - Trims whitespace
+    - Enforces a maximum length
+    - Preserves user-entered order
+    """
+    # If no tags were provided, return an empty list early.
+    if not tag_string:
+        return []
+
+    # Split by commas and normalise individual tag strings.
+    raw = [t.strip().lower() for t in tag_string.split(",")]
+
+    # Filter out empty or excessively long tag names.
+    names = []
+    for t in raw:
+        if t and len(t) <= 40:
+            names.append(t)
+
+    # Remove duplicates while preserving original order.
+    seen = set()
+    out = []
+    for n in names:
+        if n not in seen:
+            out.append(n)
+            seen.add(n)
+
+    return out
+
+
+def read_filters(args):
+    """The recipe_list filters from query-string args (shared with the JSON API)."""
+    return dict(
+        search=args.get("search", "", type=str).strip(),
+        cuisine=args.get("cuisine", "", type=str).strip(),
+        difficulty=args.get("difficulty", "", type=str).strip(),
+        max_time=args.get("max_time", "", type=str).strip(),
+        ingredient=args.get("ingredient", "", type=str).strip(),
+        tag=args.get("tag", "", type=str).strip().lower(),
+    )
+
+
+def apply_filters(query, filters, skip=None):
+    """
+    Apply the recipe_list filters to a Recipe query.
+
+    Returns (query, ranked) where ranked is the FTS relevance subquery when a
+    full-text search is active (None otherwise). `skip` leaves out one facet
+    filter ("cuisine", "difficulty", "cook_time" or "tag"), which is how the
+    filter dropdown counts are computed.
+    """
+    search = filters["search"]
+    ranked = None
+
+    if search and recipe_search.is_enabled():
+        # FTS5 index: ranked by relevance, supports "phrases" and prefix* terms.
+        match = recipe_search.build_match_query(search)
+        if match:
+            ranked = recipe_search.match_subquery(match)
+            query = query.join(ranked, ranked.c.recipe_id == Recipe.id)
+    elif search:
+        query = query.filter(
+            (Recipe.title.ilike(f"%{search}%")) |
+            (Recipe.summary.ilike(f"%{search}%"))
+        )
+
+    if filters["cuisine"] and skip != facets.CUISINE:
+        query = query.filter(Recipe.cuisine == filters["cuisine"])
+
+    if filters["difficulty"] and skip != facets.DIFFICULTY:
+        query = query.filter(Recipe.difficulty == filters["difficulty"])
+
+    if filters["max_time"].isdigit() and skip != facets.COOK_TIME:
+        query = query.filter(Recipe.cook_time_mins <= int(filters["max_time"]))
+
+    if filters["ingredient"]:
+        # e.g. "chicken, rice | noodles, -peanut" (AND with commas, OR with |, NOT with -)
+        query = ingredient_index.filter_by_ingredients(query, filters["ingredient"])
+
+    if filters["tag"] and skip != facets.TAG:
+        query = query.join(Recipe.tags).filter(Tag.name == filters["tag"])
+
+    return query, ranked
+
+
+def _filtered_facet_counts(filters):
+    """
+    Counts shown next to each filter option for the current selection.
+
+    Computed once per filter combination and cached until the next recipe/tag
+    write, so repeat views never re-run the aggregates.
+    """
+    key = "facets:" + "&".join(f"{k}={v}" for k, v in sorted(filters.items()))
+    return cache.get_or_set(
+        key,
+        lambda: facets.filtered_counts(lambda skip: apply_filters(Recipe.query, filters, skip)[0]),
+        depends=("recipes", "tags"),
+    )
+
+
+@recipes.route("/recipes")
+@cached_page(depends=("recipes", "tags", "comments"))
+def recipe_list():
+    """Paginated, filterable recipe list with facet counts; card images come from the image_set() helper."""
+
+    # --- Read query params ---
+    cursor = request.args.get("cursor", "", type=str)
+    page = request.args.get("page", 1, type=int)
+    filters = read_filters(request.args)
+
+    # --- Build dynamic DB query (card columns only, tags batch-loaded) ---
+    query, ranked = apply_filters(Recipe.query.options(*RECIPE_CARD_OPTIONS), filters)
+
+    # --- Order: best matches first when searching, otherwise newest first ---
+    keys = NEWEST_FIRST
+    if ranked is not None:
+        keys = [(ranked.c.rank, False)] + NEWEST_FIRST
+
+    # --- Paginate (cursor-based; total is counted up to a cap) ---
+    recipes_paginated = keyset_paginate(query, keys, cursor=cursor, page=page, per_page=6, with_count=True)
+
+    # --- Data for filter dropdowns, with counts (cached until a recipe/tag write) ---
+    all_counts = cache.get_or_set("facets:all", facets.all_counts, depends=("recipes", "tags"))
+    counts = _filtered_facet_counts(filters) if any(filters.values()) else all_counts
+    cuisines = sorted(all_counts[facets.CUISINE])
+    difficulties = ["Easy", "Medium", "Hard"]
+    tags = cache.get_or_set(
+        "facets:tags",
+        lambda: [t.name for t in Tag.query.order_by(Tag.name.asc()).all()],
+        depends=("tags",),
+    )
+
+    # --- Render ---
+    return render_template(
+        "recipes/list.html",
+        title="Recipes",
+        recipes=recipes_paginated,
+        cuisines=cuisines,
+        difficulties=difficulties,
+        tags=tags,
+        time_options=facets.COOK_TIME_BUCKETS,
+        counts=counts,
+        time_counts=facets.cumulative_time_counts(counts[facets.COOK_TIME]),
+        filters=filters
+    )
+
+@recipes.route("/recipes/suggest")
+def recipe_suggest():
+    """
+    Suggestions for the search box as the user types (JSON).
+
+    Served from each worker's in-memory prefix index (flaskblog.suggest):
+    matching tags, cuisines and ingredients first, then recipe titles.
+    """
+    links = {
+        "recipe": lambda value: url_for("recipes.recipe_detail", recipe_id=value),
+        facets.TAG: lambda value: url_for("recipes.recipe_list", tag=value),
+        facets.CUISINE: lambda value: url_for("recipes.recipe_list", cuisine=value),
+        suggest.INGREDIENT: lambda value: url_for("recipes.recipe_list", ingredient=value),
+    }
+    suggestions = [
+        {"kind": kind, "label": label, "url": links[kind](value), "recipes": count}
+        for kind, label, value, count in suggest.suggest(request.args.get("q", "", type=str))
+    ]
+    response = jsonify(suggestions=suggestions)
+    # Same answer for everyone; lets the browser reuse it while the user backspaces.
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
+
+@recipes.route("/recipes/pantry")
+def pantry():
+    """
+    "What can I cook?" search.
+
+    Takes a comma-separated pantry list and ranks recipes by how much of their
+    ingredient list the pantry covers (salt, pepper, oil and water are assumed).
+    """
+    page = max(request.args.get("page", 1, type=int), 1)
+    items = request.args.get("items", "", type=str).strip()
+    terms = ingredient_index.normalize_terms(items.split(","))
+    per_page = 12
+
+    results = []
+    has_next = False
+    if terms:
+        # Fetch one extra row to know whether there is a next page (no COUNT query needed).
+        rows = db.session.execute(
+            ingredient_index.pantry_query(terms)
+            .options(*RECIPE_CARD_OPTIONS[:-1], selectinload(Recipe.parsed_ingredients))
+            .limit(per_page + 1)
+            .offset((page - 1) * per_page)
+        ).all()
+        has_next = len(rows) > per_page
+        for r, matched, total in rows[:per_page]:
+            results.append(dict(
+                recipe=r,
+                matched=matched,
+                total=total,
+                missing=ingredient_index.missing_ingredients(r, terms),
+            ))
+
+    return render_template(
+        "recipes/pantry.html",
+        title="What can I cook?",
+        items=items,
+        results=results,
+        page=page,
+        has_next=has_next,
+    )
+
+
+@recipes.route("/recipe/<int:recipe_id>", methods=["GET", "POST"])
+def recipe_detail(recipe_id):
+    """
+    Display a single recipe and handle comment submission.
+
+    Comments are only accepted from authenticated users. Only the newest
+    page of comments is rendered here; the rest load from comment_page.
+    """
+    # Fetch the recipe (with everything the page renders) or return a 404 if it does not exist.
+    recipe = (
+        Recipe.query
+        .options(
+            joinedload(Recipe.author),
+            selectinload(Recipe.tags),
+        )
+        .get_or_404(recipe_id)
+    )
+
+    # Initialise the comment form.
+    form = CommentForm()
+
+    # Handle comment submission.
+    if form.validate_on_submit():
+        # Prevent anonymous users from posting comments.
+        if not current_user.is_authenticated:
+            flash("Please log in to comment.", "info")
+            return redirect(
+                url_for(
+                    "users.login",
+                    next=url_for("recipes.recipe_detail", recipe_id=recipe_id)
+                )
+            )
+
+        # Create and persist the new comment (and bump the recipe's comment count).
+        recipe_comments.add_comment(recipe.id, current_user.id, form.body.data)
+        db.session.commit()
+        cache.invalidate("comments")
+
+        flash("Comment added.", "success")
+        return redirect(url_for("recipes.recipe_detail", recipe_id=recipe_id))
+
+    # Count the view (buffered; no database write in this request).
+    popularity.record_view(recipe.id)
+
+    # Render the recipe detail page with the first page of comments and the comment form.
+    return render_template(
+        "recipes/detail.html",
+        title=recipe.title,
+        recipe=recipe,
+        comments=recipe_comments.comments_page(recipe.id, request.args.get("comments", type=str)),
+        related=related.for_recipe(recipe.id),
+        form=form
+    )
+
+
+@recipes.route("/recipe/<int:recipe_id>/comments")
+def comment_page(recipe_id):
+    """
+    Next page of a recipe's comments as an HTML fragment (infinite scroll).
+
+    The detail page's "Load more" button fetches this with the previous
+    page's cursor and appends the result.
+    """
+    if not db.session.execute(db.select(Recipe.id).where(Recipe.id == recipe_id)).scalar():
+        abort(404)
+    cursor = request.args.get("cursor", "", type=str)
+    return render_template(
+        "recipes/_comments.html",
+        recipe_id=recipe_id,
+        comments=recipe_comments.comments_page(recipe_id, cursor),
+    )
+
+
+@recipes.route("/recipe/new", methods=["GET", "POST"])
+@login_required
+def recipe_new():
+    """
+    Create a new recipe.
+
+    Only authenticated users may submit recipes.
+    """
+    form = RecipeForm()
+
+    if form.validate_on_submit():
+        # Default image ensures the UI works even without an upload.
+        image_file = "default_recipe.jpg"
+
+        # Save and resize uploaded image if provided.
+        if form.picture.data:
+            image_file = save_image(
+                form.picture.data,
+                folder="recipe_pics",
+                output_size=(1200, 1200)
+            )
+
+        # Create the recipe object using form data.
+        recipe = Recipe(
+            title=form.title.data,
+            summary=form.summary.data,
+            cuisine=form.cuisine.data or None,
+            difficulty=form.difficulty.data or None,
+            cook_time_mins=form.cook_time_mins.data,
+            ingredients=form.ingredients.data.strip(),
+            instructions=form.instructions.data.strip(),
+            video_url=form.video_url.data or None,
+            image_file=image_file,
+            user_id=current_user.id
+        )
+
+        # Parse and attach tags using a helper function.
+        tag_names = _parse_tags(form.tags.data)
+        for name in tag_names:
+            t = Tag.query.filter_by(name=name).first()
+            if not t:
+                t = Tag(name=name)
+            recipe.tags.append(t)
+
+        # Link parsed ingredients, flush to get an id, index for search and
+        # facet counts, then commit everything together.
+        ingredient_index.sync_recipe_ingredients(recipe)
+        db.session.add(recipe)
+        db.session.flush()
+        recipe_search.index_recipe(recipe)
+        facets.apply_change(set(), facets.recipe_facets(recipe))
+        related.refresh([recipe.id])
+        db.session.commit()
+        cache.invalidate("recipes", "tags")
+
+        flash("Recipe published!", "success")
+        return redirect(url_for("recipes.recipe_detail", recipe_id=recipe.id))
+
+    # Render the recipe creation form.
+    return render_template(
+        "recipes/create_edit.html",
+        title="New Recipe",
+        form=form,
+        legend="New Recipe"
+    )
+
+
+@recipes.route("/recipe/<int:recipe_id>/update", methods=["GET", "POST"])
+@login_required
+def recipe_update(recipe_id):
+    """
+    Update an existing recipe.
+
+    Only the author or an admin user may edit a recipe.
+    """
+    recipe = Recipe.query.get_or_404(recipe_id)
+
+    # Enforce ownership or admin permissions.
+    if recipe.user_id != current_user.id and not current_user.is_admin:
+        abort(403)
+
+    form = RecipeForm()
+
+    if form.validate_on_submit():
+        # Remember which facet counts the recipe contributed to before editing.
+        facets_before = facets.recipe_facets(recipe)
+
+        # Replace image only if a new one is uploaded, releasing the old one.
+        if form.picture.data:
+            old_image = recipe.image_file
+            recipe.image_file = save_image(
+                form.picture.data,
+                folder="recipe_pics",
+                output_size=(1200, 1200)
+            )
+            image_store.release("recipe_pics", old_image)
+
+        # Update recipe fields from the form.
+        recipe.title = form.title.data
+        recipe.summary = form.summary.data
+        recipe.cuisine = form.cuisine.data or None
+        recipe.difficulty = form.difficulty.data or None
+        recipe.cook_time_mins = form.cook_time_mins.data
+        recipe.ingredients = form.ingredients.data.strip()
+        recipe.instructions = form.instructions.data.strip()
+        recipe.video_url = form.video_url.data or None
+
+        # Reset and re-attach tags to reflect changes.
+        recipe.tags.clear()
+        tag_names = _parse_tags(form.tags.data)
+        for name in tag_names:
+            t = Tag.query.filter_by(name=name).first()
+            if not t:
+                t = Tag(name=name)
+            recipe.tags.append(t)
+
+        ingredient_index.sync_recipe_ingredients(recipe)
+        recipe_search.index_recipe(recipe)
+        facets.apply_change(facets_before, facets.recipe_facets(recipe))
+        related.refresh([recipe.id])
+        db.session.commit()
+        image_store.purge_orphans()
+        cache.invalidate("recipes", "tags")
+        flash("Recipe updated.", "success")
+        return redirect(url_for("recipes.recipe_detail", recipe_id=recipe.id))
+
+    # Pre-fill the form fields when loading the edit page.
+    elif request.method == "GET":
+        form.title.data = recipe.title
+        form.summary.data = recipe.summary
+        form.cuisine.data = recipe.cuisine
+        form.difficulty.data = recipe.difficulty
+        form.cook_time_mins.data = recipe.cook_time_mins
+        form.ingredients.data = recipe.ingredients
+        form.instructions.data = recipe.instructions
+        form.video_url.data = recipe.video_url
+        form.tags.data = ", ".join([t.name for t in recipe.tags])
+
+    return render_template(
+        "recipes/create_edit.html",
+        title="Update Recipe",
+        form=form,
+        legend="Update Recipe"
+    )
+
+
+@recipes.route("/recipe/<int:recipe_id>/delete", methods=["POST"])
+@login_required
+def recipe_delete(recipe_id):
+    """
+    Delete a recipe.
+
+    Only the author or an admin user may delete content.
+    """
+    recipe = Recipe.query.get_or_404(recipe_id)
+
+    # Enforce permission check before deletion.
+    if recipe.user_id != current_user.id and not current_user.is_admin:
+        abort(403)
+
+    # Remove the recipe: search entry, facet counts, image reference and counters
+    # are adjusted, and the database cascades the delete to comments and links.
+    moderation.delete_recipes(db.select(Recipe.id).where(Recipe.id == recipe.id))
+    db.session.commit()
+    image_store.purge_orphans()
+    cache.invalidate("recipes", "comments")
+
+    flash("Recipe deleted.", "info")
+    return redirect(url_for("recipes.recipe_list"))
@@ -0,0 +1,345 @@
+"""
+related.py
+Precomputed "you might also like" recipes.
+
+Each recipe is a sparse vector of features: its tags, parsed ingredients
+(the recipe_ingredients index built from Recipe.ingredients), cuisine,
+difficulty and cook-time bucket. A feature weighs KIND_WEIGHTS[kind] times
+its inverse document frequency, so sharing "saffron" counts for far more
+than sharing "Easy", and vectors are L2-normalised so similarity is their
+cosine.
+
+The K best neighbours of every recipe are stored in related_recipe (K small
+rows per recipe) and the detail page reads them with one indexed query: no
+similarity maths happens while serving a page.
+
+Neighbours are found like a sparse matrix product done through an inverted
+index: a recipe's candidates are the recipes sharing at least one feature
+with it, then each candidate is scored exactly. For very common features
+(e.g. an ingredient in every other recipe) only CANDIDATES_PER_FEATURE
+recipes are taken as candidates, which keeps the work per recipe bounded.
+
+Kept up to date incrementally:
+- refresh() recomputes a new or edited recipe's list and offers it to the
+  lists of the recipes it resembles and of those that listed it; a list it
+  drops out of is refilled (recipe_new, recipe_update)
+- when recipes are deleted, their rows go with them (ON DELETE CASCADE)
+  and the lists that pointed at them are refilled (flaskblog.moderation)
+
+Weights drift as the catalogue grows; `flask related-rebuild` recomputes
+everything (`flask db-upgrade` runs it once on a database with recipes but
+no neighbours, and it runs after bulk imports).
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from flaskblog import counters, db, facets
+from flaskblog.models import (
+    RECIPE_CARD_OPTIONS, FacetCount, Recipe, RelatedRecipe, recipe_ingredients, recipe_tags,
+)
+
+# Neighbours kept per recipe (and shown on the detail page).
+K = 6
+# Pairs scoring lower than this are not worth suggesting.
+MIN_SCORE = 0.05
+CANDIDATES_PER_FEATURE = 100
+# Lists refilled in the same request after a delete; any beyond wait for a rebuild.
+REFILL_LIMIT = 50
+
+INGREDIENT = "ingredient"
+KIND_WEIGHTS = {
+    facets.TAG: 1.0,
+    INGREDIENT: 1.0,
+    facets.CUISINE: 0.7,
+    facets.DIFFICULTY: 0.3,
+    facets.COOK_TIME: 0.3,
+}
+
+
+# --- Vectors ---
+
+def _features(recipe_ids=None):
+    """{recipe_id: set of (kind, value)} for the given recipes (every recipe when None)."""
+    columns = db.select(Recipe.id, Recipe.cuisine, Recipe.difficulty, Recipe.cook_time_mins)
+    tags = db.select(recipe_tags.c.recipe_id, recipe_tags.c.tag_id)
+    ingredients = db.select(recipe_ingredients.c.recipe_id, recipe_ingredients.c.ingredient_id)
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        columns = columns.where(Recipe.id.in_(recipe_ids))
+        tags = tags.where(recipe_tags.c.recipe_id.in_(recipe_ids))
+        ingredients = ingredients.where(recipe_ingredients.c.recipe_id.in_(recipe_ids))
+
+    features = {}
+    for recipe_id, cuisine, difficulty, cook_time in db.session.execute(columns):
+        own = features[recipe_id] = set()
+        if cuisine:
+            own.add((facets.CUISINE, cuisine))
+        if difficulty:
+            own.add((facets.DIFFICULTY, difficulty))
+        bucket = facets.cook_time_bucket(cook_time)
+        if bucket:
+            own.add((facets.COOK_TIME, bucket))
+    for kind, query in ((facets.TAG, tags), (INGREDIENT, ingredients)):
+        for recipe_id, value in db.session.execute(query):
+            if recipe_id in features:
+                features[recipe_id].add((kind, value))
+    return features
+
+
+def _frequencies(features):
+    """{feature: number of recipes that have it}, from the link tables and facet counts."""
+    wanted = defaultdict(set)
+    for kind, value in features:
+        wanted[kind].add(value)
+    df = {}
+    for kind, table, column in ((facets.TAG, recipe_tags, "tag_id"), (INGREDIENT, recipe_ingredients, "ingredient_id")):
+        if wanted[kind]:
+            col = table.c[column]
+            for value, count in db.session.execute(
+                db.select(col, func.count()).where(col.in_(wanted[kind])).group_by(col)
+            ):
+                df[(kind, value)] = count
+    other = [kind for kind in (facets.CUISINE, facets.DIFFICULTY, facets.COOK_TIME) if wanted[kind]]
+    if other:
+        for kind, value, count in db.session.execute(
+            db.select(FacetCount.facet, FacetCount.value, FacetCount.count).where(FacetCount.facet.in_(other))
+        ):
+            if value in wanted[kind]:
+                df[(kind, value)] = count
+    return df
+
+
+def _vector(features, df, total):
+    weights = {f: KIND_WEIGHTS[f[0]] * math.log(1 + total / df[f]) for f in features if df.get(f)}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {f: w / norm for f, w in weights.items()}
+
+
+def _cosine(a, b):
+    if len(b) < len(a):
+        a, b = b, a
+    return sum(w * b.get(f, 0.0) for f, w in a.items())
+
+
+def _best(recipe_id, vector, candidates, vectors):
+    """Top K (score, other_id) among candidates, best first."""
+    scored = []
+    for other in candidates:
+        if other == recipe_id or other not in vectors:
+            continue
+        score = _cosine(vector, vectors[other])
+        if score >= MIN_SCORE:
+            scored.append((score, other))
+    return heapq.nlargest(K, scored)
+
+
+def _rows(recipe_id, best):
+    return [{"recipe_id": recipe_id, "related_id": other, "score": score} for score, other in best]
+
+
+# --- Full rebuild ---
+
+def _nearby(ids, recipe_id):
+    """Slice bounds of up to CANDIDATES_PER_FEATURE entries of a sorted posting list, centred on recipe_id."""
+    if len(ids) <= CANDIDATES_PER_FEATURE:
+        return 0, len(ids)
+    start = bisect_left(ids, recipe_id) - CANDIDATES_PER_FEATURE // 2
+    start = max(0, min(start, len(ids) - CANDIDATES_PER_FEATURE))
+    return start, start + CANDIDATES_PER_FEATURE
+
+
+def rebuild(batch_size=5000, echo=None):
+    """Recompute every recipe's neighbours. Returns the number of recipes."""
+    features = _features()
+    total = len(features)
+    df = Counter(f for own in features.values() for f in own)
+    vectors = {recipe_id: _vector(own, df, total) for recipe_id, own in features.items()}
+
+    # Inverted index: feature -> (recipe ids in id order, their weights for it).
+    postings = defaultdict(lambda: ([], []))
+    for recipe_id in sorted(vectors):
+        for f, w in vectors[recipe_id].items():
+            ids, weights = postings[f]
+            ids.append(recipe_id)
+            weights.append(w)
+
+    db.session.execute(RelatedRecipe.__table__.delete())
+    rows = []
+    for done, (recipe_id, vector) in enumerate(vectors.items(), start=1):
+        # Sparse dot products over the postings; exact for everything but the
+        # candidate windows of very common features, so the best few are rescored.
+        partial = defaultdict(float)
+        for f, w in vector.items():
+            ids, weights = postings[f]
+            start, stop = _nearby(ids, recipe_id)
+            for other, ow in zip(ids[start:stop], weights[start:stop]):
+                partial[other] += w * ow
+        partial.pop(recipe_id, None)
+        shortlist = heapq.nlargest(3 * K, partial, key=partial.get)
+        rows.extend(_rows(recipe_id, _best(recipe_id, vector, shortlist, vectors)))
+        if len(rows) >= batch_size:
+            db.session.execute(RelatedRecipe.__table__.insert(), rows)
+            rows = []
+        if echo and done % 10000 == 0:
+            echo(f"  {done}/{total} recipes")
+    if rows:
+        db.session.execute(RelatedRecipe.__table__.insert(), rows)
+    db.session.commit()
+    return total
+
+
+# --- Incremental updates ---
+
+def _candidates(features):
+    """Ids of recent recipes sharing each feature (CANDIDATES_PER_FEATURE per feature)."""
+    found = set()
+    for kind, value in features:
+        if kind == facets.TAG:
+            query = db.select(recipe_tags.c.recipe_id).where(recipe_tags.c.tag_id == value).order_by(recipe_tags.c.recipe_id.desc())
+        elif kind == INGREDIENT:
+            query = (
+                db.select(recipe_ingredients.c.recipe_id)
+                .where(recipe_ingredients.c.ingredient_id == value)
+                .order_by(recipe_ingredients.c.recipe_id.desc())
+            )
+        elif kind in (facets.CUISINE, facets.DIFFICULTY):
+            column = Recipe.cuisine if kind == facets.CUISINE else Recipe.difficulty
+            query = db.select(Recipe.id).where(column == value).order_by(Recipe.date_posted.desc(), Recipe.id.desc())
+        else:
+            # Cook-time buckets are too coarse to find anything worth suggesting on their own.
+            continue
+        found.update(db.session.execute(query.limit(CANDIDATES_PER_FEATURE)).scalars())
+    return found
+
+
+def refresh(recipe_ids, offer=True):
+    """
+    Recompute the neighbours of these recipes (call after they are flushed).
+
+    With offer=True each recipe is also placed into (or dropped from) the
+    lists of the recipes it now resembles, replacing their weakest entry.
+    Lists that held it are always rescored against it; one it no longer
+    belongs in is refilled, so no list is left short.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    table = RelatedRecipe.__table__
+    own = _features(recipe_ids)
+    candidates = {recipe_id: _candidates(own.get(recipe_id, ())) for recipe_id in recipe_ids}
+    holders = defaultdict(set)
+    if offer:
+        # Lists holding these recipes, which may lie outside the capped candidate sets.
+        for holder, related_id in db.session.execute(
+            db.select(table.c.recipe_id, table.c.related_id)
+            .where(table.c.related_id.in_(recipe_ids), table.c.recipe_id.not_in(recipe_ids))
+        ):
+            holders[related_id].add(holder)
+    features = _features(set(recipe_ids).union(*candidates.values(), *holders.values()))
+    df = _frequencies(set().union(*features.values()))
+    total = counters.all_counts()[counters.RECIPES] or len(features)
+    vectors = {recipe_id: _vector(f, df, total) for recipe_id, f in features.items()}
+
+    best = {
+        recipe_id: _best(recipe_id, vectors[recipe_id], candidates[recipe_id], vectors)
+        for recipe_id in recipe_ids if recipe_id in vectors
+    }
+    db.session.execute(table.delete().where(table.c.recipe_id.in_(recipe_ids)))
+    rows = [row for recipe_id, pairs in best.items() for row in _rows(recipe_id, pairs)]
+    lost = set()
+    if offer:
+        # Scores against these recipes are stale: take them out everywhere and re-offer
+        # them to their candidates and to every list that held them.
+        db.session.execute(table.delete().where(table.c.related_id.in_(recipe_ids)))
+        offered = _offer(recipe_ids, {r: candidates[r] | holders[r] for r in recipe_ids}, vectors)
+        placed = {(row["recipe_id"], row["related_id"]) for row in offered}
+        lost = {holder for r, held in holders.items() for holder in held if (holder, r) not in placed}
+        rows += offered
+    if rows:
+        db.session.execute(table.insert(), rows)
+    if lost:
+        refill(sorted(lost))
+
+
+def _offer(recipe_ids, candidates, vectors):
+    """Rows adding each recipe to the lists it now belongs in; evicts the entries it displaces."""
+    offers = defaultdict(list)
+    for recipe_id in recipe_ids:
+        if recipe_id not in vectors:
+            continue
+        for other in candidates[recipe_id]:
+            if other in vectors and other not in recipe_ids:
+                score = _cosine(vectors[recipe_id], vectors[other])
+                if score >= MIN_SCORE:
+                    offers[other].append((score, recipe_id))
+    if not offers:
+        return []
+
+    table = RelatedRecipe.__table__
+    current = defaultdict(list)
+    for recipe_id, related_id, score in db.session.execute(
+        db.select(table.c.recipe_id, table.c.related_id, table.c.score).where(table.c.recipe_id.in_(list(offers)))
+    ):
+        current[recipe_id].append((score, related_id))
+
+    rows, evicted = [], []
+    for other, offered in offers.items():
+        kept = heapq.nlargest(K, current[other] + offered)
+        kept_ids = {related_id for _, related_id in kept}
+        evicted += [{"list_id": other, "evicted_id": related_id} for _, related_id in current[other] if related_id not in kept_ids]
+        rows += [{"recipe_id": other, "related_id": recipe_id, "score": score} for score, recipe_id in offered if recipe_id in kept_ids]
+    if evicted:
+        db.session.execute(
+            table.delete().where(table.c.recipe_id == db.bindparam("list_id"), table.c.related_id == db.bindparam("evicted_id")),
+            evicted,
+        )
+    return rows
+
+
+def dependents(id_select):
+    """Recipes (outside id_select) whose lists include one of the recipes in id_select."""
+    table = RelatedRecipe.__table__
+    return db.session.execute(
+        db.select(table.c.recipe_id).distinct()
+        .where(table.c.related_id.in_(id_select), table.c.recipe_id.not_in(id_select))
+        .limit(REFILL_LIMIT + 1)
+    ).scalars().all()
+
+
+def refill(recipe_ids):
+    """Refill lists that lost entries to a delete (skipped for big bulk deletes; rebuild instead)."""
+    if 0 < len(recipe_ids) <= REFILL_LIMIT:
+        refresh(recipe_ids, offer=False)
+
+
+# --- Serving ---
+
+def for_recipe(recipe_id):
+    """The stored neighbours of a recipe as card-ready Recipe objects, best first."""
+    return (
+        Recipe.query
+        .options(*RECIPE_CARD_OPTIONS[:-1])
+        .join(RelatedRecipe, RelatedRecipe.related_id == Recipe.id)
+        .filter(RelatedRecipe.recipe_id == recipe_id)
+        .order_by(RelatedRecipe.score.desc())
+        .all()
+    )
+
+
+@click.command("related-rebuild")
+@with_appcontext
+def rebuild_related_command():
+    """Recompute the related-recipe suggestions of every recipe."""
+    count = rebuild(echo=click.echo)
+    click.echo(f"Computed related recipes for {count} recipes.")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_related_command)
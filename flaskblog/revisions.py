@@ -0,0 +1,43 @@
+"""
+revisions.py
+Per-recipe update version and timestamp (for ETag / Last-Modified).
+
+recipe.version starts at 1 and recipe.updated_at at the time of posting.
+A before_flush hook moves both whenever a recipe's columns or tags change
+through the ORM session (edit form, tag deletion, ...), so no write path has
+to remember them. Clients polling the JSON API (flaskblog.api) revalidate
+against these and get a 304 when nothing changed.
+
+comment_count changes without an edit (see flaskblog.comments), so
+validators that cover it include it alongside the version.
+
+Existing databases get both columns from `flask db-upgrade`, with
+updated_at backfilled from date_posted.
+"""
+
+from sqlalchemy import event
+
+from flaskblog.database import RoutingSession
+from flaskblog.models import Recipe, utcnow
+
+
+def _bump_edited_recipes(session, flush_context, instances):
+    # Once per transaction, however many times an edit autoflushes.
+    revised = session.info.setdefault("revised_recipes", set())
+    for obj in session.dirty:
+        if isinstance(obj, Recipe) and obj.id not in revised and session.is_modified(obj):
+            obj.version = (obj.version or 1) + 1
+            obj.updated_at = utcnow()
+            revised.add(obj.id)
+
+
+def _end_revision(session):
+    session.info.pop("revised_recipes", None)
+
+
+def init_app(app):
+    # Session events are process-wide: register them once, however many apps are created.
+    if not event.contains(RoutingSession, "before_flush", _bump_edited_recipes):
+        event.listen(RoutingSession, "before_flush", _bump_edited_recipes)
+        event.listen(RoutingSession, "after_commit", _end_revision)
+        event.listen(RoutingSession, "after_rollback", _end_revision)
@@ -0,0 +1,207 @@
+"""
+search.py
+Full-text recipe search backed by an SQLite FTS5 index.
+
+The index lives in a separate virtual table (recipe_fts) whose rowid is the
+recipe id, so a MATCH can be joined straight back onto the recipe table.
+On databases without FTS5 (e.g. Postgres) the helpers report the index as
+disabled and recipe_list keeps using the original ILIKE filters.
+"""
+
+import re
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import column as sql_column
+from sqlalchemy.sql import table as sql_table
+
+from flaskblog import db
+
+FTS_TABLE = "recipe_fts"
+
+# bm25() column weights: title, summary, ingredients, tags.
+# A hit in the title matters far more than a hit somewhere in the ingredients.
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+# Quoted phrases ("garlic sauce") or bare words, optionally ending in * for prefix search.
+_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def init_app(app):
+    """Register the CLI command and note whether the FTS table exists (flaskblog.migrations creates it)."""
+    app.cli.add_command(rebuild_search_command)
+    with app.app_context():
+        app.extensions["recipe_fts"] = db.engine.dialect.name == "sqlite" and inspect(db.engine).has_table(FTS_TABLE)
+
+
+def create_index() -> bool:
+    """Create the FTS table if the database supports it. Returns whether search is enabled."""
+    enabled = False
+    if db.engine.dialect.name == "sqlite":
+        try:
+            db.session.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "title, summary, ingredients, tags, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+            db.session.commit()
+            enabled = True
+        except OperationalError:
+            # SQLite was compiled without FTS5: fall back to ILIKE filtering.
+            db.session.rollback()
+
+    current_app.extensions["recipe_fts"] = enabled
+    return enabled
+
+
+def is_enabled() -> bool:
+    return current_app.extensions.get("recipe_fts", False)
+
+
+def build_match_query(user_query: str) -> str:
+    """
+    Turn free text typed into the search box into a safe FTS5 MATCH expression.
+
+    - "quoted words" become phrase queries
+    - words ending in * become prefix queries (chick* -> chicken, chickpea)
+    - everything else must match (implicit AND)
+
+    Every token is re-quoted so FTS5 operators/punctuation typed by users
+    can never produce a syntax error.
+    """
+    terms = []
+    for phrase, word in _TOKEN_RE.findall(user_query or ""):
+        if phrase:
+            words = _WORD_RE.findall(phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+
+        prefix = word.endswith("*")
+        words = _WORD_RE.findall(word)
+        if not words:
+            continue
+        # Punctuation inside a word (e.g. "stir-fry") splits it into a phrase.
+        term = '"' + " ".join(words) + '"'
+        terms.append(term + "*" if prefix else term)
+
+    return " ".join(terms)
+
+
+def _document(recipe) -> dict:
+    return {
+        "rowid": recipe.id,
+        "title": recipe.title or "",
+        "summary": recipe.summary or "",
+        "ingredients": recipe.ingredients or "",
+        "tags": " ".join(t.name for t in recipe.tags),
+    }
+
+
+def index_recipe(recipe):
+    """
+    Insert or replace a recipe's row in the FTS index.
+
+    Runs inside the caller's session so the index update commits (or rolls
+    back) together with the recipe itself. The recipe must have an id, so
+    call this after db.session.flush() for new recipes.
+    """
+    if not is_enabled():
+        return
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :rowid"), {"rowid": recipe.id})
+    db.session.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, summary, ingredients, tags) "
+            "VALUES (:rowid, :title, :summary, :ingredients, :tags)"
+        ),
+        _document(recipe),
+    )
+
+
+def remove_recipes(id_select):
+    """Drop many recipes from the FTS index in one statement (id_select: a SELECT of recipe ids)."""
+    if not is_enabled():
+        return
+    fts = sql_table(FTS_TABLE, sql_column("rowid"))
+    db.session.execute(fts.delete().where(fts.c.rowid.in_(id_select)))
+
+
+def match_subquery(match: str, column: str | None = None):
+    """
+    Subquery of (recipe_id, rank) rows matching an FTS5 expression.
+
+    Lower rank means more relevant (bm25 scores are negative in SQLite).
+    Pass column to restrict the match to a single indexed column.
+    """
+    if column:
+        match = f"{column} : ({match})"
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    return (
+        text(
+            f"SELECT rowid AS recipe_id, bm25({FTS_TABLE}, {weights}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        )
+        .bindparams(match=match)
+        .columns(recipe_id=db.Integer, rank=db.Float)
+        .subquery()
+    )
+
+
+def rebuild_index(batch_size: int = 500) -> int:
+    """Repopulate the FTS table from scratch. Returns the number of recipes indexed."""
+    from flaskblog.models import Recipe
+
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+    count = 0
+    batch = []
+    recipes = Recipe.query.options(selectinload(Recipe.tags)).order_by(Recipe.id).yield_per(batch_size)
+    for recipe in recipes:
+        batch.append(_document(recipe))
+        if len(batch) >= batch_size:
+            _insert_batch(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        _insert_batch(batch)
+        count += len(batch)
+
+    # Merge the b-tree segments so queries start from a compact index.
+    db.session.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+    return count
+
+
+def index_documents(rows):
+    """
+    Bulk-add prepared rows ({rowid, title, summary, ingredients, tags}) to the
+    index in the caller's transaction (used by the bulk importer).
+    """
+    if rows and is_enabled():
+        _insert_batch(rows)
+
+
+def _insert_batch(rows):
+    db.session.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, summary, ingredients, tags) "
+            "VALUES (:rowid, :title, :summary, :ingredients, :tags)"
+        ),
+        rows,
+    )
+
+
+@click.command("search-rebuild")
+@with_appcontext
+def rebuild_search_command():
+    """Rebuild the recipe full-text search index from the recipe table."""
+    if not is_enabled():
+        click.echo("Full-text search is not available on this database; nothing to do.")
+        return
+    count = rebuild_index()
+    click.echo(f"Indexed {count} recipes.")
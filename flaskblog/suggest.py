@@ -0,0 +1,510 @@
+"""
+suggest.py
+Search-as-you-type suggestions from an in-memory prefix index.
+
+/recipes/suggest?q=... answers from two indexes held by each worker process:
+
+- recipe titles, ranked by views (flaskblog.popularity), most viewed first
+- tag names, cuisines and parsed ingredient names, ranked by how many
+  recipes use them (the materialised counts of flaskblog.facets, so a
+  deleted or edited recipe stops counting at once)
+
+An index is a sorted list of words searched with bisect, each word with an
+array of the ranks of the items containing it, best first, plus each
+item's word ids. The last word typed is a prefix and earlier ones must be
+whole words. "wr" merges the rank arrays of the words starting with "wr"
+whose best item could make the first LIMIT (each word's best rank is kept)
+and stops after LIMIT items. "chicken wr" walks the first items of
+"chicken"'s array, checking each one's word ids; when matches are sparse it
+goes on a window of ranks at a time, intersecting the slices of the arrays
+as sets, each window twice as wide as the last, so the work stops soon
+after the LIMIT-th match instead of covering whole arrays. Answers for one-
+and two-letter prefixes (which span many words) are memoised until an item
+under them changes. Only words and integer arrays are held in memory, not
+titles (the few recipe titles shown are fetched by primary key): about
+40 MB per million recipes in each worker.
+
+The index is built on the first suggestion request. It is kept current by:
+
+- commits that touch recipes or tags in this worker, which make the next
+  request catch up at once; otherwise that happens at most every
+  SYNC_INTERVAL seconds, so other workers and bulk imports are picked up
+- catching up, which indexes recipes with a new id or a moved updated_at;
+  a retitled recipe is indexed again under a new rank, and the old rank is dropped
+- deleted recipes dropping out: catching up compares the maintained recipe
+  count (flaskblog.counters) with the number indexed and, when it is lower,
+  reads the ids to find the missing ones; a deletion noticed when the titles
+  are fetched drops that recipe at once
+- re-reading the tag, cuisine and ingredient counts, and rebuilding the
+  small facet index when any count changed (zero counts drop out)
+- a background rebuild every REBUILD_INTERVAL seconds, which re-ranks by
+  popularity
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import chain, compress
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, func
+
+from flaskblog import counters, db, facets
+from flaskblog.database import RoutingSession
+from flaskblog.models import FacetCount, Recipe, RecipeStats, Tag, utcnow
+
+LIMIT = 8
+# Tag/cuisine/ingredient suggestions listed before the recipes.
+FACET_LIMIT = 3
+MAX_QUERY_LENGTH = 64
+MEMO_PREFIX_LENGTH = 2
+# Multi-word queries walk QUICK_SCAN items, then intersect windows of ranks, the first
+# holding about WINDOW_ITEMS items of the shortest list. Within a window, checking an item's
+# word ids costs about CHECK_COST set operations; a prefix spanning more than
+# MAX_SLICED_WORDS words is always checked that way rather than sliced word by word.
+QUICK_SCAN = 100
+WINDOW_ITEMS = 128
+CHECK_COST = 20
+MAX_SLICED_WORDS = 256
+SYNC_INTERVAL = 5
+# Searches repeated by one request after finding deleted recipes among the results.
+MAX_RESEARCHES = 2
+# Edits committed slightly out of timestamp order are still caught.
+SYNC_OVERLAP = timedelta(seconds=60)
+REBUILD_INTERVAL = 3600
+BATCH_SIZE = 5000
+
+INGREDIENT = facets.INGREDIENT
+
+_WORD_RE = re.compile(r"\w+")
+_END = chr(0x10FFFF)
+
+
+def words(text):
+    """Lowercased words of text, accents removed ("Crème brûlée" -> ["creme", "brulee"])."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    return _WORD_RE.findall("".join(ch for ch in folded if not unicodedata.combining(ch)))
+
+
+class PrefixIndex:
+    """Items (integer ranks, lower is better) found by a prefix of any of their words."""
+
+    def __init__(self):
+        self.vocabulary = []            # sorted words
+        self.postings = []              # per word: ranks of the items containing it, ascending
+        self.heads = array("i")         # per word: its best (first) rank
+        self.word_ids = []              # per word: its id
+        self.spellings = []             # word id -> word
+        self.item_words = array("i")    # word ids of every item, item after item
+        self.item_ends = array("i")     # rank -> end of its word ids in item_words
+        self._memo = {}
+
+    @classmethod
+    def build(cls, items):
+        """Index (rank, words) pairs given in ascending rank order, starting at 0."""
+        index = cls()
+        ids = {}
+        by_word = []
+        for rank, item_words in items:
+            for word in set(item_words):
+                word_id = ids.get(word)
+                if word_id is None:
+                    word_id = ids[word] = len(by_word)
+                    by_word.append(array("i"))
+                by_word[word_id].append(rank)
+                index.item_words.append(word_id)
+            index.item_ends.append(len(index.item_words))
+        index.spellings = list(ids)
+        index.vocabulary = sorted(ids)
+        index.word_ids = [ids[word] for word in index.vocabulary]
+        index.postings = [by_word[word_id] for word_id in index.word_ids]
+        index.heads = array("i", (postings[0] for postings in index.postings))
+        return index
+
+    def add(self, rank, item_words):
+        """Index one more item; its rank must be the next one (len(item_ends))."""
+        for word in set(item_words):
+            i = bisect_left(self.vocabulary, word)
+            if i == len(self.vocabulary) or self.vocabulary[i] != word:
+                self.vocabulary.insert(i, word)
+                self.postings.insert(i, array("i"))
+                self.heads.insert(i, rank)
+                self.word_ids.insert(i, len(self.spellings))
+                self.spellings.append(word)
+            self.postings[i].append(rank)
+            self.item_words.append(self.word_ids[i])
+        self.item_ends.append(len(self.item_words))
+        self.forget(rank)
+
+    def forget(self, rank):
+        """Drop memoised answers that an item's change affects."""
+        for word in self.words_of(rank):
+            for length in range(1, MEMO_PREFIX_LENGTH + 1):
+                self._memo.pop(word[:length], None)
+
+    def words_of(self, rank):
+        start = self.item_ends[rank - 1] if rank else 0
+        return [self.spellings[word_id] for word_id in self.item_words[start:self.item_ends[rank]]]
+
+    def _find(self, word):
+        i = bisect_left(self.vocabulary, word)
+        if i < len(self.vocabulary) and self.vocabulary[i] == word:
+            return i
+        return None
+
+    def _walk(self, stream, limit, alive, required, prefixed, budget):
+        """Ranks from stream (ascending) that pass the word checks: (found, finished)."""
+        found = []
+        previous = -1
+        item_words, item_ends = self.item_words, self.item_ends
+        for scanned, rank in enumerate(stream):
+            if scanned == budget:
+                return found, False
+            if rank == previous:
+                continue
+            previous = rank
+            if alive is not None and not alive(rank):
+                continue
+            if required:
+                word_ids = item_words[item_ends[rank - 1] if rank else 0:item_ends[rank]]
+                if prefixed is not None and prefixed.isdisjoint(word_ids):
+                    continue
+                if (len(required) > 1 or prefixed is None) and not required.issubset(word_ids):
+                    continue
+            found.append(rank)
+            if len(found) == limit:
+                break
+        return found, True
+
+    def _best(self, lo, hi, limit, alive):
+        """Best `limit` ranks having any of the words vocabulary[lo:hi]."""
+        postings = self.postings[lo:hi]
+        threshold = None
+        if len(postings) > limit:
+            # Every rank up to the `limit`-th best head is in a word whose head is no worse.
+            heads = sorted(set(self.heads[lo:hi]))
+            if len(heads) >= limit:
+                threshold = heads[limit - 1]
+                postings = list(compress(postings, map(threshold.__ge__, self.heads[lo:hi])))
+        stream = heapq.merge(*postings) if len(postings) > 1 else postings[0]
+        found, _ = self._walk(stream, limit, alive, None, None, None)
+        if threshold is not None and (len(found) < limit or found[-1] > threshold):
+            # Dead items left places that the skipped words may fill.
+            found, _ = self._walk(heapq.merge(*self.postings[lo:hi]), limit, alive, None, None, None)
+        return found
+
+    def _windows(self, whole, lo, hi, start, limit, alive, required, prefixed, found):
+        """Extend found with the matches from rank `start` on, intersecting a window of ranks at a time."""
+        groups = [[self.postings[i]] for i in whole]
+        sliced_prefix = hi - lo <= MAX_SLICED_WORDS
+        if sliced_prefix:
+            groups.append(self.postings[lo:hi])
+        groups.sort(key=lambda group: sum(map(len, group)))
+        begins = [[bisect_left(postings, start) for postings in group] for group in groups]
+        end = len(self.item_ends)
+        width = max(1, (end - start) * WINDOW_ITEMS // max(1, sum(map(len, groups[0]))))
+        item_words, item_ends = self.item_words, self.item_ends
+        while start < end and len(found) < limit:
+            stop = min(start + width, end)
+            hits = None
+            check = not sliced_prefix
+            for group, group_begins in zip(groups, begins):
+                ends = [bisect_left(postings, stop, i) for postings, i in zip(group, group_begins)]
+                window = chain.from_iterable(postings[i:j] for postings, i, j in zip(group, group_begins, ends))
+                if hits is None:
+                    hits = set(window)
+                elif hits and not check:
+                    # Few hits left: checking their word ids beats a set of a long slice.
+                    if len(hits) * CHECK_COST < sum(ends) - sum(group_begins):
+                        check = True
+                    else:
+                        hits.intersection_update(window)
+                group_begins[:] = ends
+            for rank in sorted(hits):
+                if check:
+                    word_ids = item_words[item_ends[rank - 1] if rank else 0:item_ends[rank]]
+                    if not required.issubset(word_ids) or prefixed.isdisjoint(word_ids):
+                        continue
+                if alive is not None and not alive(rank):
+                    continue
+                found.append(rank)
+                if len(found) == limit:
+                    break
+            start = stop
+            width *= 2
+        return found
+
+    def search(self, query_words, limit, alive=None):
+        """Best `limit` ranks having every whole word and a word starting with the last one."""
+        *whole_words, prefix = query_words
+        whole = [self._find(word) for word in whole_words]
+        if None in whole:
+            return []
+
+        memo_key = prefix if not whole and len(prefix) <= MEMO_PREFIX_LENGTH else None
+        if memo_key is not None and len(self._memo.get(memo_key, ())) >= limit:
+            return self._memo[memo_key][:limit]
+
+        lo = bisect_left(self.vocabulary, prefix)
+        hi = bisect_left(self.vocabulary, prefix + _END, lo)
+        if lo == hi:
+            return []
+        if not whole:
+            found = self._best(lo, hi, limit, alive)
+            if memo_key is not None:
+                self._memo[memo_key] = found
+            return found
+
+        # Matches are usually close together and found in the first items of the rarest
+        # whole word; if not, go on window by window.
+        required = {self.word_ids[i] for i in whole}
+        prefixed = set(self.word_ids[lo:hi])
+        stream = self.postings[min(whole, key=lambda i: len(self.postings[i]))]
+        found, finished = self._walk(stream, limit, alive, required, prefixed, QUICK_SCAN)
+        if finished:
+            return found
+        return self._windows(whole, lo, hi, stream[QUICK_SCAN - 1] + 1, limit, alive, required, prefixed, found)
+
+
+def _facet_counts():
+    """[(facet, value, recipes)] of every tag, cuisine and ingredient in use (materialised in facet_count)."""
+    return [
+        tuple(row) for row in db.session.execute(
+            db.select(FacetCount.facet, FacetCount.value, FacetCount.count)
+            .where(FacetCount.facet.in_((facets.TAG, facets.CUISINE, INGREDIENT)), FacetCount.count > 0)
+            .order_by(FacetCount.facet, FacetCount.value)
+        )
+    ]
+
+
+class SuggestIndex:
+    """Recipe-title and facet prefix indexes of one worker, with catch-up from the database."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recipes = PrefixIndex()
+        self.rank_ids = array("i")      # rank -> recipe id, -1 once superseded
+        self.title_crcs = array("L")    # rank -> crc32 of the indexed title
+        self.id_ranks = array("i")      # recipe id -> current rank, -1 if none
+        self.live = 0                   # recipes with a current rank
+        self.facets = PrefixIndex()
+        self.facet_items = []           # rank -> (kind, name, recipes)
+        self.facet_counts = []
+        self.high_water = 0
+        self.watermark = None           # newest updated_at seen
+        self.synced = 0.0
+        self.built = time.time()
+
+    def _alive(self, rank):
+        return self.rank_ids[rank] >= 0
+
+    def _index_recipe(self, recipe_id, title):
+        """Index a recipe under its title unless it already is. True if it was (caller holds the lock)."""
+        crc = zlib.crc32(title.encode("utf-8"))
+        old = self.id_ranks[recipe_id] if recipe_id < len(self.id_ranks) else -1
+        if old >= 0:
+            if self.title_crcs[old] == crc:
+                return False
+            self.rank_ids[old] = -1
+            self.recipes.forget(old)
+        else:
+            self.live += 1
+        if recipe_id >= len(self.id_ranks):
+            self.id_ranks.extend(array("i", [-1]) * (recipe_id + 1 - len(self.id_ranks)))
+        rank = len(self.rank_ids)
+        self.rank_ids.append(recipe_id)
+        self.title_crcs.append(crc)
+        self.id_ranks[recipe_id] = rank
+        self.recipes.add(rank, words(title))
+        return True
+
+    def _drop(self, recipe_id):
+        """Stop suggesting a deleted recipe (caller holds the lock)."""
+        rank = self.id_ranks[recipe_id] if recipe_id < len(self.id_ranks) else -1
+        if rank >= 0:
+            self.rank_ids[rank] = -1
+            self.id_ranks[recipe_id] = -1
+            self.live -= 1
+            self.recipes.forget(rank)
+
+    def drop(self, recipe_ids):
+        """Stop suggesting these recipes, which are gone from the database."""
+        with self.lock:
+            for recipe_id in recipe_ids:
+                self._drop(recipe_id)
+
+    def _index_facets(self, facet_counts):
+        """Rebuild the facet index from tag, cuisine and ingredient counts."""
+        self.facet_counts = facet_counts
+        counts = sorted(facet_counts, key=lambda item: item[2], reverse=True)
+        self.facet_items = counts
+        self.facets = PrefixIndex.build((rank, words(name)) for rank, (_, name, _) in enumerate(counts))
+
+    @classmethod
+    def build(cls):
+        """Index every recipe (most viewed first) and every tag, cuisine and ingredient."""
+        index = cls()
+        views = func.coalesce(RecipeStats.views, 0)
+        rows = db.session.execute(
+            db.select(Recipe.id, Recipe.title, Recipe.updated_at)
+            .outerjoin(RecipeStats, RecipeStats.recipe_id == Recipe.id)
+            .order_by(views.desc(), Recipe.id.desc())
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+
+        def ranked():
+            # Streamed: titles are turned into words and dropped, never held.
+            for rank, (recipe_id, title, updated_at) in enumerate(rows):
+                index.rank_ids.append(recipe_id)
+                index.title_crcs.append(zlib.crc32(title.encode("utf-8")))
+                index.high_water = max(index.high_water, recipe_id)
+                if updated_at and (index.watermark is None or updated_at > index.watermark):
+                    index.watermark = updated_at
+                yield rank, words(title)
+
+        index.recipes = PrefixIndex.build(ranked())
+        index.id_ranks = array("i", [-1]) * (index.high_water + 1)
+        for rank, recipe_id in enumerate(index.rank_ids):
+            index.id_ranks[recipe_id] = rank
+        index.live = len(index.rank_ids)
+
+        index._index_facets(_facet_counts())
+        index.synced = time.time()
+        return index
+
+    def sync(self):
+        """Index recipes added, edited or deleted since the last sync (by any worker) and new facet counts."""
+        changed = dict(db.session.execute(
+            db.select(Recipe.id, Recipe.title).where(Recipe.id > self.high_water)
+        ).all())
+        since = (self.watermark or utcnow()) - SYNC_OVERLAP
+        changed.update(db.session.execute(
+            db.select(Recipe.id, Recipe.title).where(Recipe.updated_at >= since)
+        ).all())
+        watermark = db.session.execute(db.select(func.max(Recipe.updated_at))).scalar()
+        recipes = counters.all_counts()[counters.RECIPES]
+        facet_counts = _facet_counts()
+
+        with self.lock:
+            for recipe_id, title in changed.items():
+                self._index_recipe(recipe_id, title)
+            self.high_water = max([self.high_water, *changed])
+            if watermark and (self.watermark is None or watermark > self.watermark):
+                self.watermark = watermark
+            if facet_counts != self.facet_counts:
+                self._index_facets(facet_counts)
+            deleted = recipes < self.live
+            high_water = self.high_water
+            self.synced = time.time()
+        if deleted:
+            self._drop_deleted(high_water)
+
+    def _drop_deleted(self, high_water):
+        """Drop indexed recipes (up to id high_water) that are no longer in the database."""
+        present = bytearray(high_water + 1)
+        for (recipe_id,) in db.session.execute(
+            db.select(Recipe.id).where(Recipe.id <= high_water).execution_options(yield_per=BATCH_SIZE)
+        ):
+            present[recipe_id] = 1
+        with self.lock:
+            for recipe_id, rank in enumerate(self.id_ranks[:high_water + 1]):
+                if rank >= 0 and not present[recipe_id]:
+                    self._drop(recipe_id)
+
+    def search(self, query_words, limit=LIMIT):
+        """([(kind, name, recipes)], [recipe id]) best first; facets take up to FACET_LIMIT places."""
+        with self.lock:
+            facet_hits = [self.facet_items[rank] for rank in self.facets.search(query_words, FACET_LIMIT)]
+            # A few spare recipes, in case some were deleted since they were indexed.
+            ranks = self.recipes.search(query_words, limit - len(facet_hits) + 2, alive=self._alive)
+            return facet_hits, [self.rank_ids[rank] for rank in ranks]
+
+
+_index = None
+_build_lock = threading.Lock()
+_sync_lock = threading.Lock()
+_rebuilding = threading.Lock()
+
+
+def _rebuild_in_background(app):
+    def run():
+        global _index
+        try:
+            with app.app_context():
+                _index = SuggestIndex.build()
+        finally:
+            _rebuilding.release()
+
+    if _rebuilding.acquire(blocking=False):
+        threading.Thread(target=run, name="suggest-rebuild", daemon=True).start()
+
+
+def current_index():
+    """This worker's index: built on first use, caught up and rebuilt as it ages."""
+    global _index
+    index = _index
+    if index is None:
+        with _build_lock:
+            if _index is None:
+                _index = SuggestIndex.build()
+            return _index
+
+    now = time.time()
+    if now - index.built > REBUILD_INTERVAL:
+        index.built = now  # one rebuild at a time; the old index keeps serving meanwhile
+        _rebuild_in_background(current_app._get_current_object())
+    # One request catches up; the others answer from the index as it is.
+    if now - index.synced > SYNC_INTERVAL and _sync_lock.acquire(blocking=False):
+        try:
+            index.sync()
+        finally:
+            _sync_lock.release()
+    return index
+
+
+def suggest(query, limit=LIMIT):
+    """Suggestions for a partly typed query: [(kind, label, value, recipes)] best first."""
+    query_words = words(query[:MAX_QUERY_LENGTH])
+    if not query_words:
+        return []
+    index = current_index()
+    for _ in range(MAX_RESEARCHES + 1):
+        facet_hits, recipe_ids = index.search(query_words, limit)
+        titles = {}
+        if recipe_ids:
+            titles = dict(db.session.execute(db.select(Recipe.id, Recipe.title).where(Recipe.id.in_(recipe_ids))).all())
+        missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in titles]
+        if not missing:
+            break
+        # Deleted since they were indexed: drop them (and memoised answers holding them) and look again.
+        index.drop(missing)
+    suggestions = [(kind, name, name, count) for kind, name, count in facet_hits]
+    suggestions += [("recipe", titles[recipe_id], recipe_id, None) for recipe_id in recipe_ids if recipe_id in titles]
+    return suggestions[:limit]
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _note_indexed_changes(session, flush_context, instances):
+    if session.info.get("suggest_changed"):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Recipe, Tag)):
+            session.info["suggest_changed"] = True
+            return
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _catch_up_soon(session):
+    if session.info.pop("suggest_changed", False) and _index is not None:
+        _index.synced = 0.0
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_indexed_changes(session):
+    session.info.pop("suggest_changed", None)
@@ -0,0 +1,111 @@
+"""
+throttle.py
+Fixed-window attempt limits (login throttling).
+
+A Limit allows `attempts` hits per key (a client IP, an account email, ...)
+in each `window` seconds. Routes check retry_after() *before* doing any
+expensive work, record failures with hit(), and clear a key with reset()
+after a success.
+
+Counters must be seen by every gunicorn worker, otherwise each worker
+keeps its own and the real limit is `attempts` times the worker count.
+They live in the page cache's file with CACHE_BACKEND=sqlite, and
+otherwise in a SQLite file of their own (THROTTLE_PATH, default
+instance/throttle.sqlite3): the per-process memory backend is never used,
+and CACHE_BACKEND=none cannot turn throttling off. Read-modify-write is not
+atomic across workers, so a burst may overshoot a limit by a few attempts,
+which is fine for throttling.
+
+flaskblog.identity publishes its per-user versions in the same file
+(shared_store()).
+"""
+
+import hashlib
+import os
+import time
+
+from flaskblog.cache import SQLiteCache, cache
+
+# SQLiteCache holding the counters, set by init_app().
+_backend = None
+
+
+class Limit:
+    def __init__(self, name, attempts, window):
+        self.name = name
+        self.attempts = attempts
+        self.window = window
+
+    def configure(self, attempts, window):
+        self.attempts = attempts
+        self.window = window
+
+    def _key(self, key):
+        digest = hashlib.sha1(str(key).lower().encode("utf-8")).hexdigest()
+        return f"throttle:{self.name}:{digest}"
+
+
+# Failed logins per client IP (generous: a whole school can share one address)
+# and per account email.
+login_ip = Limit("login-ip", 50, 300)
+login_account = Limit("login-account", 5, 900)
+
+
+def _store():
+    return _backend
+
+
+def shared_store():
+    """The SQLiteCache every worker on the host shares (set up by init_app)."""
+    return _backend
+
+
+def _window(limit, key, now):
+    """(count, window_start) for key, starting a fresh window when the old one has passed."""
+    entry = _store().get(limit._key(key))
+    if entry is None or now - entry[1] >= limit.window:
+        return 0, now
+    return entry
+
+
+def retry_after(limit, key):
+    """Seconds until key may try again (0 when it is under the limit)."""
+    if not key or limit.attempts <= 0:
+        return 0
+    now = time.time()
+    count, started = _window(limit, key, now)
+    if count < limit.attempts:
+        return 0
+    return max(1, int(started + limit.window - now))
+
+
+def hit(limit, key):
+    """Count one attempt against key."""
+    if not key:
+        return
+    now = time.time()
+    count, started = _window(limit, key, now)
+    _store().set(limit._key(key), (count + 1, started), ttl=limit.window)
+
+
+def reset(limit, key):
+    if key:
+        _store().delete(limit._key(key))
+
+
+def after_fork():
+    """Call in a forked worker (see flaskblog.preload): the counter file's connections are per process."""
+    if _backend is not None and _backend is not cache.backend:
+        _backend.after_fork()
+
+
+def init_app(app):
+    global _backend
+    if isinstance(cache.backend, SQLiteCache):
+        _backend = cache.backend
+    else:
+        _backend = SQLiteCache(app.config.get("THROTTLE_PATH") or os.path.join(app.instance_path, "throttle.sqlite3"))
+    login_ip.configure(app.config.get("LOGIN_IP_ATTEMPTS", 50), app.config.get("LOGIN_IP_WINDOW", 300))
+    login_account.configure(
+        app.config.get("LOGIN_ACCOUNT_ATTEMPTS", 5), app.config.get("LOGIN_ACCOUNT_WINDOW", 900)
+    )
@@ -0,0 +1,82 @@
+import os
+from flask import Blueprint, render_template, url_for, flash, redirect, request, abort
+from flask_login import login_user, current_user, logout_user, login_required
+from werkzeug.exceptions import TooManyRequests
+from flaskblog import db
+from flaskblog.models import User
+from flaskblog.users.forms import RegistrationForm, LoginForm, UpdateAccountForm
+from flaskblog.utils import save_image
+from flaskblog import image_store, passwords, throttle
+
+users = Blueprint("users", __name__)
+
+@users.route("/register", methods=["GET", "POST"])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for("main.home"))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        hashed_pw = passwords.hash_password(form.password.data)
+        user = User(username=form.username.data, email=form.email.data, password=hashed_pw)
+        db.session.add(user)
+        db.session.commit()
+        flash("Your account has been created! You can now log in.", "success")
+        return redirect(url_for("users.login"))
+    return render_template("users/register.html", title="Register", form=form)
+
+@users.route("/login", methods=["GET", "POST"])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for("main.home"))
+    form = LoginForm()
+    if form.validate_on_submit():
+        ip, account = request.remote_addr, form.email.data.strip().lower()
+        # Throttled clients are turned away before any lookup or hashing.
+        wait = max(throttle.retry_after(throttle.login_ip, ip), throttle.retry_after(throttle.login_account, account))
+        if wait:
+            raise TooManyRequests("Too many failed sign-in attempts. Please try again later.", retry_after=wait)
+        user = User.query.filter_by(email=form.email.data).first()
+        if user and passwords.check_password(user.password, form.password.data):
+            throttle.reset(throttle.login_account, account)
+            if passwords.needs_rehash(user.password):
+                # Upgrade hashes made at another BCRYPT_LOG_ROUNDS; if the pool is busy, next login will.
+                try:
+                    user.password = passwords.hash_password(form.password.data)
+                    db.session.commit()
+                except passwords.PasswordServiceBusy:
+                    pass
+            login_user(user, remember=form.remember.data)
+            next_page = request.args.get("next")
+            return redirect(next_page) if next_page else redirect(url_for("main.home"))
+        throttle.hit(throttle.login_ip, ip)
+        throttle.hit(throttle.login_account, account)
+        flash("Login unsuccessful. Please check email and password.", "danger")
+    return render_template("users/login.html", title="Login", form=form)
+
+@users.route("/logout")
+def logout():
+    logout_user()
+    return redirect(url_for("main.home"))
+
+@users.route("/account", methods=["GET", "POST"])
+@login_required
+def account():
+    form = UpdateAccountForm(original_username=current_user.username, original_email=current_user.email)
+    if form.validate_on_submit():
+        # current_user is a cached snapshot (flaskblog.identity); changes go through the row.
+        user = db.session.get(User, current_user.id)
+        if form.picture.data:
+            picture_file = save_image(form.picture.data, folder="profile_pics", output_size=(256, 256))
+            image_store.release("profile_pics", user.image_file)
+            user.image_file = picture_file
+        user.username = form.username.data
+        user.email = form.email.data
+        db.session.commit()
+        image_store.purge_orphans()
+        flash("Your account has been updated!", "success")
+        return redirect(url_for("users.account"))
+    elif request.method == "GET":
+        form.username.data = current_user.username
+        form.email.data = current_user.email
+
+    return render_template("users/account.html", title="Account", form=form)
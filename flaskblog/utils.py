@@ -0,0 +1,12 @@
+import os
+from flaskblog import image_store
+
+ALLOWED_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+
+def save_image(form_picture, folder: str, output_size=(800, 800)) -> str:
+    """Store an upload (deduplicated, see image_store.py) and queue its resizing in the background."""
+    _, ext = os.path.splitext(form_picture.filename.lower())
+    if ext not in ALLOWED_IMAGE_EXTS:
+        raise ValueError("Invalid image type. Please upload jpg, jpeg, png, or webp.")
+
+    return image_store.save_upload(form_picture, folder, ext, output_size)
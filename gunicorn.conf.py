@@ -0,0 +1,48 @@
+"""
+gunicorn.conf.py
+Production server settings: gunicorn -c gunicorn.conf.py run:app
+
+The app is loaded once in the master (preload_app) and warmed before the
+workers are forked, so they share its imports and compiled templates (see
+flaskblog/preload.py). Run `flask --app run db-upgrade` before starting:
+the app does not create or alter tables itself.
+
+The page cache defaults to the sqlite backend here: with the per-process
+memory backend an invalidation only reaches the worker that made the
+write, and the others keep serving stale pages until their entries expire.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+
+# Read by create_app() when the master loads the app.
+os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+# Recycle workers now and then (jittered so they do not all restart together);
+# with preloading a replacement worker is ready straight away.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    from flaskblog import preload
+
+    app = server.app.wsgi()
+    count = preload.warm(app)
+    server.log.info("Warmed %d templates before forking workers", count)
+    if app.config["CACHE_BACKEND"] == "memory" and server.num_workers > 1:
+        server.log.warning(
+            "CACHE_BACKEND=memory is per worker: pages changed by one worker stay stale in the others "
+            "for up to CACHE_DEFAULT_TTL seconds (use CACHE_BACKEND=sqlite)"
+        )
+
+
+def post_fork(server, worker):
+    from flaskblog import preload
+
+    preload.after_fork(worker.app.wsgi())
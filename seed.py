@@ -1,37 +1,10 @@
 # seed.py
-from flaskblog import create_app, db, bcrypt
-from flaskblog.models import User, Recipe, Tag
+from flaskblog import create_app, db, images, image_store, migrations, passwords, related
+from flaskblog.bulk import import_records
+from flaskblog.models import User
 
 app = create_app()
 
-# Exact mapping: recipe title -> image filename
-TITLE_TO_IMAGE = {
-    "Spaghetti Bolognese (Family Style)": "spaghetti_bolognese.jpg",
-    "Pesto Chicken Penne": "pesto_chicken_penne.png",
-    "Vegetable Fried Rice (Leftover Rice)": "veg_fried_rice.jpg",
-    "Honey Soy Chicken Rice Bowls": "honey_soy_chicken_bowl.jpg",
-    "Beef Tacos (School Classic)": "beef_tacos.jpg",
-    "Chicken Quesadillas": "chicken_quesadillas.jpg",
-    "Banana Pancakes": "banana_pancakes.jpg",
-    "Chocolate Mug Cake (Microwave)": "chocolate_mug_cake.jpg",
-    "Chicken Caesar Salad": "chicken_caesar_salad.jpg",
-    "Avocado Toast (Student Breakfast)": "avocado_toast.jpg",
-
-    # Your earlier “short titles” (no image_file field) — mapped exactly by title
-    "Spaghetti Bolognese": "spaghetti_bolognese.jpg",
-    "Vegetable Fried Rice": "veg_fried_rice.jpg",
-    "Honey Soy Chicken Rice Bowl": "honey_soy_chicken_bowl.jpg",
-    "Beef Tacos": "beef_tacos.jpg",
-    "Chocolate Mug Cake": "chocolate_mug_cake.jpg",
-
-    # Recipes you don't have custom photos for yet (use default)
-    "Chicken Shawarma Wraps": "default_recipe.jpg",
-    "Pasta Primavera": "default_recipe.jpg",
-    "Margherita Pizza Toast": "default_recipe.jpg",
-    "Butter Chicken (Simple)": "default_recipe.jpg",
-    "Greek Salad Wrap": "default_recipe.jpg",
-}
-
 SAMPLE_RECIPES = [
     {
         "title": "Chicken Shawarma Wraps",
@@ -440,45 +413,24 @@ SAMPLE_RECIPES = [
 
 
 with app.app_context():
-    db.create_all()
+    migrations.upgrade(echo=print)
 
     # Create admin if not exists
     admin_email = "admin@bonnyrigg.local"
     admin = User.query.filter_by(email=admin_email).first()
     if not admin:
-        pw = bcrypt.generate_password_hash("Admin123!").decode("utf-8")
+        pw = passwords.hash_password("Admin123!")
         admin = User(username="Admin", email=admin_email, password=pw, is_admin=True)
         db.session.add(admin)
         db.session.commit()
 
-    for r in SAMPLE_RECIPES:
-
-        title = r["title"]
-
-        recipe = Recipe(
-            title=title,
-            summary=r["summary"],
-            cuisine=r["cuisine"],
-            difficulty=r["difficulty"],
-            cook_time_mins=r["cook_time_mins"],
-            ingredients=r["ingredients"],
-            instructions=r["instructions"],
-            author=admin,
-            image_file=r.get("image_file", "default_recipe.jpg")
-        )
-
-        db.session.add(recipe)
-
+    # Recipes, tags, ingredient/search indexes and facet counts in one batched pass.
+    import_records(enumerate(SAMPLE_RECIPES, start=1), admin.id)
 
-    # Create tags + recipes
-        for tag_name in r["tags"]:
-            tag_name = tag_name.strip().lower()
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(name=tag_name)
-            recipe.tags.append(tag)
+    # "Related recipes" suggestions for the imported catalogue.
+    related.rebuild()
 
-        db.session.add(recipe)
+    # Count the seed pictures in the image manifest.
+    image_store.reconcile(images.static_root())
 
-    db.session.commit()
     print("Seed complete! Admin login: admin@bonnyrigg.local / Admin123!")
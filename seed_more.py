@@ -1,5 +1,6 @@
-from flaskblog import create_app, db, bcrypt
-from flaskblog.models import User, Recipe, Comment
+from flaskblog import create_app, db, passwords
+from flaskblog.models import User, Recipe
+from flaskblog import comments, migrations
 
 app = create_app()
 
@@ -21,36 +22,39 @@ FAKE_COMMENTS = [
     "10/10. The cook time estimate was accurate.",
 ]
 
-def get_or_create_user(username, email, password="Student123!"):
-    user = User.query.filter_by(email=email).first()
-    if user:
-        return user
-    hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
-    user = User(username=username, email=email, password=hashed_pw)
-    db.session.add(user)
+def get_or_create_users(fake_users, password="Student123!"):
+    """Create the fake users in one transaction, hashing the shared password once."""
+    existing = {u.email: u for u in User.query.filter(User.email.in_([e for _, e in fake_users]))}
+    hashed_pw = None
+    users = []
+    for username, email in fake_users:
+        user = existing.get(email)
+        if user is None:
+            if hashed_pw is None:
+                hashed_pw = passwords.hash_password(password)
+            user = User(username=username, email=email, password=hashed_pw)
+            db.session.add(user)
+        users.append(user)
     db.session.commit()
-    return user
+    return users
 
 with app.app_context():
-    db.create_all()
+    migrations.upgrade(echo=print)
 
-    recipes = Recipe.query.all()
+    recipes = db.session.execute(db.select(Recipe.id)).scalars().all()
     if not recipes:
         print("No recipes found. Run seed.py first.")
         raise SystemExit(1)
 
-    users = [get_or_create_user(name, email) for name, email in FAKE_USERS]
+    users = get_or_create_users(FAKE_USERS)
 
     created = 0
-    for i, recipe in enumerate(recipes):
+    for i, recipe_id in enumerate(recipes):
         u1 = users[i % len(users)]
         u2 = users[(i + 1) % len(users)]
 
-        c1 = Comment(body=FAKE_COMMENTS[(i * 2) % len(FAKE_COMMENTS)], recipe_id=recipe.id, user_id=u1.id)
-        c2 = Comment(body=FAKE_COMMENTS[(i * 2 + 1) % len(FAKE_COMMENTS)], recipe_id=recipe.id, user_id=u2.id)
-
-        db.session.add(c1)
-        db.session.add(c2)
+        comments.add_comment(recipe_id, u1.id, FAKE_COMMENTS[(i * 2) % len(FAKE_COMMENTS)])
+        comments.add_comment(recipe_id, u2.id, FAKE_COMMENTS[(i * 2 + 1) % len(FAKE_COMMENTS)])
         created += 2
 
     db.session.commit()
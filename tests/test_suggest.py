@@ -0,0 +1,128 @@
+"""
+test_suggest.py
+PrefixIndex answers compared with a brute-force scan of the same items.
+
+The synthetic vocabulary is skewed (a few very common words, many rare ones)
+and shares prefixes, so searches go through every path: the memoised
+one-word merge with its pruning by best rank, the quick walk of the rarest
+whole word, and the rank windows, sliced per word or (with
+MAX_SLICED_WORDS at 0) checked by word ids.
+"""
+
+import random
+
+import pytest
+
+from flaskblog import suggest
+from flaskblog.suggest import PrefixIndex
+
+ITEMS = 6000
+LIMITS = (1, 8, 40)
+
+
+def _vocabulary(rng):
+    syllables = ["ba", "be", "bo", "ca", "ce", "co", "da", "de", "ra", "ro", "sa", "so"]
+    words = set()
+    while len(words) < 1500:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 3))))
+    return sorted(words)
+
+
+def _items(seed=7):
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    rng.shuffle(weights)
+    return vocabulary, [rng.choices(vocabulary, weights, k=rng.randint(2, 6)) for _ in range(ITEMS)]
+
+
+def _queries(vocabulary, items, seed=11):
+    rng = random.Random(seed)
+    queries = [[word[:length]] for word in rng.sample(vocabulary, 60) for length in (1, 2, 3)]
+    for _ in range(300):
+        item_words = rng.choice(items)
+        whole = rng.sample(item_words, min(len(item_words) - 1, rng.randint(1, 2)))
+        last = rng.choice(item_words)
+        queries.append([*whole, last[:rng.randint(1, len(last))]])
+    # Common whole words with a prefix they seldom occur with.
+    common = sorted(vocabulary, key=lambda word: -sum(word in item_words for item_words in items))[:20]
+    for _ in range(100):
+        queries.append([rng.choice(common), rng.choice(vocabulary)[:rng.randint(2, 4)]])
+    return queries
+
+
+def _brute_force(items, query_words, limit, alive=None):
+    *whole, prefix = query_words
+    whole = set(whole)
+    found = []
+    for rank, item_words in enumerate(items):
+        if alive is not None and not alive(rank):
+            continue
+        if whole <= item_words and any(word.startswith(prefix) for word in item_words):
+            found.append(rank)
+            if len(found) == limit:
+                break
+    return found
+
+
+@pytest.fixture(scope="module")
+def catalogue():
+    vocabulary, items = _items()
+    return vocabulary, [frozenset(item_words) for item_words in items], _queries(vocabulary, items)
+
+
+@pytest.mark.parametrize("max_sliced_words", [suggest.MAX_SLICED_WORDS, 0])
+def test_search_matches_brute_force(catalogue, monkeypatch, max_sliced_words):
+    monkeypatch.setattr(suggest, "MAX_SLICED_WORDS", max_sliced_words)
+    vocabulary, items, queries = catalogue
+    index = PrefixIndex.build(enumerate(items))
+    for query in queries:
+        for limit in LIMITS:
+            assert index.search(query, limit) == _brute_force(items, query, limit), query
+
+
+def test_dead_ranks_are_skipped(catalogue):
+    vocabulary, items, queries = catalogue
+    rng = random.Random(3)
+    # Dead best-ranked items make the pruned one-word merge fall back to every word.
+    dead = set(rng.sample(range(ITEMS), ITEMS * 2 // 5)) | set(range(300))
+
+    def alive(rank):
+        return rank not in dead
+
+    index = PrefixIndex.build(enumerate(items))
+    for query in queries:
+        for limit in LIMITS:
+            assert index.search(query, limit, alive) == _brute_force(items, query, limit, alive), query
+
+
+def test_deleting_forgets_memoised_prefixes(catalogue):
+    vocabulary, items, _ = catalogue
+    index = PrefixIndex.build(enumerate(items))
+    dead = set()
+
+    def alive(rank):
+        return rank not in dead
+
+    prefixes = sorted({word[:length] for word in vocabulary for length in (1, 2)})
+    for prefix in prefixes:
+        index.search([prefix], 8, alive)
+    # Delete the memoised answers' best items the way SuggestIndex.drop() does.
+    for prefix in prefixes[::3]:
+        for rank in index.search([prefix], 8, alive)[:2]:
+            dead.add(rank)
+            index.forget(rank)
+    for prefix in prefixes:
+        assert index.search([prefix], 8, alive) == _brute_force(items, [prefix], 8, alive), prefix
+
+
+def test_added_items_match_a_full_build(catalogue):
+    vocabulary, items, queries = catalogue
+    index = PrefixIndex.build(enumerate(items[:ITEMS // 2]))
+    for query in queries[:60]:
+        index.search(query, 8)  # memoised answers must stay right as items are added
+    for rank in range(ITEMS // 2, ITEMS):
+        index.add(rank, items[rank])
+    for query in queries:
+        for limit in LIMITS:
+            assert index.search(query, limit) == _brute_force(items, query, limit), query